@@ -96,23 +96,27 @@ def evaluations_page():
     col1, col2 = st.columns(2)
     
     with col1:
-        uploaded_file = st.file_uploader("Charger un fichier d'évaluations", type=["csv", "xlsx"])
+        uploaded_file = st.file_uploader("Charger un fichier d'évaluations", type=["csv", "xlsx", "parquet"])
         
         if uploaded_file:
-            if uploaded_file.type == "text/csv":
-                df = pd.read_csv(uploaded_file)
+            if uploaded_file.name.endswith(".csv"):
+                df = pd.read_csv(uploaded_file, nrows=5)
+            elif uploaded_file.name.endswith(".parquet"):
+                df = pd.read_parquet(uploaded_file).head()
             else:
-                df = pd.read_excel(uploaded_file)
+                df = pd.read_excel(uploaded_file, nrows=5)
             
             st.write("Aperçu des données:")
             st.dataframe(df.head())
             
             if st.button("Analyser"):
                 try:
-                    file_path = f"data/{uploaded_file.name}"
-                    df.to_csv(file_path, index=False)
-                    
-                    response = requests.post(f"{API_URL}/evaluate", json={"file_path": file_path})
+                    # Le fichier brut est envoyé au backend, qui le convertit et l'analyse.
+                    uploaded_file.seek(0)
+                    response = requests.post(
+                        f"{API_URL}/evaluate/upload",
+                        files={"file": (uploaded_file.name, uploaded_file, uploaded_file.type or "application/octet-stream")}
+                    )
                     
                     if response.status_code == 200:
                         report = response.json()
@@ -134,13 +138,15 @@ def evaluations_page():
                         if "weak_signals" in report and report["weak_signals"]:
                             for signal in report["weak_signals"][:5]:
                                 st.warning(f"⚠️ {signal['text']}")
+                            # Le rapport ne contient qu'un aperçu ; le détail est paginé côté API.
+                            st.caption(f"{report.get('weak_signals_total', len(report['weak_signals']))} signaux faibles au total")
                     else:
                         st.error("Erreur lors de l'analyse")
                 except Exception as e:
                     st.error(f"Erreur: {e}")
     
     with col2:
-        st.info("📋 Format attendu:\n- Colonnes numériques (1-5)\n- Colonnes texte pour commentaires\n- Format CSV ou Excel")
+        st.info("📋 Format attendu:\n- Colonnes numériques (1-5)\n- Colonnes texte pour commentaires\n- Format CSV, Excel ou Parquet")
         
         if st.button("Charger exemple"):
             try:
@@ -153,21 +159,66 @@ def evaluations_page():
 def dashboard_page():
     st.title("📈 Tableau de Bord KPI")
     
+    windows = {"Dernière heure": "1h", "24 heures": "24h", "7 jours": "7d", "30 jours": "30d", "1 an": "365d"}
+    label = st.selectbox("Période", list(windows), index=1)
+    
+    try:
+        response = requests.get(f"{API_URL}/kpis", params={"window": windows[label]})
+        if response.status_code != 200:
+            st.error("Erreur lors de la récupération des KPI")
+            return
+        data = response.json()
+    except Exception as e:
+        st.error(f"Erreur: {e}")
+        return
+    
+    totals = data["totals"]
+    latency = totals["latency"]
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        st.metric("Questions Chatbot", "0", "+0")
+        st.metric("Questions Chatbot", f"{totals['questions']:,}".replace(",", " "))
     with col2:
-        st.metric("Évaluations Traitées", "0", "+0")
+        st.metric("Évaluations Traitées", f"{totals['evaluations_processed']:,}".replace(",", " "),
+                  f"{totals['evaluation_files']} fichiers", delta_color="off")
     with col3:
-        st.metric("Utilisateurs Actifs", "0", "+0")
+        st.metric("Utilisateurs Actifs", totals["active_users"], f"{totals['logins']} connexions", delta_color="off")
     with col4:
-        st.metric("Temps Réponse Moyen", "0.5s", "-0.1s")
+        st.metric("Temps Réponse Moyen", f"{latency['avg_ms'] / 1000:.2f}s",
+                  f"p95 {latency['p95_ms'] / 1000:.2f}s", delta_color="off")
     
     st.markdown("---")
     
     st.subheader("Graphiques KPI")
-    st.info("Les graphiques KPI seront affichés ici")
+    if not data["series"]:
+        st.info("Aucune activité sur la période")
+        return
+    
+    series = pd.DataFrame(data["series"])
+    series["ts"] = pd.to_datetime(series["ts"])
+    series = series.set_index("ts")
+    st.caption(f"Agrégation par {dict(minute='minute', hour='heure', day='jour')[data['resolution']]}")
+    
+    st.markdown("**Questions posées**")
+    st.line_chart(series[["questions"]])
+    st.markdown("**Latence p95 (ms)**")
+    st.line_chart(series[["p95_ms"]])
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("**Intentions les plus fréquentes**")
+        intents = pd.Series(totals["intents"], dtype="int64").head(10)
+        if not intents.empty:
+            st.bar_chart(intents)
+    with col2:
+        st.markdown(f"**Confiance des réponses** (moyenne {totals['confidence']['avg']:.0%})")
+        bins = len(totals["confidence"]["histogram"])
+        confidence = pd.Series(totals["confidence"]["histogram"],
+                               index=[f"{i / bins:.1f}-{(i + 1) / bins:.1f}" for i in range(bins)])
+        st.bar_chart(confidence)
+    
+    st.markdown("**Évaluations traitées**")
+    st.bar_chart(series[["evaluations"]])
 
 def main():
     if not st.session_state.user_token:
@@ -1,12 +1,27 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, File, Form, Header, UploadFile, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, List
+import asyncio
+import functools
 import logging
+import os
+import time
 from modules.chatbot_backend import ChatbotBackend
-from modules.evaluations import EvaluationAnalyzer
+from modules.evaluations import analyze_file, prepare_grouped_file, uses_streaming
+from modules.evaluation_jobs import EvaluationJobManager
+from modules.grouped_reports import analyze_text_partition, merge_grouped_report
+from modules.evaluation_io import ColumnarStore, spool_upload
+from modules.incremental_analysis import EvaluationState, EvaluationStateStore, read_batch
 from utils.auth import AuthManager
 from utils.monitoring import MonitoringManager
+from utils.metrics import REGISTRY, RequestMetricsMiddleware, observe_report_timings
+from utils.batching import MicroBatcher
+from utils.executors import InferenceExecutor, ExecutorSaturated
+from utils.report_cache import ReportCache, report_key
+from utils.report_payload import (cluster_labels_parquet, compact_report, encoded_response,
+                                  json_response, paginate, select_section)
 
 app = FastAPI(title="Safran RH API", version="1.0.0")
 
@@ -17,14 +32,62 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestMetricsMiddleware)
 
-chatbot = ChatbotBackend()
-analyzer = EvaluationAnalyzer()
-auth_manager = AuthManager()
-monitoring = MonitoringManager()
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "data/uploads")
+
+# Construits au démarrage du serveur et non à l'import : les processus d'analyse (spawn)
+# ré-importent ce module et ne doivent ni charger le modèle ni relancer les threads de fond.
+chatbot: Optional[ChatbotBackend] = None
+auth_manager: Optional[AuthManager] = None
+monitoring: Optional[MonitoringManager] = None
+inference_executor: Optional[InferenceExecutor] = None
+report_cache: Optional[ReportCache] = None
+columnar_store: Optional[ColumnarStore] = None
+evaluation_states: Optional[EvaluationStateStore] = None
+evaluation_jobs: Optional[EvaluationJobManager] = None
+ask_batcher: Optional[MicroBatcher] = None
+
+def _on_job_complete(job: dict):
+    observe_report_timings(job.get("timings_ms"))
+    monitoring.log_evaluation_processing(job.get("file_path", ""), job.get("total_evaluations", 0))
+
+@app.on_event("startup")
+async def startup():
+    global chatbot, auth_manager, monitoring, inference_executor, report_cache, columnar_store
+    global evaluation_states, evaluation_jobs, ask_batcher
+    monitoring = MonitoringManager()
+    chatbot = ChatbotBackend()
+    auth_manager = AuthManager()
+    inference_executor = InferenceExecutor.from_env()
+    report_cache = ReportCache.from_env()
+    columnar_store = ColumnarStore(os.getenv("COLUMNAR_CACHE_DIR", "data/cache/columnar"))
+    evaluation_states = EvaluationStateStore(os.getenv("EVALUATION_STATE_DIR", "data/cache/states"))
+    evaluation_jobs = EvaluationJobManager.from_env(on_complete=_on_job_complete, report_cache=report_cache)
+    ask_batcher = MicroBatcher(
+        chatbot.ask_batch,
+        max_batch_size=int(os.getenv("ASK_BATCH_MAX_SIZE", "32")),
+        max_wait_ms=float(os.getenv("ASK_BATCH_MAX_WAIT_MS", "5")),
+        runner=inference_executor.encode.run,
+    )
 
 logger = logging.getLogger(__name__)
 
+REGISTRY.register_callback("safran_log_records_written_total", "counter", "Enregistrements de journal écrits",
+                           lambda: monitoring.get_logging_stats()["written"])
+REGISTRY.register_callback("safran_log_records_dropped_total", "counter",
+                           "Enregistrements de journal abandonnés (file pleine)",
+                           lambda: monitoring.get_logging_stats()["dropped"])
+
+@app.exception_handler(ExecutorSaturated)
+async def executor_saturated_handler(request, exc: ExecutorSaturated):
+    logger.warning(f"Surcharge du pool {exc.pool_name}, Retry-After={exc.retry_after}s")
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
 class ChatRequest(BaseModel):
     question: str
     profile: str = "CDI"
@@ -35,23 +98,77 @@ class ChatResponse(BaseModel):
     confidence: float
     intent: str
 
+class BatchChatRequest(BaseModel):
+    requests: List[ChatRequest]
+
+class BatchChatResponse(BaseModel):
+    results: List[ChatResponse]
+
 class LoginRequest(BaseModel):
     username: str
     password: str
 
+class KBReloadRequest(BaseModel):
+    kb: Optional[dict] = None
+
 class EvaluationRequest(BaseModel):
-    file_path: str
+    file_path: Optional[str] = None
+    dataset_id: Optional[str] = None
+    n_themes: int = 5
+    n_clusters: int = 3
+    threshold: float = 0.3
+    text_columns: Optional[List[str]] = None
+    group_by: Optional[List[str]] = None
+    clustering: str = "tfidf"
+    force: bool = False
+
+    def analysis_params(self) -> dict:
+        params = {"n_themes": self.n_themes, "n_clusters": self.n_clusters, "threshold": self.threshold}
+        # Mode groupé / multi-colonnes : uniquement si demandé, pour garder les clés de cache existantes.
+        if self.text_columns:
+            params["text_columns"] = self.text_columns
+        if self.group_by:
+            params["group_by"] = self.group_by
+        if self.clustering != "tfidf":
+            params["clustering"] = self.clustering
+        return params
 
 @app.post("/ask", response_model=ChatResponse)
 async def ask_chatbot(request: ChatRequest):
-    result = chatbot.ask(request.question, request.profile, request.language)
-    monitoring.log_chatbot_interaction(request.question, result["response"], result["confidence"], "user")
+    start = time.perf_counter()
+    result = await ask_batcher.submit((request.question, request.profile, request.language))
+    monitoring.log_chatbot_interaction(request.question, result["response"], result["confidence"], "user",
+                                       result["intent"], time.perf_counter() - start)
     return ChatResponse(
         response=result["response"],
         confidence=result["confidence"],
         intent=result["intent"]
     )
 
+@app.post("/ask/batch", response_model=BatchChatResponse)
+async def ask_chatbot_batch(request: BatchChatRequest):
+    items = [(r.question, r.profile, r.language) for r in request.requests]
+    start = time.perf_counter()
+    results = await ask_batcher.submit_many(items)
+    elapsed = time.perf_counter() - start
+    responses = []
+    for item, result in zip(request.requests, results):
+        monitoring.log_chatbot_interaction(item.question, result["response"], result["confidence"], "user",
+                                           result["intent"], elapsed)
+        responses.append(ChatResponse(
+            response=result["response"],
+            confidence=result["confidence"],
+            intent=result["intent"]
+        ))
+    return BatchChatResponse(results=responses)
+
+@app.get("/ask/stats")
+async def ask_stats():
+    stats = ask_batcher.get_stats()
+    stats["cache"] = chatbot.get_cache_stats()
+    stats["routing"] = chatbot.get_routing_stats()
+    return stats
+
 @app.post("/login")
 async def login(request: LoginRequest):
     result = auth_manager.authenticate(request.username, request.password)
@@ -62,17 +179,260 @@ async def login(request: LoginRequest):
     monitoring.log_user_login(request.username)
     return result
 
+def require_admin(authorization: Optional[str] = Header(None)) -> dict:
+    token = authorization[7:] if authorization and authorization.startswith("Bearer ") else None
+    session = auth_manager.verify_token(token) if token else None
+    if session is None:
+        raise HTTPException(status_code=401, detail="Authentification requise")
+    if session.get("role") != "admin":
+        monitoring.log_security_event("admin_denied", f"User={session.get('username')}")
+        raise HTTPException(status_code=403, detail="Réservé aux administrateurs")
+    return session
+
+@app.get("/admin/kb")
+async def kb_info(session: dict = Depends(require_admin)):
+    return chatbot.get_kb_stats()
+
+@app.post("/admin/kb/reload")
+async def reload_kb(request: Optional[KBReloadRequest] = None, session: dict = Depends(require_admin)):
+    # Sans KB dans la requête, le fichier KB_FILE est relu ; les requêtes /ask continuent sur l'ancienne version.
+    loop = asyncio.get_running_loop()
+    try:
+        summary = await loop.run_in_executor(None, chatbot.reload_kb, request.kb if request else None)
+    except (ValueError, OSError) as e:
+        raise HTTPException(status_code=422, detail=f"KB invalide : {e}")
+    logger.info(f"KB rechargée par {session['username']} : {summary['mode']}")
+    return summary
+
+def _resolve_evaluation_source(request: EvaluationRequest) -> str:
+    # Un dataset_id désigne un jeu déjà converti en Parquet par /evaluate/upload.
+    if request.dataset_id:
+        path = columnar_store.get(request.dataset_id) if request.dataset_id.isalnum() else None
+        if path is None:
+            raise HTTPException(status_code=404, detail="Jeu de données introuvable")
+        return path
+    if not request.file_path:
+        raise HTTPException(status_code=422, detail="file_path ou dataset_id requis")
+    return request.file_path
+
+def _check_analysis_params(file_path: str, params: dict):
+    if params.get("clustering", "tfidf") != "tfidf" and uses_streaming(
+            file_path, params.get("text_columns"), params.get("group_by")):
+        raise HTTPException(status_code=422,
+                            detail=f"clustering={params['clustering']} indisponible pour un fichier "
+                                   f"analysé en streaming")
+
+async def _grouped_report(file_path: str, params: dict) -> dict:
+    # Une tâche du pool pour charger et partitionner, puis une par (colonne, groupe), réunies ici.
+    pool = inference_executor.analysis
+    prepared = await pool.run(prepare_grouped_file, file_path, params.get("text_columns"), params.get("group_by"))
+    partition_params = {key: params[key] for key in ("n_themes", "n_clusters", "threshold", "clustering")
+                        if key in params}
+    start = time.perf_counter()
+    results = await pool.run_many(analyze_text_partition, [(texts,) for _, _, texts in prepared["partitions"]],
+                                  **partition_params)
+    return merge_grouped_report(prepared, results, (time.perf_counter() - start) * 1000.0)
+
+async def _analyze_with_cache(file_path: str, cache_key: str, params: dict, force: bool) -> dict:
+    loop = asyncio.get_running_loop()
+    # Lecture et décodage d'un rapport potentiellement volumineux : hors de la boucle asyncio.
+    report = None if force else await loop.run_in_executor(None, report_cache.get, cache_key)
+    if report is None:
+        if params.get("text_columns") or params.get("group_by"):
+            report = await _grouped_report(file_path, params)
+        else:
+            report = await inference_executor.analysis.run(analyze_file, file_path, **params)
+        observe_report_timings(report.get("timings_ms"))
+        await loop.run_in_executor(None, report_cache.put, cache_key, report)
+    monitoring.log_evaluation_processing(file_path, report.get("total_evaluations", 0))
+    return report
+
 @app.post("/evaluate")
-async def analyze_evaluations(request: EvaluationRequest):
+async def analyze_evaluations(request: EvaluationRequest, http_request: Request):
+    file_path = _resolve_evaluation_source(request)
+    params = request.analysis_params()
+    _check_analysis_params(file_path, params)
     try:
-        analyzer.load_evaluations(request.file_path)
-        report = analyzer.generate_report()
-        monitoring.log_evaluation_processing(request.file_path, report.get("total_evaluations", 0))
-        return report
+        cache_key = await asyncio.get_running_loop().run_in_executor(
+            None, report_key, file_path, params, request.dataset_id
+        )
+        report = await _analyze_with_cache(file_path, cache_key, params, request.force)
+        return await json_response(http_request, compact_report(report, cache_key))
+    except ExecutorSaturated:
+        raise
     except Exception as e:
         logger.error(f"Erreur analyse évaluations: {e}")
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.post("/evaluate/upload")
+async def upload_evaluations(
+    http_request: Request,
+    file: UploadFile = File(...),
+    n_themes: int = Form(5),
+    n_clusters: int = Form(3),
+    threshold: float = Form(0.3),
+    clustering: str = Form("tfidf"),
+    force: bool = Form(False),
+):
+    try:
+        spooled_path, content_hash = await spool_upload(file, UPLOAD_DIR)
+        params = {"n_themes": n_themes, "n_clusters": n_clusters, "threshold": threshold}
+        if clustering != "tfidf":
+            params["clustering"] = clustering
+        parquet_path = await asyncio.get_running_loop().run_in_executor(
+            None, columnar_store.ingest, spooled_path, content_hash
+        )
+        _check_analysis_params(parquet_path, params)
+        cache_key = report_key(parquet_path, params, dataset_id=content_hash)
+        report = await _analyze_with_cache(parquet_path, cache_key, params, force)
+        return await json_response(http_request, {**compact_report(report, cache_key), "dataset_id": content_hash})
+    except (ExecutorSaturated, HTTPException):
+        raise
+    except Exception as e:
+        logger.error(f"Erreur import évaluations: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/evaluate/cache/stats")
+async def report_cache_stats():
+    return report_cache.get_stats()
+
+async def _load_report_section(report_id: str, column: Optional[str], group: Optional[str]) -> dict:
+    # Détail d'un rapport déjà produit : relu depuis le cache de rapports.
+    try:
+        report = await asyncio.get_running_loop().run_in_executor(None, report_cache.get, report_id, False)
+    except KeyError:
+        report = None
+    if report is None:
+        raise HTTPException(status_code=404, detail="Rapport introuvable ou expiré, relancer l'analyse")
+    try:
+        return select_section(report, column, group)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Section de rapport introuvable")
+
+@app.get("/evaluate/reports/{report_id}/weak_signals")
+async def get_report_weak_signals(report_id: str, http_request: Request, offset: int = 0, limit: int = 100,
+                                  column: Optional[str] = None, group: Optional[str] = None):
+    section = await _load_report_section(report_id, column, group)
+    return await json_response(http_request, paginate(section.get("weak_signals", []), offset, limit,
+                                                      section.get("weak_signals_total")))
+
+@app.get("/evaluate/reports/{report_id}/clusters")
+async def get_report_clusters(report_id: str, http_request: Request, offset: int = 0, limit: int = 1000,
+                              format: str = "json", column: Optional[str] = None, group: Optional[str] = None):
+    section = await _load_report_section(report_id, column, group)
+    labels = section.get("clusters", {}).get("clusters", [])
+    if format == "parquet":
+        body = await asyncio.get_running_loop().run_in_executor(None, cluster_labels_parquet, labels)
+        return await encoded_response(http_request, body, media_type="application/vnd.apache.parquet")
+    return await json_response(http_request, paginate(labels, offset, limit))
+
+def _append_batch(dataset_id: Optional[str], batch_path: str, n_themes: int, n_clusters: int,
+                  text_column: Optional[str]) -> dict:
+    try:
+        batch = read_batch(batch_path)
+    finally:
+        os.remove(batch_path)
+    return evaluation_states.append(dataset_id, batch, n_themes, n_clusters, text_column)
+
+@app.post("/evaluate/append")
+async def append_evaluations(
+    file: UploadFile = File(...),
+    dataset_id: Optional[str] = Form(None),
+    n_themes: int = Form(5),
+    n_clusters: int = Form(3),
+    text_column: Optional[str] = Form(None),
+):
+    # Intègre un lot à l'état incrémental du jeu : coût proportionnel au lot, pas à l'historique.
+    try:
+        batch_path, _ = await spool_upload(file, UPLOAD_DIR)
+        report = await asyncio.get_running_loop().run_in_executor(
+            None, _append_batch, dataset_id, batch_path, n_themes, n_clusters, text_column
+        )
+    except KeyError:
+        raise HTTPException(status_code=422, detail="dataset_id invalide")
+    except Exception as e:
+        logger.error(f"Erreur ajout évaluations: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+    monitoring.log_evaluation_processing(report["dataset_id"], report["batch"]["rows"])
+    return report
+
+@app.get("/evaluate/state/{dataset_id}")
+async def export_evaluation_state(dataset_id: str):
+    try:
+        state = await asyncio.get_running_loop().run_in_executor(None, evaluation_states.load, dataset_id)
+    except KeyError:
+        state = None
+    if state is None:
+        raise HTTPException(status_code=404, detail="Jeu de données introuvable")
+    return state.to_dict()
+
+@app.post("/evaluate/state/{dataset_id}/merge")
+async def merge_evaluation_state(dataset_id: str, state: dict, n_themes: int = 5):
+    # Fusion d'un état exporté par GET /evaluate/state/{id} sur une autre machine.
+    try:
+        other = EvaluationState.from_dict(state)
+        return await asyncio.get_running_loop().run_in_executor(
+            None, evaluation_states.merge, dataset_id, other, n_themes
+        )
+    except KeyError:
+        raise HTTPException(status_code=422, detail="État ou dataset_id invalide")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/evaluate/jobs")
+async def submit_evaluation_job(request: EvaluationRequest):
+    file_path = _resolve_evaluation_source(request)
+    params = request.analysis_params()
+    _check_analysis_params(file_path, params)
+    # Création du répertoire du job et nettoyage éventuel : E/S disque hors de la boucle asyncio.
+    return await asyncio.get_running_loop().run_in_executor(
+        None, functools.partial(evaluation_jobs.submit, file_path, params, request.force,
+                                dataset_id=request.dataset_id)
+    )
+
+@app.get("/evaluate/jobs/stats")
+async def evaluation_jobs_stats():
+    return evaluation_jobs.get_stats()
+
+@app.get("/evaluate/jobs/{job_id}")
+async def get_evaluation_job(job_id: str):
+    status = evaluation_jobs.get_status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job introuvable")
+    return status
+
+@app.get("/evaluate/jobs/{job_id}/result")
+async def get_evaluation_job_result(job_id: str, http_request: Request):
+    status = evaluation_jobs.get_status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job introuvable")
+    if status.get("status") != "completed":
+        raise HTTPException(status_code=409, detail=f"Job non terminé ({status.get('status')})")
+    report = await asyncio.get_running_loop().run_in_executor(None, evaluation_jobs.get_result, job_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Résultat introuvable")
+    return await json_response(http_request, compact_report(report, status.get("report_id")))
+
+@app.get("/logs/stats")
+async def logs_stats():
+    return monitoring.get_logging_stats()
+
+@app.get("/kpis")
+async def get_kpis(window: str = "24h"):
+    try:
+        return monitoring.get_kpi_window(window)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+@app.get("/metrics")
+async def metrics():
+    # Format texte Prometheus ; les quantiles sont aussi exposés en jauges *_quantile_seconds.
+    return Response(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/inference/stats")
+async def inference_stats():
+    return inference_executor.get_stats()
+
 @app.get("/profiles")
 async def get_profiles():
     return {"profiles": chatbot.get_available_profiles()}
@@ -85,6 +445,14 @@ async def get_languages():
 async def health_check():
     return {"status": "ok", "service": "Safran RH API"}
 
+@app.on_event("shutdown")
+async def shutdown():
+    await ask_batcher.close()
+    chatbot.close()
+    inference_executor.shutdown()
+    evaluation_jobs.shutdown()
+    monitoring.close()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,109 @@
+"""Banc d'essai des backends d'encodage : latence, mémoire et parité des intentions.
+
+Chaque backend est chargé dans un processus séparé pour mesurer sa mémoire
+propre. Usage :
+
+    python -m benchmarks.encoders --backends torch,torch-int8,onnx --threads 4
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.encoders import DEFAULT_MODEL_NAME, ENCODER_BACKENDS, create_encoder, kb_intent_matches, parity_probes
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def run_backend(backend: str, model_name: str, threads: int, runs: int, probes: List[str]) -> Dict:
+    from data.kb_rh import KB_RH
+
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    encoder = create_encoder(backend, model_name, threads)
+    load_s = time.perf_counter() - start
+    rss_loaded = _rss_mb()
+
+    encoder.encode(probes[:8])
+    latencies = []
+    for i in range(runs):
+        start = time.perf_counter()
+        encoder.encode([probes[i % len(probes)]])
+        latencies.append((time.perf_counter() - start) * 1000.0)
+    start = time.perf_counter()
+    encoder.encode(probes, batch_size=32)
+    batch_s = time.perf_counter() - start
+
+    return {
+        "backend": backend,
+        "load_s": round(load_s, 2),
+        "memory_mb": round(rss_loaded - rss_before, 1),
+        "peak_rss_mb": round(_rss_mb(), 1),
+        "latency_p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "latency_p95_ms": round(float(np.percentile(latencies, 95)), 2),
+        "batch_per_s": round(len(probes) / batch_s, 1) if batch_s > 0 else None,
+        "intents": kb_intent_matches(encoder, KB_RH, probes),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backends", default=",".join(ENCODER_BACKENDS))
+    parser.add_argument("--model", default=DEFAULT_MODEL_NAME)
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--json", action="store_true", help="sortie JSON au lieu du tableau")
+    args = parser.parse_args()
+
+    from data.kb_rh import KB_RH
+    probes = parity_probes(KB_RH)
+    # PyTorch fp32 sert toujours de référence pour la parité.
+    backends = ["torch"] + [b for b in args.backends.split(",") if b and b != "torch"]
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for backend in backends:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            try:
+                results.append(pool.submit(run_backend, backend, args.model, args.threads,
+                                           args.runs, probes).result())
+            except Exception as e:
+                results.append({"backend": backend, "error": str(e)})
+
+    reference = results[0].get("intents")
+    for result in results:
+        intents = result.pop("intents", None)
+        if reference is not None and intents is not None:
+            result["intent_agreement"] = round(float(np.mean([a == b for a, b in zip(reference, intents)])), 4)
+
+    if args.json:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+        return
+    columns = ["backend", "load_s", "memory_mb", "latency_p50_ms", "latency_p95_ms", "batch_per_s", "intent_agreement"]
+    print(f"{len(probes)} questions, {args.threads} threads, {args.runs} encodages unitaires")
+    print(" | ".join(f"{c:>16}" for c in columns))
+    for result in results:
+        if "error" in result:
+            print(f"{result['backend']:>16} | erreur : {result['error']}")
+            continue
+        print(" | ".join(f"{str(result.get(c, '')):>16}" for c in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Banc d'essai du comptage par lexique : KeywordLexicon face aux boucles `kw in text.lower()`.
+
+Le corpus est construit à partir des commentaires de data/evaluations.csv
+(un ou deux par évaluation), éventuellement allongés de mots neutres
+(`--filler-words`). Usage :
+
+    python -m benchmarks.lexicon --size 100000 --filler-words 30
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, List
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data.lexicons import LEXICONS
+from utils.lexicon import KeywordLexicon
+
+FILLER = ("la session de formation a permis de revoir les procédures qualité avec le groupe "
+          "et les supports distribués pendant la journée sur site").split()
+
+
+def synthetic_comments(size: int, filler_words: int, seed: int = 42) -> List[str]:
+    comments = pd.read_csv(os.path.join("data", "evaluations.csv"))["commentaires"].dropna().tolist()
+    rng = np.random.default_rng(seed)
+    texts = []
+    for _ in range(size):
+        parts = list(rng.choice(comments, rng.integers(1, 3)))
+        if filler_words:
+            parts.insert(0, " ".join(rng.choice(FILLER, filler_words)))
+        texts.append(" ".join(parts))
+    return texts
+
+
+def baseline_counts(texts: List[str], lexicons: Dict[str, List[str]]) -> np.ndarray:
+    # Boucles d'origine de EvaluationAnalyzer : une recherche de sous-chaîne par mot-clé et par texte.
+    categories = list(lexicons)
+    counts = np.zeros((len(texts), len(categories)), dtype=np.int32)
+    for i, text in enumerate(texts):
+        text_lower = text.lower()
+        for j, category in enumerate(categories):
+            counts[i, j] = sum(1 for kw in lexicons[category] if kw in text_lower)
+    return counts
+
+
+def best_of(runs: int, func, *args) -> float:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--filler-words", default="0,30", help="mots neutres ajoutés par commentaire")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="sortie JSON au lieu du tableau")
+    args = parser.parse_args()
+
+    lexicon = KeywordLexicon(LEXICONS)
+    results = []
+    for filler_words in (int(n) for n in args.filler_words.split(",")):
+        texts = synthetic_comments(args.size, filler_words)
+        if not np.array_equal(lexicon.count_matrix(texts), baseline_counts(texts, LEXICONS)):
+            raise SystemExit("Comptes différents de la référence")
+        baseline_s = best_of(args.runs, baseline_counts, texts, LEXICONS)
+        lexicon_s = best_of(args.runs, lexicon.count_matrix, texts)
+        results.append({
+            "filler_words": filler_words,
+            "avg_chars": round(float(np.mean([len(text) for text in texts])), 1),
+            "baseline_s": round(baseline_s, 3),
+            "lexicon_s": round(lexicon_s, 3),
+            "speedup": round(baseline_s / lexicon_s, 2),
+        })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{args.size} commentaires, meilleur de {args.runs} passages")
+    columns = ["filler_words", "avg_chars", "baseline_s", "lexicon_s", "speedup"]
+    widths = {c: max(len(c), *(len(str(result[c])) for result in results)) for c in columns}
+    print(" | ".join(c.rjust(widths[c]) for c in columns))
+    for result in results:
+        print(" | ".join(str(result[c]).rjust(widths[c]) for c in columns))
+
+
+if __name__ == "__main__":
+    main()
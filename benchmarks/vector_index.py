@@ -0,0 +1,104 @@
+"""Banc d'essai des index vectoriels de la KB : rappel et latence face à la recherche exacte.
+
+Le corpus est soit un fichier .npy d'embeddings réels (`--embeddings`), soit
+un mélange de gaussiennes normalisé de même dimension que le modèle. Les
+requêtes sont des vecteurs du corpus bruités. Usage :
+
+    python -m benchmarks.vector_index --size 20000 --queries 500 --k 10
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, List
+import numpy as np
+import faiss
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.vector_index import IndexConfig, build_index, prepare_vectors
+
+# Paramètres affichés pour chaque type d'index.
+SEARCH_KNOBS = {"ivf": ("nlist", "nprobe"), "hnsw": ("hnsw_m", "ef_construction", "ef_search")}
+
+
+def synthetic_corpus(size: int, dim: int, n_topics: int = 200, seed: int = 42) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_topics, dim))
+    vectors = centers[rng.integers(0, n_topics, size)] + 0.5 * rng.normal(size=(size, dim))
+    return vectors.astype(np.float32)
+
+
+def make_queries(corpus: np.ndarray, n_queries: int, noise: float = 0.3, seed: int = 7) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    picks = corpus[rng.integers(0, len(corpus), n_queries)]
+    scale = np.linalg.norm(picks, axis=1, keepdims=True) / np.sqrt(corpus.shape[1])
+    return (picks + noise * scale * rng.normal(size=picks.shape)).astype(np.float32)
+
+
+def measure(config: IndexConfig, corpus: np.ndarray, queries: np.ndarray, truth: np.ndarray, k: int) -> Dict:
+    start = time.perf_counter()
+    index, params = build_index(corpus, config)
+    build_s = time.perf_counter() - start
+    vectors = prepare_vectors(queries, config)
+    latencies = []
+    found = np.empty((len(queries), k), dtype=np.int64)
+    for i in range(len(vectors)):
+        start = time.perf_counter()
+        _, found[i] = index.search(vectors[i:i + 1], k)
+        latencies.append((time.perf_counter() - start) * 1000.0)
+    recall_1 = float(np.mean(found[:, 0] == truth[:, 0]))
+    recall_k = float(np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)]))
+    return {
+        "index": config.index_type,
+        "params": {key: params[key] for key in SEARCH_KNOBS.get(config.index_type, ())},
+        "build_s": round(build_s, 2),
+        "size_mb": round(len(faiss.serialize_index(index)) / 1e6, 1),
+        "recall@1": round(recall_1, 4),
+        f"recall@{k}": round(recall_k, 4),
+        "latency_p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "latency_p95_ms": round(float(np.percentile(latencies, 95)), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--embeddings", help="fichier .npy d'embeddings (sinon corpus synthétique)")
+    parser.add_argument("--size", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", default="4,8,16", help="valeurs de nprobe testées pour IVF")
+    parser.add_argument("--ef-search", default="32,64,128", help="valeurs de efSearch testées pour HNSW")
+    parser.add_argument("--json", action="store_true", help="sortie JSON au lieu du tableau")
+    args = parser.parse_args()
+
+    corpus = np.load(args.embeddings).astype(np.float32) if args.embeddings else synthetic_corpus(args.size, args.dim)
+    queries = make_queries(corpus, args.queries)
+    # Vérité terrain : recherche exacte cosinus (flat-ip), la métrique des index approchés.
+    baseline = IndexConfig("flat-ip")
+    exact, _ = build_index(corpus, baseline)
+    _, truth = exact.search(prepare_vectors(queries, baseline), args.k)
+
+    configs: List[IndexConfig] = [baseline]
+    configs += [IndexConfig("ivf", nprobe=int(n)) for n in args.nprobe.split(",")]
+    configs += [IndexConfig("hnsw", ef_search=int(ef)) for ef in args.ef_search.split(",")]
+    results = [measure(config, corpus, queries, truth, args.k) for config in configs]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{len(corpus)} vecteurs de dimension {corpus.shape[1]}, {len(queries)} requêtes, k={args.k}")
+    columns = ["index", "params", "build_s", "size_mb", "recall@1", f"recall@{args.k}",
+               "latency_p50_ms", "latency_p95_ms"]
+    for result in results:
+        result["params"] = ",".join(f"{key}={value}" for key, value in result["params"].items())
+    widths = {c: max(len(c), *(len(str(result[c])) for result in results)) for c in columns}
+    print(" | ".join(c.rjust(widths[c]) for c in columns))
+    for result in results:
+        print(" | ".join(str(result[c]).rjust(widths[c]) for c in columns))
+
+
+if __name__ == "__main__":
+    main()
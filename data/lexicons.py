@@ -0,0 +1,6 @@
+LEXICONS = {
+    "blocked": ["salaire", "médical", "sanction", "discipline"],
+    "positive": ["excellent", "très bien", "satisfait", "bon", "super", "génial"],
+    "negative": ["mauvais", "décevant", "problème", "non satisfait", "nul", "horrible"],
+    "warning": ["problème", "difficile", "confus", "manque", "besoin", "améliorer"]
+}
@@ -1,101 +1,346 @@
 import os
+import threading
+import time
 import numpy as np
 from typing import Dict, List, Tuple, Optional
-from sentence_transformers import SentenceTransformer
-import faiss
-from data.kb_rh import KB_RH, PROFILE_ADAPTATIONS
+from data.kb_rh import LANGUAGES, PROFILE_ADAPTATIONS
+from modules.encoders import SentenceEncoder, check_intent_parity, create_encoder
+from modules.kb_index_cache import KBIndexCache, compute_kb_fingerprint
+from modules.knowledge_base import (KBFileWatcher, KBSnapshot, build_vectors, diff_kb, load_default_kb,
+                                    update_vectors, validate_kb)
+from modules.intent_router import KeywordRouter, PathStats
+from modules.response_table import ResponseTable
+from modules.vector_index import (IndexConfig, aggregate_hits, apply_search_params, build_index,
+                                  has_stable_ids, prepare_vectors)
+from utils.cache import LRUTTLCache
+from utils.metrics import CHATBOT_STAGE_LATENCY
+from utils.text import normalize_text
+from utils.lexicon import get_default_lexicon
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Histogrammes par étape, résolus une fois (pas de recherche de labels dans le chemin chaud).
+STAGE_BLOCKED = CHATBOT_STAGE_LATENCY.labels("blocked_check")
+STAGE_KEYWORD = CHATBOT_STAGE_LATENCY.labels("keyword")
+STAGE_CACHE = CHATBOT_STAGE_LATENCY.labels("match_cache")
+STAGE_ENCODE = CHATBOT_STAGE_LATENCY.labels("encode")
+STAGE_SEARCH = CHATBOT_STAGE_LATENCY.labels("search")
+STAGE_RESPONSE = CHATBOT_STAGE_LATENCY.labels("response_lookup")
+
 class ChatbotBackend:
-    def __init__(self):
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
-        self.kb_rh = KB_RH
+    def __init__(self, model_name: str = 'all-MiniLM-L6-v2', cache_dir: Optional[str] = None,
+                 encoder: Optional[SentenceEncoder] = None, kb_path: Optional[str] = None):
+        self.model_name = model_name
+        self.kb_path = kb_path or os.getenv("KB_FILE")
+        kb = load_default_kb(self.kb_path)
         self.profile_adaptations = PROFILE_ADAPTATIONS
-        self.index = None
-        self.kb_embeddings = None
-        self.kb_keys = []
-        self._build_index()
+        self.profiles = list(PROFILE_ADAPTATIONS)
+        self.languages = list(LANGUAGES)
+        self.encoder = encoder or self._load_encoder(model_name, kb)
+        self.index_config = IndexConfig.from_env()
+        # Voisins examinés par requête avant regroupement par intention.
+        self.search_candidates = int(os.getenv("KB_SEARCH_CANDIDATES", "10"))
+        self.fast_path = os.getenv("KEYWORD_FAST_PATH", "1").lower() not in ("0", "false", "no")
+        cache_dir = cache_dir if cache_dir is not None else os.getenv("KB_CACHE_DIR", "data/cache/kb")
+        self.index_cache = KBIndexCache(cache_dir) if cache_dir else None
+        cache_size = int(os.getenv("ANSWER_CACHE_SIZE", "10000"))
+        cache_ttl = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+        self.match_cache = LRUTTLCache(cache_size, cache_ttl)
+        self.path_stats = PathStats()
+        self.lexicon = get_default_lexicon()
+        self._reload_lock = threading.Lock()
+        self.kb_state = self._build_index(kb)
+        self._cache_fingerprint = self.kb_state.fingerprint
+        self.watcher = None
+        watch_interval = float(os.getenv("KB_WATCH_INTERVAL", "0"))
+        if self.kb_path and watch_interval > 0:
+            self.watcher = KBFileWatcher(self.kb_path, self.reload_kb, watch_interval)
+            self.watcher.start()
+    
+    # Vue de la version courante de la KB ; les traitements capturent `kb_state` une fois par appel.
+    @property
+    def kb_rh(self) -> Dict:
+        return self.kb_state.kb
+    
+    @property
+    def index(self):
+        return self.kb_state.index
+    
+    @property
+    def kb_embeddings(self) -> Optional[np.ndarray]:
+        return self.kb_state.embeddings
+    
+    @property
+    def kb_keys(self) -> List[str]:
+        return self.kb_state.keys
+    
+    @property
+    def kb_fingerprint(self) -> str:
+        return self.kb_state.fingerprint
+    
+    @property
+    def index_params(self) -> Dict:
+        return self.kb_state.params
+    
+    def _load_encoder(self, model_name: str, kb: Dict) -> SentenceEncoder:
+        encoder = create_encoder(model_name=model_name)
+        check = os.getenv("ENCODER_PARITY_CHECK", "0").lower() not in ("0", "false", "no")
+        if encoder.backend == "torch" or not check:
+            return encoder
+        # Backend accéléré retenu seulement s'il trouve les mêmes intentions que PyTorch fp32.
+        reference = create_encoder("torch", model_name)
+        parity = check_intent_parity(reference, encoder, kb)
+        if parity["mismatches"]:
+            logger.warning(f"Backend {encoder.backend} écarté : {len(parity['mismatches'])} intentions "
+                           f"différentes sur {parity['probes']}, repli sur torch")
+            return reference
+        logger.info(f"Backend {encoder.backend} validé sur {parity['probes']} questions de la KB")
+        return encoder
+    
+    def _fingerprint(self, kb: Dict) -> str:
+        return compute_kb_fingerprint(kb, self.encoder.cache_id, self.index_config.build_params())
+    
+    def _snapshot(self, kb: Dict, fingerprint: str, vectors: Tuple) -> KBSnapshot:
+        embeddings, ids, index, params = vectors
+        # Paramètres de construction de l'index, paramètres de recherche courants.
+        params = {**self.index_config.to_dict(), **params, "nprobe": self.index_config.nprobe,
+                  "ef_search": self.index_config.ef_search}
+        router = KeywordRouter(kb) if self.fast_path else None
+        responses = ResponseTable(kb, self.profiles, self.languages)
+        responses.log_report()
+        return KBSnapshot(kb, fingerprint, embeddings, ids, index, params, router, responses)
+    
+    def _save_snapshot(self, state: KBSnapshot):
+        if self.index_cache is not None and state.index is not None:
+            self.index_cache.save(state.fingerprint, state.embeddings, state.keys, state.index, state.params,
+                                  state.ids)
+    
+    def _build_index(self, kb: Dict) -> KBSnapshot:
+        fingerprint = self._fingerprint(kb)
+        if self.index_cache is not None:
+            cached = self.index_cache.load(fingerprint)
+            if cached is not None:
+                embeddings, _, index, params, ids = cached
+                apply_search_params(index, self.index_config)
+                if not has_stable_ids(index):
+                    # Ancienne entrée de cache : index repositionné sur des identifiants stables, sans ré-encodage.
+                    index, params = build_index(embeddings, self.index_config, ids)
+                return self._snapshot(kb, fingerprint, (embeddings, ids, index, params))
         
-    def _build_index(self):
-        kb_texts = []
-        for key, value in self.kb_rh.items():
-            if key != "default" and isinstance(value, dict):
-                keywords = value.get("keywords", [])
-                for kw in keywords:
-                    kb_texts.append(kw)
-                    self.kb_keys.append(key)
+        state = self._snapshot(kb, fingerprint, build_vectors(kb, self.encoder, self.index_config))
+        if state.index is not None:
+            logger.info(f"Index KB {self.index_config.index_type} : {state.index.ntotal} mots-clés")
+        self._save_snapshot(state)
+        return state
+    
+    def reload_kb(self, kb: Optional[Dict] = None) -> Dict:
+        """Recharge la KB (fichier KB_FILE par défaut) sans interrompre les requêtes.
         
-        if kb_texts:
-            self.kb_embeddings = self.model.encode(kb_texts)
-            self.index = faiss.IndexFlatL2(self.kb_embeddings.shape[1])
-            self.index.add(self.kb_embeddings.astype(np.float32))
+        Seuls les mots-clés nouveaux sont encodés ; le nouvel index est
+        construit à part puis la version courante est remplacée d'un bloc.
+        """
+        start = time.perf_counter()
+        with self._reload_lock:
+            if kb is None:
+                kb = load_default_kb(self.kb_path)
+            else:
+                validate_kb(kb)
+            previous = self.kb_state
+            fingerprint = self._fingerprint(kb)
+            summary = {"fingerprint": fingerprint[:12], "intents": diff_kb(previous.kb, kb)}
+            if fingerprint == previous.fingerprint:
+                summary.update(mode="unchanged", elapsed_ms=(time.perf_counter() - start) * 1000.0)
+                return summary
+            vectors, stats = update_vectors(previous, kb, self.encoder, self.index_config)
+            state = self._snapshot(kb, fingerprint, vectors)
+            # Affectation atomique : une requête voit l'ancienne ou la nouvelle version, jamais un mélange.
+            self.kb_state = state
+            self._save_snapshot(state)
+        summary.update(stats, elapsed_ms=(time.perf_counter() - start) * 1000.0)
+        logger.info(f"KB rechargée ({stats['mode']}) : {stats['keywords']} mots-clés, {stats['encoded']} encodés, "
+                    f"{stats['removed']} retirés en {summary['elapsed_ms']:.0f} ms")
+        return summary
+    
+    def close(self):
+        if self.watcher is not None:
+            self.watcher.stop()
     
     def _detect_blocked_question(self, question: str) -> bool:
-        blocked_keywords = ["salaire", "médical", "sanction", "discipline"]
-        question_lower = question.lower()
-        for keyword in blocked_keywords:
-            if keyword in question_lower:
-                return True
-        return False
+        return self.lexicon.contains_any(question, "blocked")
     
     def _find_best_match(self, question: str, top_k: int = 1) -> Tuple[str, float]:
-        if self.index is None or self.kb_embeddings is None:
-            return "default", 0.0
-        
-        question_embedding = self.model.encode([question])
-        distances, indices = self.index.search(question_embedding.astype(np.float32), top_k)
-        
-        if len(indices[0]) > 0:
-            best_idx = indices[0][0]
-            distance = distances[0][0]
-            confidence = 1.0 / (1.0 + distance)
-            matched_key = self.kb_keys[best_idx]
-            return matched_key, confidence
-        
-        return "default", 0.0
+        return self._find_best_matches(self.kb_state, [question], top_k)[0]
     
-    def _get_response(self, intent_key: str, profile: str, language: str) -> str:
-        if intent_key not in self.kb_rh:
-            return self.kb_rh["default"]["response"]
-        
-        intent_data = self.kb_rh[intent_key]
-        
-        if intent_data.get("blocked"):
-            return intent_data["responses"]["default"]
+    def _sync_caches(self):
+        # Les réponses en cache ne valent que pour la KB et le modèle qui les ont produites.
+        fingerprint = self.kb_state.fingerprint
+        if self._cache_fingerprint != fingerprint:
+            self.match_cache.clear()
+            self._cache_fingerprint = fingerprint
+    
+    def _find_best_matches(self, state: KBSnapshot, questions: List[str], top_k: int = 1) -> List[Tuple[str, float]]:
+        self._sync_caches()
+        if state.index is None or state.embeddings is None or not questions:
+            return [("default", 0.0) for _ in questions]
         
-        responses = intent_data.get("responses", {})
+        normalized = [normalize_text(q) for q in questions]
+        matches: List[Optional[Tuple[str, float]]] = [None] * len(questions)
         
-        if profile in responses:
-            return responses[profile]
+        if state.router is not None:
+            start = time.perf_counter()
+            for i, text in enumerate(normalized):
+                matches[i] = state.router.route(text)
+            elapsed = time.perf_counter() - start
+            STAGE_KEYWORD.observe(elapsed)
+            hits = sum(1 for m in matches if m is not None)
+            self.path_stats.record("keyword", hits, elapsed * 1000.0)
         
-        if language == "ar" and "darija" in responses:
-            return responses["darija"]
+        pending = [i for i, m in enumerate(matches) if m is None]
+        if pending:
+            embedded = self._find_embedding_matches(
+                state, [questions[i] for i in pending], [normalized[i] for i in pending], top_k
+            )
+            for i, match in zip(pending, embedded):
+                matches[i] = match
         
-        return responses.get("default", self.kb_rh["default"]["response"])
+        return matches
     
-    def ask(self, question: str, profile: str = "CDI", language: str = "fr") -> Dict:
-        if self._detect_blocked_question(question):
-            return {
-                "response": "Je ne peux pas répondre à cette question pour des raisons de confidentialité. Contactez RH directement.",
-                "confidence": 1.0,
-                "intent": "blocked"
-            }
+    def _find_embedding_matches(self, state: KBSnapshot, questions: List[str], normalized: List[str],
+                                top_k: int) -> List[Tuple[str, float]]:
+        start = time.perf_counter()
+        cache_keys = [(text, top_k) for text in normalized]
+        matches: List[Optional[Tuple[str, float]]] = []
+        missing: Dict[Tuple[str, int], str] = {}
+        for question, key in zip(questions, cache_keys):
+            cached = self.match_cache.get(key)
+            matches.append((cached[1], cached[2]) if cached is not None else None)
+            if cached is None and key not in missing:
+                missing[key] = question
+        elapsed = time.perf_counter() - start
+        STAGE_CACHE.observe(elapsed)
+        self.path_stats.record("cache", len(questions) - sum(1 for m in matches if m is None), elapsed * 1000.0)
         
-        intent_key, confidence = self._find_best_match(question)
-        response = self._get_response(intent_key, profile, language)
+        if missing:
+            start = time.perf_counter()
+            texts = list(missing.values())
+            question_embeddings = self.encoder.encode(texts)
+            encoded = time.perf_counter()
+            STAGE_ENCODE.observe(encoded - start)
+            ranked_intents = self._search_intents(state, question_embeddings, top_k)
+            STAGE_SEARCH.observe(time.perf_counter() - encoded)
+            # Pas de mise en cache si la KB a été rechargée pendant la recherche.
+            current = self.kb_state is state
+            
+            computed = {}
+            for key, embedding, intents in zip(missing, question_embeddings, ranked_intents):
+                if intents:
+                    intent_key, confidence, _ = intents[0]
+                else:
+                    intent_key, confidence = "default", 0.0
+                if current:
+                    self.match_cache.set(key, (embedding, intent_key, confidence))
+                computed[key] = (intent_key, confidence)
+            
+            self.path_stats.record("embedding", len(missing), (time.perf_counter() - start) * 1000.0)
+            matches = [m if m is not None else computed[key] for m, key in zip(matches, cache_keys)]
         
+        return matches
+    
+    def _search_intents(self, state: KBSnapshot, embeddings: np.ndarray,
+                        top_k: int = 1) -> List[List[Tuple[str, float, int]]]:
+        # Les voisins sont des mots-clés : on en examine plusieurs puis on regroupe par intention.
+        n_candidates = min(max(top_k, self.search_candidates), state.index.ntotal)
+        scores, indices = state.index.search(prepare_vectors(embeddings, self.index_config), n_candidates)
+        return [
+            aggregate_hits(row_scores, row_indices, state.intent_by_id, self.index_config, top_k)
+            for row_scores, row_indices in zip(scores, indices)
+        ]
+    
+    def search_intents(self, question: str, top_k: int = 3) -> List[Dict]:
+        """Meilleures intentions pour une question (confiance et nombre de mots-clés proches)."""
+        state = self.kb_state
+        if state.index is None or not question:
+            return []
+        ranked = self._search_intents(state, self.encoder.encode([question]), top_k)[0]
+        return [{"intent": intent, "confidence": confidence, "hits": hits} for intent, confidence, hits in ranked]
+    
+    def _get_response(self, state: KBSnapshot, intent_key: str, profile: str, language: str) -> str:
+        return state.responses.lookup(intent_key, profile, language)
+    
+    def _blocked_result(self) -> Dict:
+        return {
+            "response": "Je ne peux pas répondre à cette question pour des raisons de confidentialité. Contactez RH directement.",
+            "confidence": 1.0,
+            "intent": "blocked"
+        }
+    
+    def _build_result(self, state: KBSnapshot, intent_key: str, confidence: float, profile: str,
+                      language: str) -> Dict:
         return {
-            "response": response,
+            "response": self._get_response(state, intent_key, profile, language),
             "confidence": float(confidence),
             "intent": intent_key,
             "profile": profile,
             "language": language
         }
     
+    def ask(self, question: str, profile: str = "CDI", language: str = "fr") -> Dict:
+        with STAGE_BLOCKED.time():
+            blocked = self._detect_blocked_question(question)
+        if blocked:
+            return self._blocked_result()
+        
+        state = self.kb_state
+        intent_key, confidence = self._find_best_matches(state, [question])[0]
+        with STAGE_RESPONSE.time():
+            return self._build_result(state, intent_key, confidence, profile, language)
+    
+    def ask_batch(self, requests: List[Tuple[str, str, str]]) -> List[Dict]:
+        """Répond à plusieurs (question, profil, langue) avec un seul encode + une seule recherche FAISS."""
+        results: List[Optional[Dict]] = [None] * len(requests)
+        pending = []
+        with STAGE_BLOCKED.time():
+            for i, (question, _, _) in enumerate(requests):
+                if self._detect_blocked_question(question):
+                    results[i] = self._blocked_result()
+                else:
+                    pending.append(i)
+        
+        state = self.kb_state
+        matches = self._find_best_matches(state, [requests[i][0] for i in pending])
+        with STAGE_RESPONSE.time():
+            for i, (intent_key, confidence) in zip(pending, matches):
+                _, profile, language = requests[i]
+                results[i] = self._build_result(state, intent_key, confidence, profile, language)
+        
+        return results
+    
+    def get_cache_stats(self) -> Dict:
+        return {
+            "matches": self.match_cache.get_stats(),
+            "responses": {"entries": len(self.kb_state.responses)},
+        }
+    
+    def get_kb_stats(self) -> Dict:
+        state = self.kb_state
+        return {
+            "source": self.kb_path or "data/kb_rh.py",
+            "fingerprint": state.fingerprint[:12],
+            "intents": sum(1 for key in state.kb if key != "default"),
+            "keywords": len(state.keys),
+            "index": state.params,
+            "watching": self.watcher is not None,
+            "validation": state.responses.report,
+        }
+    
+    def get_routing_stats(self) -> Dict:
+        stats = self.path_stats.to_dict()
+        stats["keyword_fast_path"] = self.fast_path
+        return stats
+    
     def get_available_profiles(self) -> List[str]:
-        return list(self.profile_adaptations.keys())
+        return self.profiles
     
     def get_available_languages(self) -> List[str]:
-        return ["fr", "ar"]
+        return self.languages
@@ -0,0 +1,126 @@
+import os
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.metrics import silhouette_score
+from modules.encoders import DEFAULT_MODEL_NAME, SentenceEncoder, create_encoder
+from utils.embedding_cache import EmbeddingCache, text_key
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=2)
+def get_sentence_encoder(model_name: str = DEFAULT_MODEL_NAME) -> SentenceEncoder:
+    # Chargé une fois par processus (les workers du pool d'analyse sont réutilisés),
+    # avec le backend configuré pour le chatbot (ENCODER_BACKEND).
+    return create_encoder(model_name=model_name)
+
+
+def encode_comments(texts: Sequence[str], model: SentenceEncoder, cache: Optional[EmbeddingCache] = None,
+                    batch_size: int = 256) -> np.ndarray:
+    """Embeddings normalisés des commentaires, un encodage par texte distinct.
+
+    Les textes déjà présents dans le cache disque ne sont pas ré-encodés ; les
+    nouveaux sont encodés par grands lots puis ajoutés au cache.
+    """
+    unique_texts = list(dict.fromkeys(texts))
+    keys = [text_key(model.cache_id, text) for text in unique_texts]
+    cached = cache.get_many(keys) if cache is not None else {}
+    missing = [i for i, key in enumerate(keys) if key not in cached]
+    if missing:
+        encoded = model.encode([unique_texts[i] for i in missing], batch_size=batch_size, normalize=True)
+        new_items = {keys[i]: vector for i, vector in zip(missing, encoded)}
+        if cache is not None:
+            cache.put_many(new_items)
+        cached.update(new_items)
+    logger.info(f"Embeddings : {len(unique_texts)} textes distincts, {len(missing)} encodés")
+    by_text = {text: cached[key] for text, key in zip(unique_texts, keys)}
+    return np.vstack([by_text[text] for text in texts])
+
+
+class EmbeddingClusterer:
+    """Clustering des commentaires sur embeddings avec choix automatique de k.
+
+    k est choisi dans [k_min, k_max] par score de silhouette calculé sur un
+    échantillon de `sample_size` commentaires ; le modèle final est ajusté
+    sur l'ensemble. Le résultat donne les commentaires représentatifs de
+    chaque cluster (les plus proches du centroïde) plutôt qu'une étiquette
+    par ligne.
+    """
+
+    def __init__(self, model: Optional[SentenceEncoder] = None, model_name: str = DEFAULT_MODEL_NAME,
+                 cache: Optional[EmbeddingCache] = None, k_min: int = 2, k_max: int = 10,
+                 sample_size: int = 2000, batch_size: int = 256, n_representatives: int = 3):
+        self.model_name = model_name
+        self._model = model
+        self.cache = cache
+        self.k_min = k_min
+        self.k_max = k_max
+        self.sample_size = sample_size
+        self.batch_size = batch_size
+        self.n_representatives = n_representatives
+
+    @classmethod
+    def from_env(cls, model: Optional[SentenceEncoder] = None) -> "EmbeddingClusterer":
+        return cls(
+            model=model,
+            cache=EmbeddingCache.from_env(),
+            k_min=int(os.getenv("EMBEDDING_CLUSTERS_MIN_K", "2")),
+            k_max=int(os.getenv("EMBEDDING_CLUSTERS_MAX_K", "10")),
+            sample_size=int(os.getenv("SILHOUETTE_SAMPLE_SIZE", "2000")),
+            batch_size=int(os.getenv("EMBEDDING_BATCH_SIZE", "256")),
+        )
+
+    @property
+    def model(self) -> SentenceEncoder:
+        if self._model is None:
+            self._model = get_sentence_encoder(self.model_name)
+        return self._model
+
+    def _select_k(self, embeddings: np.ndarray, n_distinct: int) -> Dict[int, float]:
+        rng = np.random.default_rng(42)
+        if len(embeddings) > self.sample_size:
+            embeddings = embeddings[rng.choice(len(embeddings), self.sample_size, replace=False)]
+        scores = {}
+        for k in range(self.k_min, min(self.k_max, n_distinct - 1) + 1):
+            labels = MiniBatchKMeans(n_clusters=k, random_state=42, n_init=3,
+                                     batch_size=1024).fit_predict(embeddings)
+            if len(np.unique(labels)) < 2:
+                continue
+            scores[k] = float(silhouette_score(embeddings, labels, random_state=42))
+        return scores
+
+    def cluster(self, texts: List[str]) -> Dict:
+        texts = [text for text in texts if text.strip()]
+        n_distinct = len(set(texts))
+        if n_distinct <= self.k_min:
+            return {}
+        embeddings = encode_comments(texts, self.model, self.cache, self.batch_size)
+        scores = self._select_k(embeddings, n_distinct)
+        if not scores:
+            return {}
+        best_k = max(scores, key=scores.get)
+        kmeans = MiniBatchKMeans(n_clusters=best_k, random_state=42, n_init=3, batch_size=1024)
+        labels = kmeans.fit_predict(embeddings)
+        distances = np.linalg.norm(embeddings - kmeans.cluster_centers_[labels], axis=1)
+
+        representatives = []
+        for j in range(best_k):
+            members = np.flatnonzero(labels == j)
+            comments = []
+            for idx in members[np.argsort(distances[members], kind="stable")]:
+                if texts[idx] not in comments:
+                    comments.append(texts[idx])
+                if len(comments) >= self.n_representatives:
+                    break
+            representatives.append({"cluster": j, "size": int(len(members)), "comments": comments})
+
+        return {
+            "method": "embeddings",
+            "n_clusters": best_k,
+            "cluster_sizes": np.bincount(labels, minlength=best_k).tolist(),
+            "silhouette_scores": {str(k): round(score, 4) for k, score in scores.items()},
+            "representatives": representatives,
+        }
@@ -0,0 +1,254 @@
+import abc
+import inspect
+import os
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from modules.vector_index import IndexConfig, aggregate_hits, build_index, prepare_vectors
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_NAME = "all-MiniLM-L6-v2"
+ENCODER_BACKENDS = ("torch", "torch-int8", "onnx")
+
+
+def kb_keyword_texts(kb: Dict) -> Tuple[List[str], List[str]]:
+    """Mots-clés de la KB à indexer et intention associée à chacun."""
+    texts, keys = [], []
+    for key, value in kb.items():
+        if key != "default" and isinstance(value, dict):
+            for keyword in value.get("keywords", []):
+                texts.append(keyword)
+                keys.append(key)
+    return texts, keys
+
+
+class SentenceEncoder(abc.ABC):
+    """Interface commune des backends d'encodage de phrases.
+
+    `cache_id` identifie le modèle et le backend : les embeddings de backends
+    différents ne sont pas interchangeables (caches d'index et d'embeddings).
+    """
+
+    backend = "torch"
+
+    def __init__(self, model_name: str = DEFAULT_MODEL_NAME, threads: Optional[int] = None):
+        self.model_name = model_name
+        self.threads = threads
+
+    @property
+    def cache_id(self) -> str:
+        # Le backend PyTorch garde l'identifiant historique (caches existants valides).
+        return self.model_name if self.backend == "torch" else f"{self.model_name}@{self.backend}"
+
+    @abc.abstractmethod
+    def _encode(self, texts: List[str], batch_size: int) -> np.ndarray:
+        """Embeddings bruts (non normalisés) de `texts`."""
+
+    def encode(self, texts: Sequence[str], batch_size: int = 32, normalize: bool = False) -> np.ndarray:
+        embeddings = np.asarray(self._encode(list(texts), batch_size), dtype=np.float32)
+        if normalize:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings = embeddings / np.clip(norms, 1e-12, None)
+        return embeddings
+
+
+class TorchEncoder(SentenceEncoder):
+    """SentenceTransformer en fp32 sur CPU (comportement historique)."""
+
+    backend = "torch"
+
+    def __init__(self, model_name: str = DEFAULT_MODEL_NAME, threads: Optional[int] = None):
+        super().__init__(model_name, threads)
+        import torch
+        from sentence_transformers import SentenceTransformer
+        if threads:
+            torch.set_num_threads(threads)
+        self.model = SentenceTransformer(model_name, device="cpu")
+
+    def _encode(self, texts: List[str], batch_size: int) -> np.ndarray:
+        return self.model.encode(texts, batch_size=batch_size, show_progress_bar=False, convert_to_numpy=True)
+
+
+class QuantizedTorchEncoder(TorchEncoder):
+    """SentenceTransformer avec quantification dynamique int8 des couches linéaires."""
+
+    backend = "torch-int8"
+
+    def __init__(self, model_name: str = DEFAULT_MODEL_NAME, threads: Optional[int] = None):
+        super().__init__(model_name, threads)
+        import torch
+        # Poids des nn.Linear stockés en int8, activations quantifiées à la volée.
+        torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+class OnnxEncoder(SentenceEncoder):
+    """Transformer exporté en ONNX et exécuté par ONNX Runtime (CPU).
+
+    L'export est fait une fois dans `<export_dir>/<modèle>/model.onnx` ; le
+    pooling et la normalisation du pipeline SentenceTransformer sont
+    reproduits en numpy.
+    """
+
+    backend = "onnx"
+    POOLING_MODES = ("mean", "cls", "max")
+
+    def __init__(self, model_name: str = DEFAULT_MODEL_NAME, threads: Optional[int] = None,
+                 export_dir: str = "data/cache/onnx"):
+        super().__init__(model_name, threads)
+        import onnxruntime as ort
+        from sentence_transformers import SentenceTransformer
+        from sentence_transformers.models import Normalize, Pooling
+
+        model = SentenceTransformer(model_name, device="cpu")
+        pooling = next((module for module in model if isinstance(module, Pooling)), None)
+        self.pooling_mode = self._pooling_mode(pooling) if pooling is not None else "mean"
+        if self.pooling_mode not in self.POOLING_MODES:
+            raise ValueError(f"Pooling non supporté par le backend ONNX : {self.pooling_mode}")
+        self.normalize = any(isinstance(module, Normalize) for module in model)
+        self.tokenizer = model.tokenizer
+        self.max_seq_length = model.max_seq_length
+        path = self._export(model, export_dir)
+        # Seul le tokenizer est conservé : le modèle PyTorch est libéré après l'export.
+        del model
+
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {node.name for node in self.session.get_inputs()}
+
+    @staticmethod
+    def _pooling_mode(pooling) -> str:
+        config = pooling.get_config_dict()
+        if isinstance(config.get("pooling_mode"), str):
+            return config["pooling_mode"]
+        # Anciennes versions de sentence-transformers : un drapeau par mode.
+        flags = {"pooling_mode_cls_token": "cls", "pooling_mode_mean_tokens": "mean",
+                 "pooling_mode_max_tokens": "max"}
+        active = [key for key, value in config.items() if key.startswith("pooling_mode_") and value]
+        return flags.get(active[0], active[0]) if len(active) == 1 else "+".join(active)
+
+    def _export(self, model, export_dir: str) -> str:
+        import torch
+
+        target_dir = os.path.join(export_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", self.model_name))
+        path = os.path.join(target_dir, "model.onnx")
+        if os.path.exists(path):
+            return path
+        os.makedirs(target_dir, exist_ok=True)
+        sample = self.tokenizer(["export"], return_tensors="pt")
+        names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+
+        class HiddenStates(torch.nn.Module):
+            # Entrées nommées et seule sortie last_hidden_state, quelle que soit la version de transformers.
+            def __init__(self, transformer):
+                super().__init__()
+                self.transformer = transformer
+
+            def forward(self, *inputs):
+                return self.transformer(**dict(zip(names, inputs)))[0]
+
+        transformer = HiddenStates(model[0].auto_model.eval())
+        axes = {name: {0: "batch", 1: "sequence"} for name in names + ["last_hidden_state"]}
+        kwargs = {}
+        if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+            # Exporteur TorchScript : pas de dépendance à onnxscript.
+            kwargs["dynamo"] = False
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with torch.no_grad():
+            torch.onnx.export(transformer, tuple(sample[name] for name in names), tmp_path,
+                              input_names=names, output_names=["last_hidden_state"],
+                              dynamic_axes=axes, opset_version=14, do_constant_folding=True, **kwargs)
+        os.replace(tmp_path, path)
+        logger.info(f"Modèle {self.model_name} exporté en ONNX : {path}")
+        return path
+
+    def _encode(self, texts: List[str], batch_size: int) -> np.ndarray:
+        outputs = []
+        for start in range(0, len(texts), batch_size):
+            features = self.tokenizer(texts[start:start + batch_size], padding=True, truncation=True,
+                                      max_length=self.max_seq_length, return_tensors="np")
+            feeds = {name: array.astype(np.int64) for name, array in features.items() if name in self.input_names}
+            hidden = self.session.run(None, feeds)[0]
+            mask = features["attention_mask"][..., None].astype(np.float32)
+            if self.pooling_mode == "cls":
+                pooled = hidden[:, 0]
+            elif self.pooling_mode == "max":
+                pooled = np.where(mask > 0, hidden, -1e9).max(axis=1)
+            else:
+                pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            outputs.append(pooled)
+        if not outputs:
+            return np.empty((0, 0), dtype=np.float32)
+        embeddings = np.vstack(outputs)
+        if self.normalize:
+            embeddings = embeddings / np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings
+
+
+def create_encoder(backend: Optional[str] = None, model_name: str = DEFAULT_MODEL_NAME,
+                   threads: Optional[int] = None) -> SentenceEncoder:
+    """Encodeur du backend demandé (ENCODER_BACKEND, ENCODER_THREADS par défaut)."""
+    backend = backend or os.getenv("ENCODER_BACKEND", "torch")
+    if threads is None and os.getenv("ENCODER_THREADS"):
+        threads = int(os.getenv("ENCODER_THREADS"))
+    if backend == "torch":
+        return TorchEncoder(model_name, threads)
+    if backend == "torch-int8":
+        return QuantizedTorchEncoder(model_name, threads)
+    if backend == "onnx":
+        return OnnxEncoder(model_name, threads, os.getenv("ONNX_EXPORT_DIR", "data/cache/onnx"))
+    raise ValueError(f"Backend d'encodage inconnu : {backend} (attendu : {', '.join(ENCODER_BACKENDS)})")
+
+
+def parity_probes(kb: Dict) -> List[str]:
+    # Mots-clés seuls et insérés dans une question : proches des requêtes réelles.
+    keywords, _ = kb_keyword_texts(kb)
+    return keywords + [f"J'ai une question concernant {keyword}" for keyword in keywords]
+
+
+def kb_intent_matches(encoder: SentenceEncoder, kb: Dict, probes: Sequence[str],
+                      config: Optional[IndexConfig] = None, n_candidates: Optional[int] = None) -> List[str]:
+    """Intention retenue pour chaque question, recherchée comme dans ChatbotBackend.
+
+    Même type d'index (`IndexConfig.from_env()` par défaut) et mêmes
+    `KB_SEARCH_CANDIDATES` mots-clés voisins, regroupés par intention avec
+    `aggregate_hits`.
+    """
+    config = config or IndexConfig.from_env()
+    if n_candidates is None:
+        n_candidates = int(os.getenv("KB_SEARCH_CANDIDATES", "10"))
+    texts, keys = kb_keyword_texts(kb)
+    if not texts or not probes:
+        return ["default"] * len(probes)
+    index, _ = build_index(encoder.encode(texts), config)
+    scores, indices = index.search(prepare_vectors(encoder.encode(list(probes)), config),
+                                   min(max(n_candidates, 1), index.ntotal))
+    intent_by_id = dict(enumerate(keys))
+    matches = []
+    for row_scores, row_indices in zip(scores, indices):
+        hits = aggregate_hits(row_scores, row_indices, intent_by_id, config)
+        matches.append(hits[0][0] if hits else "default")
+    return matches
+
+
+def check_intent_parity(reference: SentenceEncoder, candidate: SentenceEncoder, kb: Dict,
+                        probes: Optional[Sequence[str]] = None) -> Dict:
+    """Compare les intentions trouvées par deux encodeurs sur les questions de la KB."""
+    probes = list(probes) if probes is not None else parity_probes(kb)
+    expected = kb_intent_matches(reference, kb, probes)
+    actual = kb_intent_matches(candidate, kb, probes)
+    mismatches = [
+        {"question": question, "reference": ref, "candidate": cand}
+        for question, ref, cand in zip(probes, expected, actual) if ref != cand
+    ]
+    return {
+        "reference": reference.backend,
+        "candidate": candidate.backend,
+        "probes": len(probes),
+        "agreement": 1.0 - len(mismatches) / len(probes) if probes else 1.0,
+        "mismatches": mismatches,
+    }
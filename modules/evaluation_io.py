@@ -0,0 +1,240 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from typing import List, Optional, Tuple
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+import logging
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXTENSIONS = (".csv", ".xlsx", ".parquet")
+
+
+async def spool_upload(upload, upload_dir: str = "data/uploads", chunk_size: int = 1 << 20) -> Tuple[str, str]:
+    """Écrit un `UploadFile` par morceaux dans un fichier temporaire.
+
+    Renvoie (chemin, sha256 du contenu) : l'empreinte est calculée pendant la
+    copie, sans relire le fichier.
+    """
+    import aiofiles
+
+    extension = os.path.splitext(upload.filename or "")[1].lower()
+    if extension not in SUPPORTED_EXTENSIONS:
+        raise ValueError(f"Format non supporté : {extension or upload.filename}")
+    os.makedirs(upload_dir, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix=extension, dir=upload_dir)
+    os.close(fd)
+    digest = hashlib.sha256()
+    try:
+        async with aiofiles.open(path, "wb") as out:
+            while True:
+                chunk = await upload.read(chunk_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                await out.write(chunk)
+    except Exception:
+        os.remove(path)
+        raise
+    return path, digest.hexdigest()
+
+
+def evaluation_columns(schema: pa.Schema) -> List[str]:
+    """Colonnes utiles à l'analyse : numériques et première colonne texte."""
+    numeric = [f.name for f in schema if pa.types.is_integer(f.type) or pa.types.is_floating(f.type)]
+    text = [f.name for f in schema if pa.types.is_string(f.type) or pa.types.is_large_string(f.type)]
+    return [f.name for f in schema if f.name in numeric or (text and f.name == text[0])]
+
+
+def string_columns(df: pd.DataFrame) -> List[str]:
+    """Colonnes de texte d'un DataFrame : `object` (pandas < 3) ou `str` / `string[pyarrow]`."""
+    return list(df.select_dtypes(include=["object", "string"]).columns)
+
+
+def read_parquet_columns(path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    if columns is None:
+        columns = evaluation_columns(pq.read_schema(path))
+    table = pq.read_table(path, columns=columns)
+    # self_destruct libère les buffers Arrow au fil de la conversion (pas de double copie).
+    return table.to_pandas(self_destruct=True, split_blocks=True)
+
+
+class ColumnarStore:
+    """Cache Parquet des jeux d'évaluations, adressé par empreinte du fichier d'origine.
+
+    Le premier chargement convertit le CSV / XLSX en `<cache_dir>/<sha256>.parquet` ;
+    les analyses suivantes du même contenu lisent uniquement les colonnes
+    nécessaires depuis ce fichier.
+    """
+
+    def __init__(self, cache_dir: str = "data/cache/columnar"):
+        self.cache_dir = cache_dir
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def path_for(self, content_hash: str) -> str:
+        return os.path.join(self.cache_dir, f"{content_hash}.parquet")
+
+    def get(self, content_hash: str) -> Optional[str]:
+        path = self.path_for(content_hash)
+        return path if os.path.exists(path) else None
+
+    def ingest(self, source_path: str, content_hash: str, keep_source: bool = False) -> str:
+        target = self.path_for(content_hash)
+        if os.path.exists(target):
+            if not keep_source:
+                os.remove(source_path)
+            return target
+
+        fd, tmp_path = tempfile.mkstemp(suffix=".parquet.tmp", dir=self.cache_dir)
+        os.close(fd)
+        try:
+            if source_path.endswith(".parquet"):
+                shutil.copyfile(source_path, tmp_path)
+            elif source_path.endswith(".csv"):
+                self._csv_to_parquet(source_path, tmp_path)
+            elif source_path.endswith(".xlsx"):
+                pd.read_excel(source_path).to_parquet(tmp_path, index=False)
+            else:
+                raise ValueError(f"Format non supporté : {source_path}")
+            os.replace(tmp_path, target)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        if not keep_source:
+            os.remove(source_path)
+        return target
+
+    def _csv_to_parquet(self, source_path: str, target_path: str):
+        try:
+            # Conversion par blocs : mémoire bornée quelle que soit la taille du CSV.
+            reader = pa_csv.open_csv(source_path)
+            with pq.ParquetWriter(target_path, reader.schema) as writer:
+                for batch in reader:
+                    writer.write_batch(batch)
+        except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+            # Types incohérents entre blocs ou lignes irrégulières : on laisse pandas inférer.
+            logger.warning(f"Conversion Arrow impossible ({e}), repli sur pandas")
+            df = pd.read_csv(source_path)
+            df.columns = [str(c) for c in df.columns]
+            df.to_parquet(target_path)
+
+
+RATING_MIN, RATING_MAX = 0, 10
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+
+class EvaluationSchema:
+    """Schéma déduit d'un échantillon : colonnes à lire et types compacts."""
+
+    def __init__(self, numeric_columns: List[str], category_columns: List[str],
+                 text_columns: List[str], sample_row_bytes: float):
+        self.numeric_columns = numeric_columns
+        self.category_columns = category_columns
+        self.text_columns = text_columns
+        self.sample_row_bytes = sample_row_bytes
+
+    @property
+    def text_column(self) -> Optional[str]:
+        return self.text_columns[0] if self.text_columns else None
+
+    @property
+    def usecols(self) -> List[str]:
+        return self.numeric_columns + self.category_columns + self.text_columns
+
+    def read_dtypes(self) -> dict:
+        # Les colonnes numériques sont réduites après lecture (voir _compact_numeric).
+        dtypes = {col: "category" for col in self.category_columns}
+        dtypes.update({col: "string[pyarrow]" for col in self.text_columns})
+        return dtypes
+
+
+def _read_sample(file_path: str, sample_rows: int) -> pd.DataFrame:
+    if file_path.endswith(".csv"):
+        return pd.read_csv(file_path, nrows=sample_rows)
+    if file_path.endswith(".xlsx"):
+        return pd.read_excel(file_path, nrows=sample_rows)
+    if file_path.endswith(".parquet"):
+        batches = pq.ParquetFile(file_path).iter_batches(batch_size=sample_rows)
+        batch = next(batches, None)
+        return batch.to_pandas() if batch is not None else pd.DataFrame()
+    raise ValueError(f"Format non supporté : {file_path}")
+
+
+def sniff_schema(file_path: str, sample_rows: int = 1000, text_columns: Optional[List[str]] = None,
+                 group_by: Optional[List[str]] = None) -> EvaluationSchema:
+    """Classe les colonnes sur un échantillon : numériques, texte répétitif, commentaire.
+
+    La première colonne de texte est la colonne de commentaires, comme au
+    chargement complet, et reste du texte même si elle varie peu ; parmi les
+    suivantes, le texte peu varié (intitulés de formation, sites…) devient
+    catégoriel et le texte libre n'est pas lu. `text_columns` et `group_by`
+    imposent les colonnes de commentaires et les clés de regroupement
+    (toujours catégorielles, exclues des statistiques).
+    """
+    sample = _read_sample(file_path, sample_rows)
+    group_by = list(group_by or [])
+    forced_text = list(text_columns or [])
+    missing = [col for col in group_by + forced_text if col not in sample.columns]
+    if missing:
+        raise ValueError(f"Colonnes absentes : {', '.join(map(str, missing))}")
+    reserved = set(group_by) | set(forced_text)
+    numeric_columns = [col for col in sample.select_dtypes(include=[np.number]).columns if col not in reserved]
+    category_columns, detected_text = list(group_by), []
+    for col in string_columns(sample):
+        if col in reserved:
+            continue
+        if not forced_text and not detected_text:
+            detected_text.append(col)
+            continue
+        values = sample[col].dropna()
+        if len(values) and values.nunique() / len(values) <= CATEGORY_MAX_UNIQUE_RATIO:
+            category_columns.append(col)
+    row_bytes = sample.memory_usage(deep=True).sum() / max(len(sample), 1)
+    return EvaluationSchema(numeric_columns, category_columns, forced_text or detected_text, row_bytes)
+
+
+def _compact_numeric(series: pd.Series) -> pd.Series:
+    # Notes entières (1-5…) → int8, autres entiers (identifiants) → plus petit
+    # entier suffisant, notes décimales ou incomplètes → float32. Une valeur non
+    # numérique hors de l'échantillon (« N/A »…) devient une valeur manquante.
+    series = pd.to_numeric(series, errors="coerce")
+    values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+    if len(values) and not np.isnan(values).any() and np.all(np.mod(values, 1) == 0):
+        if values.min() >= RATING_MIN and values.max() <= RATING_MAX:
+            return series.astype(np.int8)
+        return pd.to_numeric(series.astype(np.int64), downcast="integer")
+    return series.astype(np.float32)
+
+
+def read_evaluations_lean(file_path: str, schema: Optional[EvaluationSchema] = None) -> Tuple[pd.DataFrame, dict]:
+    """Charge uniquement les colonnes utiles avec des types compacts.
+
+    Renvoie le DataFrame et un rapport mémoire : empreinte estimée avec les
+    types par défaut (extrapolée depuis l'échantillon) et empreinte réelle.
+    """
+    schema = schema or sniff_schema(file_path)
+    usecols, dtypes = schema.usecols, schema.read_dtypes()
+    if file_path.endswith(".csv"):
+        df = pd.read_csv(file_path, usecols=usecols, dtype=dtypes)
+    elif file_path.endswith(".xlsx"):
+        df = pd.read_excel(file_path, usecols=usecols).astype(dtypes)
+    else:
+        df = read_parquet_columns(file_path, usecols).astype(dtypes)
+    df = df[usecols]
+    for col in schema.numeric_columns:
+        df[col] = _compact_numeric(df[col])
+    after = int(df.memory_usage(deep=True).sum())
+    before = int(schema.sample_row_bytes * len(df))
+    memory = {
+        "estimated_default_bytes": before,
+        "bytes": after,
+        "reduction_factor": round(before / after, 2) if after else None,
+        "dtypes": {col: str(dtype) for col, dtype in df.dtypes.items()},
+    }
+    return df, memory
@@ -0,0 +1,268 @@
+import json
+import math
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Optional
+from utils.executors import ExecutorSaturated
+from utils.report_cache import ReportCache
+import logging
+
+logger = logging.getLogger(__name__)
+
+STATUS_FILE = "status.json"
+RESULT_FILE = "result.json"
+# Intervalle minimal entre deux nettoyages du répertoire des jobs.
+CLEANUP_INTERVAL = 300.0
+
+
+def _write_json_atomic(path: str, data: Dict):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, default=str)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path: str) -> Optional[Dict]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def run_evaluation_job(jobs_dir: str, job_id: str, file_path: str, params: Optional[Dict] = None,
+                       cache_dir: Optional[str] = None, cache_max_bytes: int = 0, force: bool = False,
+                       dataset_id: Optional[str] = None) -> str:
+    # Exécuté dans un processus du pool : analyseur propre au job, progression
+    # et résultat écrits sur disque pour être lus par n'importe quel worker HTTP.
+    from modules.evaluations import analyze_file
+    from utils.report_cache import ReportCache, report_key
+    params = params or {}
+
+    job_dir = os.path.join(jobs_dir, job_id)
+    status_path = os.path.join(job_dir, STATUS_FILE)
+    status = _read_json(status_path) or {"id": job_id, "file_path": file_path}
+
+    def update(**fields):
+        status.update(fields, updated_at=datetime.now().isoformat())
+        _write_json_atomic(status_path, status)
+
+    def on_progress(stage: str, progress: float):
+        update(stage=stage, progress=round(progress, 3))
+
+    update(status="running", stage="loading", progress=0.0, started_at=datetime.now().isoformat())
+    start = time.perf_counter()
+    cached = False
+    try:
+        report, cache, cache_key = None, None, None
+        if cache_dir:
+            cache = ReportCache(cache_dir, cache_max_bytes)
+            cache_key = report_key(file_path, params, dataset_id)
+            report = None if force else cache.get(cache_key)
+            cached = report is not None
+        if report is None:
+            report = analyze_file(file_path, progress_callback=on_progress, **params)
+            if cache is not None:
+                cache.put(cache_key, report)
+        _write_json_atomic(os.path.join(job_dir, RESULT_FILE), report)
+    except Exception as e:
+        logger.error(f"Erreur job d'évaluation {job_id} : {e}")
+        update(status="failed", error=str(e), duration_s=round(time.perf_counter() - start, 3))
+        return "failed"
+    update(status="completed", stage="done", progress=1.0, cached=cached,
+           report_id=cache_key,
+           # Durées par étape d'un rapport calculé, reportées dans /metrics par le serveur.
+           timings_ms=None if cached else report.get("timings_ms"),
+           total_evaluations=report.get("total_evaluations", 0),
+           duration_s=round(time.perf_counter() - start, 3))
+    return "completed"
+
+
+class EvaluationJobManager:
+    """File de jobs d'analyse d'évaluations exécutés dans un pool de processus.
+
+    Chaque job a son répertoire `<jobs_dir>/<id>/` contenant `status.json`
+    (statut, étape, progression) et `result.json` une fois terminé ; l'état
+    ne dépend donc pas du worker HTTP qui a reçu la requête.
+
+    Au plus `max_parallel + max_queue` jobs sont en cours par worker ;
+    au-delà, `submit` lève `ExecutorSaturated` (réponse 429). Seuls les
+    `max_retained` jobs terminés les plus récents sont conservés sur disque :
+    le répertoire est nettoyé toutes les `CLEANUP_INTERVAL` secondes, ou plus
+    tôt si ce worker y a ajouté assez de jobs pour dépasser la limite.
+    """
+
+    def __init__(self, jobs_dir: str = "data/jobs", max_parallel: Optional[int] = None,
+                 retention_hours: float = 24.0, on_complete: Optional[Callable[[Dict], None]] = None,
+                 report_cache: Optional[ReportCache] = None, max_queue: int = 16, max_retained: int = 1000):
+        self.jobs_dir = jobs_dir
+        self.report_cache = report_cache
+        self.on_complete = on_complete
+        self.max_parallel = max_parallel or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.max_retained = max_retained
+        self.retention_hours = retention_hours
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._completed = 0
+        self._busy_seconds = 0.0
+        self.rejected = 0
+        # Répertoires de jobs vus au dernier nettoyage, plus ceux créés depuis par ce worker.
+        self._job_count = 0
+        self._last_cleanup = 0.0
+        os.makedirs(self.jobs_dir, exist_ok=True)
+
+    @classmethod
+    def from_env(cls, on_complete: Optional[Callable[[Dict], None]] = None,
+                 report_cache: Optional[ReportCache] = None) -> "EvaluationJobManager":
+        workers = os.getenv("EVALUATION_JOB_WORKERS")
+        return cls(
+            jobs_dir=os.getenv("EVALUATION_JOBS_DIR", "data/jobs"),
+            max_parallel=int(workers) if workers else None,
+            retention_hours=float(os.getenv("EVALUATION_JOB_RETENTION_HOURS", "24")),
+            on_complete=on_complete,
+            report_cache=report_cache,
+            max_queue=int(os.getenv("EVALUATION_JOB_QUEUE_SIZE", "16")),
+            max_retained=int(os.getenv("EVALUATION_JOB_MAX_RETAINED", "1000")),
+        )
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_parallel, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def _job_dir(self, job_id: str) -> str:
+        # L'identifiant vient de l'URL : on refuse tout ce qui n'est pas un uuid hexadécimal.
+        if not job_id or not all(c in "0123456789abcdef" for c in job_id):
+            raise KeyError(job_id)
+        return os.path.join(self.jobs_dir, job_id)
+
+    def _retry_after(self) -> int:
+        # Même estimation que BoundedPool : durée moyenne d'un job × jobs en attente devant le suivant.
+        avg = self._busy_seconds / self._completed if self._completed else 1.0
+        waiting = max(1, self._in_flight - self.max_parallel + 1)
+        return max(1, math.ceil(avg * waiting / self.max_parallel))
+
+    def submit(self, file_path: str, params: Optional[Dict] = None, force: bool = False,
+               dataset_id: Optional[str] = None) -> Dict:
+        with self._lock:
+            if self._in_flight >= self.max_parallel + self.max_queue:
+                self.rejected += 1
+                raise ExecutorSaturated("evaluation_jobs", self._retry_after(), 429)
+            self._in_flight += 1
+        try:
+            return self._submit(file_path, params, force, dataset_id)
+        except Exception:
+            with self._lock:
+                self._in_flight -= 1
+            raise
+
+    def _submit(self, file_path: str, params: Optional[Dict], force: bool, dataset_id: Optional[str]) -> Dict:
+        # Jobs en cours (au plus max_parallel + max_queue) exclus : seuls les jobs terminés déclenchent le nettoyage.
+        limit = self.max_retained + self.max_parallel + self.max_queue
+        if self._job_count >= limit or time.time() - self._last_cleanup >= CLEANUP_INTERVAL:
+            self.cleanup()
+        self._job_count += 1
+        job_id = uuid.uuid4().hex
+        job_dir = self._job_dir(job_id)
+        os.makedirs(job_dir)
+        status = {
+            "id": job_id,
+            "file_path": file_path,
+            "params": params or {},
+            "status": "queued",
+            "stage": None,
+            "progress": 0.0,
+            "created_at": datetime.now().isoformat(),
+        }
+        _write_json_atomic(os.path.join(job_dir, STATUS_FILE), status)
+        cache = self.report_cache
+        future = self._get_executor().submit(
+            run_evaluation_job, self.jobs_dir, job_id, file_path, params,
+            cache.cache_dir if cache else None, cache.max_bytes if cache else 0, force, dataset_id,
+        )
+        submitted = time.perf_counter()
+        future.add_done_callback(lambda f: self._on_done(job_id, f, submitted))
+        return status
+
+    def _on_done(self, job_id: str, future, submitted: float):
+        with self._lock:
+            self._in_flight -= 1
+            self._completed += 1
+            self._busy_seconds += time.perf_counter() - submitted
+        if future.cancelled():
+            return
+        status_path = os.path.join(self._job_dir(job_id), STATUS_FILE)
+        if future.exception() is not None:
+            # Un processus tué n'a pas pu écrire son statut final.
+            status = _read_json(status_path) or {"id": job_id}
+            status.update(status="failed", error=str(future.exception()))
+            _write_json_atomic(status_path, status)
+        elif future.result() == "completed":
+            status = _read_json(status_path) or {"id": job_id}
+            if self.report_cache is not None and status.get("report_id"):
+                # Le cache est consulté dans le processus du job : on reporte le résultat ici.
+                self.report_cache.record(bool(status.get("cached")))
+            if self.on_complete is not None:
+                try:
+                    self.on_complete(status)
+                except Exception as e:
+                    logger.error(f"Erreur callback de fin de job {job_id} : {e}")
+
+    def get_status(self, job_id: str) -> Optional[Dict]:
+        try:
+            return _read_json(os.path.join(self._job_dir(job_id), STATUS_FILE))
+        except KeyError:
+            return None
+
+    def get_result(self, job_id: str) -> Optional[Dict]:
+        try:
+            return _read_json(os.path.join(self._job_dir(job_id), RESULT_FILE))
+        except KeyError:
+            return None
+
+    def cleanup(self):
+        self._last_cleanup = time.time()
+        cutoff = self._last_cleanup - self.retention_hours * 3600 if self.retention_hours > 0 else None
+        finished, kept = [], 0
+        for name in os.listdir(self.jobs_dir):
+            path = os.path.join(self.jobs_dir, name)
+            if not os.path.isdir(path):
+                continue
+            mtime = os.path.getmtime(path)
+            if cutoff is not None and mtime < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+                continue
+            kept += 1
+            if (_read_json(os.path.join(path, STATUS_FILE)) or {}).get("status") in ("completed", "failed"):
+                finished.append((mtime, path))
+        # Jobs en cours jamais supprimés : bornés par max_queue.
+        finished.sort()
+        excess = finished[:max(0, len(finished) - self.max_retained)]
+        for _, path in excess:
+            shutil.rmtree(path, ignore_errors=True)
+        self._job_count = kept - len(excess)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "max_parallel": self.max_parallel,
+                "max_queue": self.max_queue,
+                "max_retained": self.max_retained,
+                "in_flight": self._in_flight,
+                "completed": self._completed,
+                "rejected": self.rejected,
+            }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
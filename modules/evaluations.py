@@ -1,25 +1,58 @@
+import heapq
+import os
+import time
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Tuple
-from sklearn.feature_extraction.text import TfidfVectorizer
+from typing import Callable, Dict, List, Optional, Tuple
 from sklearn.cluster import KMeans
+from modules.evaluation_io import string_columns
+from modules.text_features import TextFeatures
+from utils.lexicon import KeywordLexicon, get_default_lexicon
 import logging
 
 logger = logging.getLogger(__name__)
 
+CLUSTERING_METHODS = ("tfidf", "embeddings")
+
+# Signaux faibles conservés dans un rapport (les plus forts), comme en mode streaming.
+MAX_WEAK_SIGNALS = 1000
+
+REPORT_STAGES = ["features", "quantitative", "sentiment", "themes", "clusters", "weak_signals"]
+
+ProgressCallback = Callable[[str, float], None]
+
 class EvaluationAnalyzer:
-    def __init__(self):
+    def __init__(self, lexicon: KeywordLexicon = None, clusterer=None):
         self.evaluations = None
         self.sentiment_scores = {}
         self.themes = {}
         self.clusters = {}
+        self.lexicon = lexicon or get_default_lexicon()
+        self.clusterer = clusterer
+        self._features = {}
+        self.memory_report = None
         
-    def load_evaluations(self, file_path: str) -> pd.DataFrame:
+    def load_evaluations(self, file_path: str, lean: bool = False,
+                         text_columns: Optional[List[str]] = None,
+                         group_by: Optional[List[str]] = None) -> pd.DataFrame:
         try:
-            if file_path.endswith('.csv'):
+            self._features = {}
+            self.memory_report = None
+            extra_columns = bool(text_columns or group_by)
+            if lean:
+                from modules.evaluation_io import read_evaluations_lean, sniff_schema
+                schema = sniff_schema(file_path, text_columns=text_columns, group_by=group_by) if extra_columns else None
+                self.evaluations, self.memory_report = read_evaluations_lean(file_path, schema)
+                logger.info(f"Chargement compact {file_path} : {self.memory_report['bytes']} octets "
+                            f"(estimé {self.memory_report['estimated_default_bytes']} par défaut)")
+            elif file_path.endswith('.csv'):
                 self.evaluations = pd.read_csv(file_path)
             elif file_path.endswith('.xlsx'):
                 self.evaluations = pd.read_excel(file_path)
+            elif file_path.endswith('.parquet'):
+                from modules.evaluation_io import read_parquet_columns
+                # Colonnes de texte et clés de regroupement demandées : lecture complète.
+                self.evaluations = pd.read_parquet(file_path) if extra_columns else read_parquet_columns(file_path)
             return self.evaluations
         except Exception as e:
             logger.error(f"Erreur lors du chargement : {e}")
@@ -41,27 +74,23 @@ class EvaluationAnalyzer:
         
         return analysis
     
+    def text_features(self, text_column: str) -> TextFeatures:
+        # Tokenisation, matrice de termes et comptes de lexiques calculés une
+        # seule fois par colonne et partagés par toutes les étapes du rapport.
+        if text_column not in self._features:
+            self._features[text_column] = TextFeatures(self.evaluations[text_column], self.lexicon)
+        return self._features[text_column]
+    
     def analyze_sentiment(self, text_column: str) -> Dict:
         if self.evaluations is None or text_column not in self.evaluations.columns:
             return {}
         
-        texts = self.evaluations[text_column].fillna("")
+        counts = self.text_features(text_column).lexicon_counts
+        pos_count = self.lexicon.column(counts, "positive")
+        neg_count = self.lexicon.column(counts, "negative")
         
-        positive_keywords = ["excellent", "très bien", "satisfait", "bon", "super", "génial"]
-        negative_keywords = ["mauvais", "décevant", "problème", "non satisfait", "nul", "horrible"]
-        
-        sentiments = []
-        for text in texts:
-            text_lower = text.lower()
-            pos_count = sum(1 for kw in positive_keywords if kw in text_lower)
-            neg_count = sum(1 for kw in negative_keywords if kw in text_lower)
-            
-            if pos_count > neg_count:
-                sentiments.append("positif")
-            elif neg_count > pos_count:
-                sentiments.append("négatif")
-            else:
-                sentiments.append("neutre")
+        sentiments = np.where(pos_count > neg_count, "positif",
+                              np.where(neg_count > pos_count, "négatif", "neutre"))
         
         sentiment_dist = pd.Series(sentiments).value_counts().to_dict()
         
@@ -76,12 +105,8 @@ class EvaluationAnalyzer:
         if self.evaluations is None or text_column not in self.evaluations.columns:
             return {}
         
-        texts = self.evaluations[text_column].fillna("")
-        
-        vectorizer = TfidfVectorizer(max_features=n_themes, stop_words='french')
         try:
-            tfidf_matrix = vectorizer.fit_transform(texts)
-            feature_names = vectorizer.get_feature_names_out()
+            tfidf_matrix, feature_names = self.text_features(text_column).tfidf(n_themes)
             
             themes = {
                 "themes": list(feature_names),
@@ -96,11 +121,8 @@ class EvaluationAnalyzer:
         if self.evaluations is None or text_column not in self.evaluations.columns:
             return {}
         
-        texts = self.evaluations[text_column].fillna("")
-        
-        vectorizer = TfidfVectorizer(max_features=100, stop_words='french')
         try:
-            tfidf_matrix = vectorizer.fit_transform(texts)
+            tfidf_matrix, _ = self.text_features(text_column).tfidf(100)
             kmeans = KMeans(n_clusters=n_clusters, random_state=42)
             clusters = kmeans.fit_predict(tfidf_matrix)
             
@@ -114,46 +136,115 @@ class EvaluationAnalyzer:
             logger.error(f"Erreur clustering : {e}")
             return {}
     
-    def detect_weak_signals(self, text_column: str, threshold: float = 0.3) -> List[str]:
+    def cluster_comments_embeddings(self, text_column: str) -> Dict:
+        # Embeddings du modèle du chatbot (cache disque par commentaire), k choisi par silhouette.
+        if self.evaluations is None or text_column not in self.evaluations.columns:
+            return {}
+        
+        try:
+            if self.clusterer is None:
+                from modules.comment_clustering import EmbeddingClusterer
+                self.clusterer = EmbeddingClusterer.from_env()
+            return self.clusterer.cluster(self.text_features(text_column).texts.tolist())
+        except Exception as e:
+            logger.error(f"Erreur clustering par embeddings : {e}")
+            return {}
+    
+    def detect_weak_signals(self, text_column: str, threshold: float = 0.3,
+                            top_k: Optional[int] = None) -> List[str]:
         if self.evaluations is None or text_column not in self.evaluations.columns:
             return []
         
-        texts = self.evaluations[text_column].fillna("")
-        weak_signals = []
+        features = self.text_features(text_column)
+        texts = features.texts.to_numpy()
+        warning_counts = self.lexicon.column(features.lexicon_counts, "warning")
+        n_keywords = max(self.lexicon.size("warning"), 1)
         
-        warning_keywords = ["problème", "difficile", "confus", "manque", "besoin", "améliorer"]
+        candidates = np.flatnonzero(warning_counts)
+        levels = np.minimum(warning_counts[candidates] / n_keywords, 1.0)
+        # Tri par niveau décroissant, ordre des lignes à niveau égal ; top_k via un tas.
+        ranked = zip(levels.tolist(), candidates.tolist())
+        if top_k is not None:
+            ranked = heapq.nlargest(top_k, ranked, key=lambda item: (item[0], -item[1]))
+        else:
+            ranked = sorted(ranked, key=lambda item: item[0], reverse=True)
         
-        for idx, text in enumerate(texts):
-            text_lower = text.lower()
-            warning_count = sum(1 for kw in warning_keywords if kw in text_lower)
-            
-            if warning_count > 0:
-                weak_signals.append({
-                    "index": idx,
-                    "text": text,
-                    "warning_level": min(warning_count / len(warning_keywords), 1.0)
-                })
-        
-        return sorted(weak_signals, key=lambda x: x["warning_level"], reverse=True)
+        return [
+            {"index": idx, "text": texts[idx], "warning_level": level}
+            for level, idx in ranked
+        ]
+    
+    def count_weak_signals(self, text_column: str) -> int:
+        # Nombre total de signaux faibles, y compris ceux écartés par top_k.
+        if self.evaluations is None or text_column not in self.evaluations.columns:
+            return 0
+        features = self.text_features(text_column)
+        return int(np.count_nonzero(self.lexicon.column(features.lexicon_counts, "warning")))
     
-    def generate_report(self) -> Dict:
+    def generate_report(self, progress_callback: Optional[ProgressCallback] = None,
+                        n_themes: int = 5, n_clusters: int = 3, threshold: float = 0.3,
+                        clustering: str = "tfidf", max_weak_signals: Optional[int] = MAX_WEAK_SIGNALS) -> Dict:
         if self.evaluations is None:
             return {}
+        if clustering not in CLUSTERING_METHODS:
+            raise ValueError(f"Méthode de clustering inconnue : {clustering}")
         
-        text_cols = self.evaluations.select_dtypes(include=['object']).columns
-        text_column = text_cols[0] if len(text_cols) > 0 else None
+        text_cols = string_columns(self.evaluations)
+        text_column = text_cols[0] if text_cols else None
+        timings = {}
+        
+        def timed(stage, fn, *args, default=None):
+            start = time.perf_counter()
+            result = fn(*args) if text_column or stage == "quantitative" else default
+            timings[stage] = round((time.perf_counter() - start) * 1000.0, 3)
+            if progress_callback is not None:
+                progress_callback(stage, (REPORT_STAGES.index(stage) + 1) / len(REPORT_STAGES))
+            return result
+        
+        timed("features", lambda: self.text_features(text_column).build())
         
         report = {
             "total_evaluations": len(self.evaluations),
-            "quantitative": self.analyze_quantitative(),
-            "sentiment": self.analyze_sentiment(text_column) if text_column else {},
-            "themes": self.extract_themes(text_column) if text_column else {},
-            "clusters": self.cluster_comments(text_column) if text_column else {},
-            "weak_signals": self.detect_weak_signals(text_column) if text_column else []
+            "quantitative": timed("quantitative", self.analyze_quantitative),
+            "sentiment": timed("sentiment", self.analyze_sentiment, text_column, default={}),
+            "themes": timed("themes", self.extract_themes, text_column, n_themes, default={}),
+            "clusters": (timed("clusters", self.cluster_comments_embeddings, text_column, default={})
+                         if clustering == "embeddings" else
+                         timed("clusters", self.cluster_comments, text_column, n_clusters, default={})),
+            "weak_signals": timed("weak_signals", self.detect_weak_signals, text_column, threshold,
+                                  max_weak_signals, default=[]),
+            "weak_signals_total": self.count_weak_signals(text_column),
+            "timings_ms": timings
         }
+        if self.memory_report is not None:
+            report["memory"] = self.memory_report
         
         return report
     
+    def generate_grouped_report(self, text_columns: Optional[List[str]] = None,
+                                group_by: Optional[List[str]] = None,
+                                progress_callback: Optional[ProgressCallback] = None,
+                                n_themes: int = 5, n_clusters: int = 3, threshold: float = 0.3,
+                                clustering: str = "tfidf") -> Dict:
+        """Rapport multi-colonnes, ventilé par groupe (session, formateur, site…)."""
+        if self.evaluations is None:
+            return {}
+        from modules.grouped_reports import generate_grouped_report
+        
+        report = generate_grouped_report(self.evaluations, self.grouped_text_columns(text_columns, group_by),
+                                         group_by, n_themes, n_clusters, threshold, clustering=clustering,
+                                         progress_callback=progress_callback)
+        if self.memory_report is not None:
+            report["memory"] = self.memory_report
+        return report
+    
+    def grouped_text_columns(self, text_columns: Optional[List[str]] = None,
+                             group_by: Optional[List[str]] = None) -> List[str]:
+        # Par défaut, première colonne de texte qui n'est pas une clé de regroupement.
+        if text_columns:
+            return list(text_columns)
+        return [col for col in string_columns(self.evaluations) if col not in (group_by or [])][:1]
+    
     def export_to_csv(self, output_path: str) -> bool:
         try:
             if self.evaluations is not None:
@@ -162,3 +253,69 @@ class EvaluationAnalyzer:
         except Exception as e:
             logger.error(f"Erreur export CSV : {e}")
         return False
+
+
+def uses_streaming(file_path: str, text_columns: Optional[List[str]] = None,
+                   group_by: Optional[List[str]] = None) -> bool:
+    """Vrai si `analyze_file` analysera ce fichier par morceaux (gros fichier, mode simple)."""
+    from modules.streaming_analysis import should_stream
+    return not (text_columns or group_by) and should_stream(file_path)
+
+
+def _load_analyzer(file_path: str, lean: Optional[bool], text_columns: Optional[List[str]],
+                   group_by: Optional[List[str]]) -> Tuple[EvaluationAnalyzer, float]:
+    analyzer = EvaluationAnalyzer()
+    if lean is None:
+        lean = os.getenv("EVALUATION_LEAN_LOADING", "1").lower() not in ("0", "false", "no")
+    start = time.perf_counter()
+    if analyzer.load_evaluations(file_path, lean=lean, text_columns=text_columns, group_by=group_by) is None:
+        raise ValueError(f"Impossible de charger le fichier : {file_path}")
+    return analyzer, round((time.perf_counter() - start) * 1000.0, 3)
+
+
+def prepare_grouped_file(file_path: str, text_columns: Optional[List[str]] = None,
+                         group_by: Optional[List[str]] = None, lean: bool = None) -> Dict:
+    """Chargement, statistiques et partitions d'un rapport groupé (tâche du pool d'analyse).
+
+    Le serveur soumet ensuite chaque partition au pool (`analyze_text_partition`)
+    et réunit les résultats avec `merge_grouped_report`.
+    """
+    from modules.grouped_reports import prepare_grouped_report
+    analyzer, loading_ms = _load_analyzer(file_path, lean, text_columns, group_by)
+    prepared = prepare_grouped_report(analyzer.evaluations, analyzer.grouped_text_columns(text_columns, group_by),
+                                      group_by)
+    prepared["timings_ms"] = {"loading": loading_ms, **prepared["timings_ms"]}
+    if analyzer.memory_report is not None:
+        prepared["memory"] = analyzer.memory_report
+    return prepared
+
+
+def analyze_file(file_path: str, streaming: bool = None,
+                 progress_callback: Optional[ProgressCallback] = None,
+                 n_themes: int = 5, n_clusters: int = 3, threshold: float = 0.3,
+                 lean: bool = None, text_columns: Optional[List[str]] = None,
+                 group_by: Optional[List[str]] = None, clustering: str = "tfidf") -> Dict:
+    # Point d'entrée picklable pour le pool de processus : un analyseur par appel.
+    # Les gros fichiers sont analysés par morceaux, à mémoire bornée ; le mode
+    # groupé / multi-colonnes travaille en mémoire (chargement compact).
+    from modules.streaming_analysis import StreamingEvaluationAnalyzer
+    grouped = bool(text_columns or group_by)
+    if streaming is None:
+        streaming = uses_streaming(file_path, text_columns, group_by)
+    if streaming:
+        if clustering != "tfidf":
+            # Le clustering par embeddings encode tous les commentaires en mémoire.
+            raise ValueError(f"Clustering {clustering} indisponible pour un fichier analysé en streaming")
+        streaming_analyzer = StreamingEvaluationAnalyzer(n_themes=n_themes, n_clusters=n_clusters)
+        return streaming_analyzer.generate_report(file_path, progress_callback)
+    
+    if progress_callback is not None:
+        progress_callback("loading", 0.0)
+    analyzer, loading_ms = _load_analyzer(file_path, lean, text_columns, group_by)
+    if grouped:
+        return analyzer.generate_grouped_report(text_columns, group_by, progress_callback,
+                                                n_themes, n_clusters, threshold, clustering)
+    report = analyzer.generate_report(progress_callback, n_themes, n_clusters, threshold, clustering)
+    if "timings_ms" in report:
+        report["timings_ms"] = {"loading": loading_ms, **report["timings_ms"]}
+    return report
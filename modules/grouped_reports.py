@@ -0,0 +1,167 @@
+import time
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+import logging
+
+logger = logging.getLogger(__name__)
+
+ALL_GROUPS = "global"
+GROUP_SEPARATOR = " / "
+
+# Statistiques calculées par l'agrégation groupée, dans le format de analyze_quantitative.
+QUANTITATIVE_STATS = {"mean": "moyennes", "median": "medians", "std": "std", "min": "min", "max": "max"}
+
+
+def _json_safe(value):
+    # NaN (écart-type d'un groupe d'une seule ligne…) → None dans le rapport JSON.
+    if isinstance(value, (float, np.floating)) and np.isnan(value):
+        return None
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def group_label(key) -> str:
+    if not isinstance(key, tuple):
+        key = (key,)
+    return GROUP_SEPARATOR.join("" if pd.isna(k) else str(k) for k in key)
+
+
+@lru_cache(maxsize=1)
+def partition_clusterer():
+    # Modèle et cache d'embeddings construits une fois par processus, partagés par toutes les partitions.
+    from modules.comment_clustering import EmbeddingClusterer
+    return EmbeddingClusterer.from_env()
+
+
+def analyze_text_partition(texts: pd.Series, n_themes: int = 5, n_clusters: int = 3,
+                           threshold: float = 0.3, clustering: str = "tfidf", clusterer=None) -> Dict:
+    # Analyseur propre à la partition ; tâche picklable du pool d'analyse.
+    # Les index des signaux faibles sont ramenés aux lignes du fichier d'origine.
+    from modules.evaluations import MAX_WEAK_SIGNALS, EvaluationAnalyzer
+
+    if clustering == "embeddings" and clusterer is None:
+        clusterer = partition_clusterer()
+    analyzer = EvaluationAnalyzer(clusterer=clusterer)
+    analyzer.evaluations = pd.DataFrame({"text": texts.to_numpy()})
+    analyzer.text_features("text").build()
+    weak_signals = analyzer.detect_weak_signals("text", threshold, MAX_WEAK_SIGNALS)
+    if clustering == "embeddings":
+        clusters = analyzer.cluster_comments_embeddings("text")
+    else:
+        clusters = analyzer.cluster_comments("text", n_clusters) if len(texts) >= n_clusters else {}
+    row_index = texts.index.to_numpy()
+    for signal in weak_signals:
+        signal["index"] = _json_safe(row_index[signal["index"]])
+    return {
+        "total_evaluations": len(texts),
+        "sentiment": analyzer.analyze_sentiment("text"),
+        "themes": analyzer.extract_themes("text", n_themes),
+        "clusters": clusters,
+        "weak_signals": weak_signals,
+        "weak_signals_total": analyzer.count_weak_signals("text"),
+    }
+
+
+def grouped_quantitative(df: pd.DataFrame, group_by: List[str]) -> Dict:
+    """Statistiques descriptives globales et par groupe (un seul `groupby().agg`)."""
+    numeric_cols = [col for col in df.select_dtypes(include=[np.number]).columns if col not in group_by]
+    overall_stats = df[numeric_cols].agg(list(QUANTITATIVE_STATS))
+    overall = {
+        name: {col: _json_safe(overall_stats.at[stat, col]) for col in numeric_cols}
+        for stat, name in QUANTITATIVE_STATS.items()
+    }
+    if not group_by:
+        return {"overall": overall, "groups": {}}
+
+    grouped = df.groupby(group_by, observed=True, dropna=False)
+    sizes = grouped.size()
+    aggregated = grouped[numeric_cols].agg(list(QUANTITATIVE_STATS)) if numeric_cols else None
+    groups = {}
+    for position, (key, size) in enumerate(sizes.items()):
+        # Même groupby : les lignes de `aggregated` suivent l'ordre de `sizes`.
+        row = aggregated.iloc[position] if aggregated is not None else None
+        stats = {"effectif": int(size)}
+        for stat, name in QUANTITATIVE_STATS.items():
+            stats[name] = {col: _json_safe(row[(col, stat)]) for col in numeric_cols}
+        groups[group_label(key)] = stats
+    return {"overall": overall, "groups": groups}
+
+
+def _partitions(df: pd.DataFrame, text_columns: List[str],
+                group_by: List[str]) -> List[Tuple[str, str, pd.Series]]:
+    missing = [col for col in text_columns + group_by if col not in df.columns]
+    if missing:
+        raise ValueError(f"Colonnes absentes : {', '.join(map(str, missing))}")
+    partitions = []
+    for column in text_columns:
+        texts = df[column].fillna("").astype(str)
+        if not group_by:
+            partitions.append((column, ALL_GROUPS, texts))
+            continue
+        for key, indices in df.groupby(group_by, observed=True, dropna=False).indices.items():
+            partitions.append((column, group_label(key), texts.iloc[indices]))
+    return partitions
+
+
+def prepare_grouped_report(df: pd.DataFrame, text_columns: List[str],
+                           group_by: Optional[List[str]] = None) -> Dict:
+    """Statistiques quantitatives et partitions (colonne de texte, groupe, textes) d'un rapport groupé.
+
+    Les partitions sont ensuite analysées par `analyze_text_partition`, une
+    tâche du pool d'analyse chacune, puis réunies par `merge_grouped_report`.
+    """
+    group_by = list(group_by or [])
+    partitions = _partitions(df, text_columns, group_by)
+    start = time.perf_counter()
+    quantitative = grouped_quantitative(df, group_by)
+    return {
+        "total_evaluations": len(df),
+        "group_by": group_by,
+        "text_columns": text_columns,
+        "quantitative": quantitative,
+        "partitions": partitions,
+        "timings_ms": {"quantitative": round((time.perf_counter() - start) * 1000.0, 3)},
+    }
+
+
+def merge_grouped_report(prepared: Dict, results: List[Dict], text_ms: float) -> Dict:
+    """Rapport groupé final : résultats des partitions, dans l'ordre de `prepared["partitions"]`."""
+    text = {column: {} for column in prepared["text_columns"]}
+    for (column, label, _), result in zip(prepared["partitions"], results):
+        text[column][label] = result
+    # Ordre des groupes identique à celui des statistiques quantitatives.
+    order = list(prepared["quantitative"]["groups"]) or [ALL_GROUPS]
+    report = {key: value for key, value in prepared.items() if key != "partitions"}
+    report["text"] = {column: {label: partition[label] for label in order if label in partition}
+                      for column, partition in text.items()}
+    report["timings_ms"] = {**prepared["timings_ms"], "text": round(text_ms, 3)}
+    return report
+
+
+def generate_grouped_report(df: pd.DataFrame, text_columns: List[str], group_by: Optional[List[str]] = None,
+                            n_themes: int = 5, n_clusters: int = 3, threshold: float = 0.3,
+                            clustering: str = "tfidf",
+                            progress_callback: Optional[Callable[[str, float], None]] = None) -> Dict:
+    """Rapport par (colonne de texte, groupe), calculé dans le processus appelant.
+
+    Les partitions sont analysées l'une après l'autre (jobs d'analyse, appel
+    direct) ; /evaluate les répartit sur le pool d'analyse (voir
+    `prepare_grouped_report`). Le clusterer par embeddings est construit une
+    fois pour toutes les partitions.
+    """
+    prepared = prepare_grouped_report(df, text_columns, group_by)
+    if progress_callback is not None:
+        progress_callback("quantitative", 0.1)
+
+    clusterer = partition_clusterer() if clustering == "embeddings" else None
+    partitions = prepared["partitions"]
+    results = []
+    start = time.perf_counter()
+    for done, (_, _, texts) in enumerate(partitions, 1):
+        results.append(analyze_text_partition(texts, n_themes, n_clusters, threshold, clustering, clusterer))
+        if progress_callback is not None:
+            progress_callback("text", 0.1 + 0.9 * done / len(partitions))
+    text_ms = (time.perf_counter() - start) * 1000.0
+    logger.info(f"Rapport groupé : {len(partitions)} partitions en {text_ms:.0f} ms")
+    return merge_grouped_report(prepared, results, text_ms)
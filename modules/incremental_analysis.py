@@ -0,0 +1,377 @@
+import fcntl
+import heapq
+import json
+import os
+import re
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from sklearn.cluster import KMeans
+from sklearn.feature_extraction.text import CountVectorizer, HashingVectorizer
+from sklearn.metrics import pairwise_distances_argmin
+from modules.evaluation_io import string_columns
+from modules.streaming_analysis import QuantileSketch, RunningStats
+from utils.lexicon import KeywordLexicon, get_default_lexicon
+from utils.text import FRENCH_STOP_WORDS
+import logging
+
+logger = logging.getLogger(__name__)
+
+STATE_VERSION = 1
+HASH_FEATURES = 2 ** 12
+DATASET_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class EvaluationState:
+    """État d'analyse incrémental d'un jeu d'évaluations, fusionnable.
+
+    Conserve uniquement des agrégats : statistiques en ligne et esquisses de
+    quantiles par colonne numérique, comptes de sentiment, fréquences des
+    termes, signaux faibles les plus forts (tas borné) et centroïdes de
+    clusters sur des vecteurs `HashingVectorizer` (sans vocabulaire, donc
+    identiques d'une machine à l'autre). `update` coûte O(lot), `merge`
+    combine deux états calculés séparément.
+    """
+
+    def __init__(self, n_clusters: int = 3, text_column: Optional[str] = None,
+                 max_weak_signals: int = 1000, max_vocabulary: int = 200000,
+                 lexicon: Optional[KeywordLexicon] = None):
+        self.n_clusters = n_clusters
+        self.text_column = text_column
+        self.max_weak_signals = max_weak_signals
+        self.max_vocabulary = max_vocabulary
+        self.lexicon = lexicon or get_default_lexicon()
+        self.total = 0
+        self.batches = 0
+        self.numeric_columns: Optional[List[str]] = None
+        self.stats: Dict[str, RunningStats] = {}
+        self.sketches: Dict[str, QuantileSketch] = {}
+        self.sentiment = Counter()
+        # Tas min de (niveau, -index, texte) : la racine est le signal le plus faible conservé.
+        self.weak_signals: List[Tuple[float, int, str]] = []
+        self.term_counts = Counter()
+        self.doc_freqs = Counter()
+        # Somme des fréquences de termes normalisées par la longueur du commentaire.
+        self.term_weights = Counter()
+        self.centroids: Optional[np.ndarray] = None
+        self.cluster_sizes: Optional[np.ndarray] = None
+        # Commentaires reçus avant d'en avoir assez pour initialiser les centroïdes.
+        self.pending_texts: List[str] = []
+        self._analyzer = CountVectorizer(stop_words=list(FRENCH_STOP_WORDS)).build_analyzer()
+        self._hasher = HashingVectorizer(n_features=HASH_FEATURES, alternate_sign=False, norm="l2",
+                                         stop_words=list(FRENCH_STOP_WORDS))
+
+    def _init_columns(self, batch: pd.DataFrame):
+        self.numeric_columns = list(batch.select_dtypes(include=[np.number]).columns)
+        if self.text_column is None:
+            text_cols = string_columns(batch)
+            self.text_column = text_cols[0] if text_cols else None
+        self.stats = {col: RunningStats() for col in self.numeric_columns}
+        self.sketches = {col: QuantileSketch() for col in self.numeric_columns}
+
+    def update(self, batch: pd.DataFrame) -> Dict:
+        """Intègre un lot de lignes ; renvoie les étiquettes de cluster du lot."""
+        if self.numeric_columns is None:
+            self._init_columns(batch)
+        offset = self.total
+        for col in self.numeric_columns:
+            if col in batch.columns:
+                values = pd.to_numeric(batch[col], errors="coerce").to_numpy(dtype=np.float64)
+                self.stats[col].update(values)
+                self.sketches[col].update(values)
+
+        labels = None
+        if self.text_column is not None and self.text_column in batch.columns:
+            texts = batch[self.text_column].fillna("").astype(str)
+            self._update_text(texts.tolist(), offset)
+            labels = self._update_clusters(texts.tolist())
+
+        self.total += len(batch)
+        self.batches += 1
+        return {"rows": len(batch), "first_index": offset,
+                "clusters": labels.tolist() if labels is not None else []}
+
+    def _update_text(self, texts: List[str], offset: int):
+        counts = self.lexicon.count_matrix(texts)
+        pos = self.lexicon.column(counts, "positive")
+        neg = self.lexicon.column(counts, "negative")
+        self.sentiment["positif"] += int((pos > neg).sum())
+        self.sentiment["négatif"] += int((neg > pos).sum())
+        self.sentiment["neutre"] += int((pos == neg).sum())
+
+        warnings = self.lexicon.column(counts, "warning")
+        n_warning = max(self.lexicon.size("warning"), 1)
+        for i in np.flatnonzero(warnings):
+            level = min(float(warnings[i]) / n_warning, 1.0)
+            self._push_weak_signal((level, -(offset + int(i)), texts[i]))
+
+        for text in texts:
+            tokens = Counter(self._analyzer(text))
+            if not tokens:
+                continue
+            length = sum(tokens.values())
+            self.term_counts.update(tokens)
+            self.doc_freqs.update(tokens.keys())
+            for term, count in tokens.items():
+                self.term_weights[term] += count / length
+        self._prune_vocabulary()
+
+    def _push_weak_signal(self, item: Tuple[float, int, str]):
+        if len(self.weak_signals) < self.max_weak_signals:
+            heapq.heappush(self.weak_signals, item)
+        elif item > self.weak_signals[0]:
+            heapq.heapreplace(self.weak_signals, item)
+
+    def _prune_vocabulary(self):
+        if len(self.term_counts) <= self.max_vocabulary:
+            return
+        keep = {term for term, _ in self.term_counts.most_common(self.max_vocabulary // 2)}
+        for term in list(self.term_counts):
+            if term not in keep:
+                del self.term_counts[term]
+                self.doc_freqs.pop(term, None)
+                self.term_weights.pop(term, None)
+
+    def _update_clusters(self, texts: List[str]) -> Optional[np.ndarray]:
+        if self.centroids is None:
+            texts = self.pending_texts + texts
+            if len(texts) < self.n_clusters:
+                self.pending_texts = texts
+                return None
+            n_pending = len(self.pending_texts)
+            self.pending_texts = []
+            vectors = self._hasher.transform(texts)
+            kmeans = KMeans(n_clusters=self.n_clusters, random_state=42, n_init=3).fit(vectors)
+            self.centroids = kmeans.cluster_centers_
+            self.cluster_sizes = np.bincount(kmeans.labels_, minlength=self.n_clusters).astype(np.int64)
+            return kmeans.labels_[n_pending:]
+
+        vectors = self._hasher.transform(texts)
+        labels = pairwise_distances_argmin(vectors, self.centroids)
+        # Mise à jour des centroïdes par moyenne pondérée (k-means séquentiel par lot).
+        assignment = csr_matrix((np.ones(len(labels)), (labels, np.arange(len(labels)))),
+                                shape=(self.n_clusters, len(labels)))
+        batch_sizes = np.bincount(labels, minlength=self.n_clusters)
+        batch_sums = np.asarray((assignment @ vectors).todense())
+        for j in np.flatnonzero(batch_sizes):
+            new_size = self.cluster_sizes[j] + batch_sizes[j]
+            self.centroids[j] += (batch_sums[j] - batch_sizes[j] * self.centroids[j]) / new_size
+            self.cluster_sizes[j] = new_size
+        return labels
+
+    def merge(self, other: "EvaluationState") -> "EvaluationState":
+        """Combine un état calculé sur un autre fragment ; ses lignes suivent les nôtres."""
+        if other.total == 0 and not other.pending_texts:
+            return self
+        if self.numeric_columns is None:
+            self.numeric_columns = list(other.numeric_columns or [])
+            self.text_column = self.text_column or other.text_column
+            self.stats = {col: RunningStats() for col in self.numeric_columns}
+            self.sketches = {col: QuantileSketch() for col in self.numeric_columns}
+        if other.n_clusters != self.n_clusters or other.text_column != self.text_column:
+            raise ValueError("États incompatibles : n_clusters ou colonne de texte différents")
+
+        for col in self.numeric_columns:
+            if col in other.stats:
+                self.stats[col].merge(other.stats[col])
+                self.sketches[col].merge(other.sketches[col])
+        self.sentiment.update(other.sentiment)
+        for level, neg_index, text in other.weak_signals:
+            self._push_weak_signal((level, neg_index - self.total, text))
+        self.term_counts.update(other.term_counts)
+        self.doc_freqs.update(other.doc_freqs)
+        self.term_weights.update(other.term_weights)
+        self._prune_vocabulary()
+        self._merge_clusters(other)
+        pending, self.pending_texts = self.pending_texts + other.pending_texts, []
+        if pending:
+            self._update_clusters(pending)
+        self.total += other.total
+        self.batches += other.batches
+        return self
+
+    def _merge_clusters(self, other: "EvaluationState"):
+        if other.centroids is None:
+            return
+        if self.centroids is None:
+            self.centroids = other.centroids.copy()
+            self.cluster_sizes = other.cluster_sizes.copy()
+            return
+        # k-means pondéré par les effectifs sur les 2k centroïdes.
+        points = np.vstack([self.centroids, other.centroids])
+        weights = np.concatenate([self.cluster_sizes, other.cluster_sizes]).astype(np.float64)
+        kmeans = KMeans(n_clusters=self.n_clusters, random_state=42, n_init=3)
+        labels = kmeans.fit_predict(points, sample_weight=weights)
+        self.centroids = kmeans.cluster_centers_
+        self.cluster_sizes = np.bincount(labels, weights=weights, minlength=self.n_clusters).astype(np.int64)
+
+    def report(self, n_themes: int = 5) -> Dict:
+        """Rapport de même forme que `generate_report`, calculé sur les agrégats.
+
+        Les médianes sont approchées ; les scores de thèmes sont des TF-IDF
+        moyens à fréquences normalisées par la longueur du commentaire ; les
+        clusters donnent les effectifs (les étiquettes sont renvoyées par lot).
+        """
+        stats = self.stats
+        report = {
+            "total_evaluations": self.total,
+            # None plutôt que NaN (colonne vide, écart-type sur moins de deux valeurs) :
+            # le rapport est renvoyé tel quel par /evaluate/append, en JSON strict.
+            "quantitative": {
+                "moyennes": {col: s.mean if s.count else None for col, s in stats.items()},
+                "medians": {col: self.sketches[col].quantile(0.5) if s.count else None
+                            for col, s in stats.items()},
+                "std": {col: s.std() if s.count > 1 else None for col, s in stats.items()},
+                "min": {col: s.min if s.count else None for col, s in stats.items()},
+                "max": {col: s.max if s.count else None for col, s in stats.items()},
+            },
+            "sentiment": {},
+            "themes": {},
+            "clusters": {},
+            "weak_signals": [],
+        }
+        if self.text_column is None or self.total == 0:
+            return report
+
+        report["sentiment"] = {
+            "distribution": {k: v for k, v in self.sentiment.most_common() if v},
+            "pourcentage_positif": self.sentiment["positif"] / self.total * 100,
+            "pourcentage_negatif": self.sentiment["négatif"] / self.total * 100,
+            "pourcentage_neutre": self.sentiment["neutre"] / self.total * 100,
+        }
+        report["weak_signals"] = [
+            {"index": -neg_index, "text": text, "warning_level": level}
+            for level, neg_index, text in sorted(self.weak_signals, reverse=True)
+        ]
+        themes = sorted(term for term, _ in self.term_counts.most_common(n_themes))
+        if themes:
+            report["themes"] = {"themes": themes, "scores": [
+                float(self.term_weights[term] / self.total
+                      * (np.log((1 + self.total) / (1 + self.doc_freqs[term])) + 1))
+                for term in themes
+            ]}
+        if self.cluster_sizes is not None:
+            report["clusters"] = {"n_clusters": self.n_clusters, "cluster_sizes": self.cluster_sizes.tolist()}
+        return report
+
+    def to_dict(self) -> Dict:
+        return {
+            "version": STATE_VERSION,
+            "n_clusters": self.n_clusters,
+            "text_column": self.text_column,
+            "max_weak_signals": self.max_weak_signals,
+            "max_vocabulary": self.max_vocabulary,
+            "total": self.total,
+            "batches": self.batches,
+            "numeric_columns": self.numeric_columns,
+            "stats": {col: s.to_dict() for col, s in self.stats.items()},
+            "sketches": {col: s.to_dict() for col, s in self.sketches.items()},
+            "sentiment": dict(self.sentiment),
+            "weak_signals": [list(item) for item in self.weak_signals],
+            "term_counts": dict(self.term_counts),
+            "doc_freqs": dict(self.doc_freqs),
+            "term_weights": dict(self.term_weights),
+            "centroids": self.centroids.tolist() if self.centroids is not None else None,
+            "cluster_sizes": self.cluster_sizes.tolist() if self.cluster_sizes is not None else None,
+            "pending_texts": self.pending_texts,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict, lexicon: Optional[KeywordLexicon] = None) -> "EvaluationState":
+        if data.get("version") != STATE_VERSION:
+            raise ValueError(f"Version d'état non supportée : {data.get('version')}")
+        state = cls(data["n_clusters"], data["text_column"], data["max_weak_signals"],
+                    data["max_vocabulary"], lexicon)
+        state.total = data["total"]
+        state.batches = data["batches"]
+        state.numeric_columns = data["numeric_columns"]
+        state.stats = {col: RunningStats.from_dict(s) for col, s in data["stats"].items()}
+        state.sketches = {col: QuantileSketch.from_dict(s) for col, s in data["sketches"].items()}
+        state.sentiment = Counter(data["sentiment"])
+        state.weak_signals = [tuple(item) for item in data["weak_signals"]]
+        heapq.heapify(state.weak_signals)
+        state.term_counts = Counter(data["term_counts"])
+        state.doc_freqs = Counter(data["doc_freqs"])
+        state.term_weights = Counter(data["term_weights"])
+        if data["centroids"] is not None:
+            state.centroids = np.asarray(data["centroids"], dtype=np.float64)
+            state.cluster_sizes = np.asarray(data["cluster_sizes"], dtype=np.int64)
+        state.pending_texts = data["pending_texts"]
+        return state
+
+
+def read_batch(file_path: str) -> pd.DataFrame:
+    if file_path.endswith(".csv"):
+        return pd.read_csv(file_path)
+    if file_path.endswith(".xlsx"):
+        return pd.read_excel(file_path)
+    if file_path.endswith(".parquet"):
+        return pd.read_parquet(file_path)
+    raise ValueError(f"Format non supporté : {file_path}")
+
+
+class EvaluationStateStore:
+    """États incrémentaux persistés, un fichier `<state_dir>/<dataset_id>.json` par jeu.
+
+    Chaque ajout verrouille le jeu (`flock`, valable entre workers HTTP), charge
+    l'état, y intègre le lot et le réécrit de façon atomique.
+    """
+
+    def __init__(self, state_dir: str = "data/cache/states"):
+        self.state_dir = state_dir
+        os.makedirs(self.state_dir, exist_ok=True)
+
+    def _path(self, dataset_id: str) -> str:
+        if not dataset_id or not DATASET_ID_PATTERN.match(dataset_id):
+            raise KeyError(dataset_id)
+        return os.path.join(self.state_dir, f"{dataset_id}.json")
+
+    @contextmanager
+    def _locked(self, dataset_id: str) -> Iterator[None]:
+        with open(f"{self._path(dataset_id)}.lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def load(self, dataset_id: str) -> Optional[EvaluationState]:
+        try:
+            with open(self._path(dataset_id), encoding="utf-8") as f:
+                return EvaluationState.from_dict(json.load(f))
+        except FileNotFoundError:
+            return None
+
+    def save(self, dataset_id: str, state: EvaluationState):
+        path = self._path(dataset_id)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def append(self, dataset_id: Optional[str], batch: pd.DataFrame, n_themes: int = 5,
+               n_clusters: int = 3, text_column: Optional[str] = None) -> Dict:
+        """Intègre un lot ; `n_clusters` et `text_column` ne servent qu'à la création du jeu."""
+        dataset_id = dataset_id or uuid.uuid4().hex
+        with self._locked(dataset_id):
+            state = self.load(dataset_id) or EvaluationState(n_clusters=n_clusters, text_column=text_column)
+            batch_result = state.update(batch)
+            self.save(dataset_id, state)
+        logger.info(f"Lot de {len(batch)} évaluations ajouté au jeu {dataset_id} ({state.total} au total)")
+        return {**state.report(n_themes), "dataset_id": dataset_id, "batch": batch_result}
+
+    def merge(self, dataset_id: str, other: EvaluationState, n_themes: int = 5) -> Dict:
+        with self._locked(dataset_id):
+            state = self.load(dataset_id) or EvaluationState(n_clusters=other.n_clusters,
+                                                             text_column=other.text_column)
+            state.merge(other)
+            self.save(dataset_id, state)
+        return {**state.report(n_themes), "dataset_id": dataset_id}
+
+    def report(self, dataset_id: str, n_themes: int = 5) -> Optional[Dict]:
+        state = self.load(dataset_id)
+        return {**state.report(n_themes), "dataset_id": dataset_id} if state is not None else None
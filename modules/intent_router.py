@@ -0,0 +1,85 @@
+import threading
+from typing import Dict, List, Optional, Tuple
+from utils.aho_corasick import AhoCorasick
+from utils.text import normalize_text
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PathStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {}
+        self.total_ms: Dict[str, float] = {}
+
+    def record(self, path: str, count: int, elapsed_ms: float):
+        if count <= 0:
+            return
+        with self._lock:
+            self.counts[path] = self.counts.get(path, 0) + count
+            self.total_ms[path] = self.total_ms.get(path, 0.0) + elapsed_ms
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            total = sum(self.counts.values())
+            return {
+                "total": total,
+                "fast_path_hit_rate": self.counts.get("keyword", 0) / total if total else 0.0,
+                "paths": {
+                    path: {
+                        "count": count,
+                        "avg_latency_ms": self.total_ms[path] / count,
+                    }
+                    for path, count in self.counts.items()
+                },
+            }
+
+
+class KeywordRouter:
+    """Résolution directe des intentions par mots-clés, sans passer par le modèle.
+
+    Les mots-clés de la KB sont normalisés (minuscules, sans accents) et compilés
+    dans un automate d'Aho-Corasick ; seules les occurrences de mots entiers
+    comptent. Une occurrence contenue dans une plus longue est ignorée
+    (« assurance maladie » l'emporte sur « assurance »). La question n'est
+    résolue que si toutes les occurrences restantes désignent la même
+    intention ; sinon (aucune occurrence, ou égalité entre intentions) on
+    renvoie None et l'appelant se rabat sur la recherche par embeddings.
+    """
+
+    def __init__(self, kb: Dict):
+        self.matcher = AhoCorasick()
+        self.confidences: Dict[str, float] = {}
+        keyword_intents: Dict[str, set] = {}
+        for key, value in kb.items():
+            if key == "default" or not isinstance(value, dict):
+                continue
+            self.confidences[key] = float(value.get("confidence", 1.0))
+            for kw in value.get("keywords", []):
+                normalized = normalize_text(kw)
+                if normalized:
+                    keyword_intents.setdefault(normalized, set()).add(key)
+        for keyword, intents in keyword_intents.items():
+            # Un mot-clé partagé par plusieurs intentions est ambigu par nature.
+            self.matcher.add(f" {keyword} ", tuple(sorted(intents)))
+        self.matcher.build()
+
+    def _matches(self, normalized_question: str) -> List[Tuple[int, int, Tuple[str, ...]]]:
+        return [(start, end, intents) for start, end, _, intents in self.matcher.finditer(f" {normalized_question} ")]
+
+    def route(self, normalized_question: str) -> Optional[Tuple[str, float]]:
+        if not normalized_question:
+            return None
+        matches = self._matches(normalized_question)
+        if not matches:
+            return None
+        retained = [
+            intents for start, end, intents in matches
+            if not any(s <= start and end <= e and (s, e) != (start, end) for s, e, _ in matches)
+        ]
+        intents = {intent for group in retained for intent in group}
+        if len(intents) != 1:
+            return None
+        intent = intents.pop()
+        return intent, self.confidences.get(intent, 1.0)
@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+import faiss
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def compute_kb_fingerprint(kb: Dict, model_name: str, index_params: Optional[Dict] = None) -> str:
+    payload = json.dumps(kb, sort_keys=True, ensure_ascii=False, default=str)
+    digest = hashlib.sha256()
+    digest.update(model_name.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(payload.encode("utf-8"))
+    if index_params:
+        digest.update(b"\0")
+        digest.update(json.dumps(index_params, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class KBIndexCache:
+    """Cache disque des embeddings de mots-clés et de l'index FAISS.
+
+    Chaque entrée vit dans `<cache_dir>/<empreinte>/` où l'empreinte combine le
+    contenu de la KB et le nom du modèle : une KB modifiée produit une nouvelle
+    entrée sans toucher aux autres. Au chargement, les embeddings et l'index
+    sont mappés en mémoire (lecture seule) pour être partagés entre workers.
+    """
+
+    EMBEDDINGS_FILE = "embeddings.npy"
+    KEYS_FILE = "keys.json"
+    INDEX_FILE = "index.faiss"
+    PARAMS_FILE = "params.json"
+    IDS_FILE = "ids.npy"
+
+    def __init__(self, cache_dir: str = "data/cache/kb", max_entries: int = 5):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+
+    def _entry_dir(self, fingerprint: str) -> str:
+        return os.path.join(self.cache_dir, fingerprint)
+
+    def load(self, fingerprint: str) -> Optional[Tuple[np.ndarray, List[str], "faiss.Index", Dict, np.ndarray]]:
+        entry = self._entry_dir(fingerprint)
+        if not os.path.isdir(entry):
+            return None
+        try:
+            embeddings = np.load(os.path.join(entry, self.EMBEDDINGS_FILE), mmap_mode="r")
+            with open(os.path.join(entry, self.KEYS_FILE), encoding="utf-8") as f:
+                kb_keys = json.load(f)
+            index_path = os.path.join(entry, self.INDEX_FILE)
+            try:
+                index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+            except RuntimeError:
+                index = faiss.read_index(index_path)
+            params_path = os.path.join(entry, self.PARAMS_FILE)
+            params = {}
+            if os.path.exists(params_path):
+                with open(params_path, encoding="utf-8") as f:
+                    params = json.load(f)
+            # Identifiants des vecteurs dans l'index, ligne par ligne (la position pour les anciennes entrées).
+            ids_path = os.path.join(entry, self.IDS_FILE)
+            ids = np.load(ids_path) if os.path.exists(ids_path) else np.arange(len(kb_keys), dtype=np.int64)
+            os.utime(entry)
+            logger.info(f"Index KB chargé depuis le cache : {fingerprint[:12]}")
+            return embeddings, kb_keys, index, params, ids
+        except Exception as e:
+            logger.error(f"Entrée de cache KB illisible, elle sera reconstruite : {e}")
+            self.invalidate(fingerprint)
+            return None
+
+    def save(self, fingerprint: str, embeddings: np.ndarray, kb_keys: List[str], index: "faiss.Index",
+             params: Optional[Dict] = None, ids: Optional[np.ndarray] = None):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(prefix=".tmp-", dir=self.cache_dir)
+        try:
+            np.save(os.path.join(tmp_dir, self.EMBEDDINGS_FILE), np.ascontiguousarray(embeddings, dtype=np.float32))
+            with open(os.path.join(tmp_dir, self.KEYS_FILE), "w", encoding="utf-8") as f:
+                json.dump(kb_keys, f, ensure_ascii=False)
+            faiss.write_index(index, os.path.join(tmp_dir, self.INDEX_FILE))
+            # Paramètres de construction et de recherche de l'index (type, nlist, nprobe, efSearch…).
+            with open(os.path.join(tmp_dir, self.PARAMS_FILE), "w", encoding="utf-8") as f:
+                json.dump(params or {}, f)
+            if ids is not None:
+                np.save(os.path.join(tmp_dir, self.IDS_FILE), np.asarray(ids, dtype=np.int64))
+        except Exception as e:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            logger.error(f"Erreur écriture du cache KB : {e}")
+            return
+        try:
+            # Renommage atomique : un autre worker ne voit jamais d'entrée partielle.
+            os.rename(tmp_dir, self._entry_dir(fingerprint))
+        except OSError:
+            # Entrée déjà écrite par un autre worker.
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        self._prune(keep=fingerprint)
+
+    def invalidate(self, fingerprint: str):
+        shutil.rmtree(self._entry_dir(fingerprint), ignore_errors=True)
+
+    def _prune(self, keep: str):
+        entries = [
+            name for name in os.listdir(self.cache_dir)
+            if not name.startswith(".") and name != keep and os.path.isdir(self._entry_dir(name))
+        ]
+        entries.sort(key=lambda name: os.path.getmtime(self._entry_dir(name)), reverse=True)
+        for name in entries[max(0, self.max_entries - 1):]:
+            self.invalidate(name)
@@ -0,0 +1,197 @@
+import copy
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+from modules.encoders import SentenceEncoder, kb_keyword_texts
+from modules.vector_index import IndexConfig, build_index, update_index
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def load_kb_file(path: str) -> Dict:
+    with open(path, encoding="utf-8") as f:
+        if path.endswith((".yaml", ".yml")):
+            import yaml
+            try:
+                kb = yaml.safe_load(f)
+            except yaml.YAMLError as e:
+                raise ValueError(f"YAML invalide : {e}")
+        else:
+            kb = json.load(f)
+    validate_kb(kb)
+    return kb
+
+
+def load_default_kb(path: Optional[str] = None) -> Dict:
+    """KB du fichier KB_FILE (YAML/JSON) si configuré, sinon celle de data/kb_rh.py."""
+    path = path or os.getenv("KB_FILE")
+    if path:
+        return load_kb_file(path)
+    from data.kb_rh import KB_RH
+    # Copie : les rechargements ne modifient jamais le module.
+    return copy.deepcopy(KB_RH)
+
+
+def validate_kb(kb: Dict):
+    if not isinstance(kb, dict):
+        raise ValueError("La KB doit être un dictionnaire d'intentions")
+    if not isinstance(kb.get("default"), dict) or "response" not in kb["default"]:
+        raise ValueError("Intention 'default' avec une clé 'response' requise")
+    for key, value in kb.items():
+        if key == "default":
+            continue
+        if not isinstance(value, dict):
+            raise ValueError(f"Intention {key} : dictionnaire attendu")
+        keywords = value.get("keywords", [])
+        if not isinstance(keywords, list) or not all(isinstance(kw, str) for kw in keywords):
+            raise ValueError(f"Intention {key} : 'keywords' doit être une liste de chaînes")
+        if not isinstance(value.get("responses", {}), dict):
+            raise ValueError(f"Intention {key} : 'responses' doit être un dictionnaire")
+
+
+def diff_kb(old: Dict, new: Dict) -> Dict[str, List[str]]:
+    """Intentions ajoutées, supprimées et modifiées entre deux versions de la KB."""
+    return {
+        "added": sorted(key for key in new if key not in old),
+        "removed": sorted(key for key in old if key not in new),
+        "changed": sorted(key for key in new if key in old and new[key] != old[key]),
+    }
+
+
+class KBSnapshot:
+    """Version figée de la KB et de son index.
+
+    Les lignes de `embeddings` suivent l'ordre de `kb_keyword_texts(kb)` ;
+    `ids` donne l'identifiant de chaque ligne dans l'index FAISS, stable
+    d'une version à l'autre. Un snapshot n'est jamais modifié : un
+    rechargement en construit un nouveau, échangé d'un bloc par le chatbot.
+    """
+
+    def __init__(self, kb: Dict, fingerprint: str, embeddings: Optional[np.ndarray], ids: np.ndarray,
+                 index: Optional["faiss.Index"], params: Dict, router=None, responses=None):
+        self.kb = kb
+        self.fingerprint = fingerprint
+        self.texts, self.keys = kb_keyword_texts(kb)
+        self.embeddings = embeddings
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.index = index
+        self.params = params
+        self.router = router
+        # Table (intention, profil, langue) -> réponse compilée pour cette version.
+        self.responses = responses
+        self.intent_by_id = dict(zip(self.ids.tolist(), self.keys))
+
+
+def build_vectors(kb: Dict, encoder: SentenceEncoder, config: IndexConfig) -> Tuple:
+    """Encodage complet de la KB : (embeddings, ids, index, params)."""
+    texts, _ = kb_keyword_texts(kb)
+    if not texts:
+        return None, np.empty(0, dtype=np.int64), None, config.to_dict()
+    embeddings = encoder.encode(texts)
+    ids = np.arange(len(texts), dtype=np.int64)
+    index, params = build_index(embeddings, config, ids)
+    return embeddings, ids, index, params
+
+
+def update_vectors(previous: KBSnapshot, kb: Dict, encoder: SentenceEncoder,
+                   config: IndexConfig) -> Tuple[Tuple, Dict]:
+    """Vecteurs de la nouvelle KB à partir du snapshot précédent.
+
+    Un mot-clé inchangé (même intention, même texte) garde son vecteur et son
+    identifiant ; un texte déjà connu sous une autre intention réutilise son
+    vecteur ; seuls les textes nouveaux sont encodés. L'index est mis à jour
+    sur une copie (retrait des identifiants obsolètes, ajout des nouveaux),
+    ou reconstruit sans ré-encodage si l'index ne sait pas retirer de vecteurs
+    ou si plus de la moitié des mots-clés changent.
+    """
+    texts, keys = kb_keyword_texts(kb)
+    old_rows: Dict[Tuple[str, str], List[int]] = {}
+    for row, pair in enumerate(zip(previous.keys, previous.texts)):
+        old_rows.setdefault(pair, []).append(row)
+    known_texts = {text: row for row, text in enumerate(previous.texts)}
+
+    kept_rows, rows, to_encode = set(), [], {}
+    for pair in zip(keys, texts):
+        candidates = old_rows.get(pair)
+        if candidates:
+            row = candidates.pop(0)
+            kept_rows.add(row)
+            rows.append(("kept", row))
+        elif pair[1] in known_texts:
+            rows.append(("reused", known_texts[pair[1]]))
+        else:
+            to_encode.setdefault(pair[1], len(to_encode))
+            rows.append(("encoded", to_encode[pair[1]]))
+
+    encoded = encoder.encode(list(to_encode)) if to_encode else None
+    next_id = int(previous.ids.max()) + 1 if len(previous.ids) else 0
+    embeddings, ids, added = [], [], []
+    for source, row in rows:
+        if source == "kept":
+            embeddings.append(previous.embeddings[row])
+            ids.append(int(previous.ids[row]))
+            continue
+        embeddings.append(encoded[row] if source == "encoded" else previous.embeddings[row])
+        ids.append(next_id)
+        added.append(len(ids) - 1)
+        next_id += 1
+    removed_ids = np.array([previous.ids[row] for row in range(len(previous.ids)) if row not in kept_rows],
+                           dtype=np.int64)
+    stats = {"keywords": len(texts), "added": len(added), "removed": len(removed_ids), "encoded": len(to_encode)}
+
+    if not texts:
+        stats["mode"] = "empty"
+        return (None, np.empty(0, dtype=np.int64), None, config.to_dict()), stats
+    embeddings = np.asarray(np.vstack(embeddings), dtype=np.float32)
+    ids = np.asarray(ids, dtype=np.int64)
+    index = None
+    if previous.index is not None and len(added) + len(removed_ids) <= len(texts) / 2:
+        index = update_index(previous.index, config, removed_ids, embeddings[added], ids[added])
+    if index is not None:
+        stats["mode"] = "incremental"
+        return (embeddings, ids, index, previous.params), stats
+    stats["mode"] = "rebuild"
+    index, params = build_index(embeddings, config, ids)
+    return (embeddings, ids, index, params), stats
+
+
+class KBFileWatcher:
+    """Surveille la date de modification du fichier KB et déclenche un rechargement."""
+
+    def __init__(self, path: str, on_change: Callable[[], None], interval: float = 5.0):
+        self.path = path
+        self.on_change = on_change
+        self.interval = interval
+        self._stop = threading.Event()
+        self._mtime = self._current_mtime()
+        self._thread = threading.Thread(target=self._run, name="kb-watcher", daemon=True)
+
+    def _current_mtime(self) -> Optional[float]:
+        try:
+            return os.stat(self.path).st_mtime
+        except OSError:
+            return None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            mtime = self._current_mtime()
+            if mtime is None or mtime == self._mtime:
+                continue
+            # Laisse l'éditeur finir d'écrire avant de relire le fichier.
+            time.sleep(min(self.interval, 0.5))
+            self._mtime = self._current_mtime()
+            try:
+                self.on_change()
+            except Exception as e:
+                logger.error(f"Rechargement de la KB {self.path} échoué, version courante conservée : {e}")
+
+    def start(self):
+        self._thread.start()
+        logger.info(f"Surveillance du fichier KB {self.path} toutes les {self.interval}s")
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,121 @@
+import sys
+from typing import Dict, Iterable, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTENT = "default"
+DARIJA_KEY = "darija"
+DARIJA_LANGUAGE = "ar"
+# Profil et langue hors liste déclarée : compilés une fois, comme un profil sans réponse dédiée.
+OTHER = ""
+
+
+class ResponseRecord:
+    __slots__ = ("response", "source")
+
+    def __init__(self, response: str, source: str):
+        self.response = response
+        # Règle qui a fourni la réponse : blocked, profile, darija, default ou global.
+        self.source = source
+
+
+class ResponseTable:
+    """Réponses de la KB compilées en une table (intention, profil, langue) -> réponse.
+
+    La chaîne de repli (intention bloquée, réponse du profil, darija, réponse
+    par défaut de l'intention, réponse globale) est évaluée une fois par
+    combinaison au chargement ; une requête ne fait plus qu'une recherche
+    dans un dictionnaire. Les profils compilés sont ceux déclarés plus toute
+    clé de réponse de la KB, pour garder le comportement d'origine avec un
+    profil non déclaré.
+    """
+
+    def __init__(self, kb: Dict, profiles: Iterable[str], languages: Iterable[str]):
+        self.profiles = [sys.intern(profile) for profile in profiles]
+        self.languages = [sys.intern(language) for language in languages]
+        self.default = ResponseRecord(kb[DEFAULT_INTENT]["response"], "global")
+        # Toute clé de réponse, y compris default / darija, est sélectionnable comme profil.
+        response_keys = {key for value in kb.values() if isinstance(value, dict) for key in value.get("responses", {})}
+        self._profiles = frozenset(self.profiles) | response_keys
+        self._languages = frozenset(self.languages)
+        self._intents = frozenset(kb)
+        self._entries: Dict[Tuple[str, str, str], ResponseRecord] = {}
+        for intent, value in kb.items():
+            intent = sys.intern(intent)
+            for profile in list(self._profiles) + [OTHER]:
+                profile = sys.intern(profile)
+                for language in self.languages + [OTHER]:
+                    self._entries[(intent, profile, language)] = self._resolve(value, profile, language)
+        self.report = self._validate(kb)
+
+    def _resolve(self, intent_data: Dict, profile: str, language: str) -> ResponseRecord:
+        # Ordre de repli : intention bloquée -> réponse `default` de l'intention ; sinon réponse
+        # du profil, puis darija si la langue est l'arabe, puis `default` de l'intention ;
+        # à défaut, réponse globale de l'intention `default` de la KB.
+        responses = intent_data.get("responses", {})
+        if intent_data.get("blocked"):
+            return self._record(responses, DEFAULT_INTENT, "blocked")
+        if profile in responses:
+            return ResponseRecord(responses[profile], "profile")
+        if language == DARIJA_LANGUAGE and DARIJA_KEY in responses:
+            return ResponseRecord(responses[DARIJA_KEY], "darija")
+        return self._record(responses, DEFAULT_INTENT, "default")
+
+    def _record(self, responses: Dict, key: str, source: str) -> ResponseRecord:
+        return ResponseRecord(responses[key], source) if key in responses else self.default
+
+    def lookup(self, intent: str, profile: str, language: str) -> str:
+        record = self._entries.get((intent, profile, language))
+        if record is None:
+            # Intention, profil ou langue inconnus : ramenés aux entrées compilées correspondantes.
+            if intent not in self._intents:
+                return self.default.response
+            record = self._entries[(intent, profile if profile in self._profiles else OTHER,
+                                    language if language in self._languages else OTHER)]
+        return record.response
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _validate(self, kb: Dict) -> Dict:
+        """Couverture des profils / langues déclarés et réponses jamais sélectionnables."""
+        declared = set(self.profiles)
+        unreachable, profile_gaps, global_fallbacks, missing_darija = [], [], [], []
+        for intent, value in kb.items():
+            if intent == DEFAULT_INTENT or not isinstance(value, dict):
+                continue
+            responses = value.get("responses", {})
+            keys = [key for key in responses if key not in (DEFAULT_INTENT, DARIJA_KEY)]
+            undeclared = sorted(key for key in keys if key not in declared)
+            if undeclared:
+                unreachable.append({"intent": intent, "keys": undeclared})
+            if keys and not value.get("blocked"):
+                missing = [profile for profile in self.profiles if profile not in responses]
+                if missing:
+                    profile_gaps.append({"intent": intent, "profiles": missing})
+            fallbacks = [
+                f"{profile}/{language}" for profile in self.profiles for language in self.languages
+                if self._entries[(intent, profile, language)] is self.default
+            ]
+            if fallbacks:
+                global_fallbacks.append({"intent": intent, "combinations": fallbacks})
+            if DARIJA_LANGUAGE in self._languages and DARIJA_KEY not in responses and not value.get("blocked"):
+                missing_darija.append(intent)
+        return {
+            "entries": len(self._entries),
+            "unreachable": unreachable,
+            "profile_gaps": profile_gaps,
+            "global_fallbacks": global_fallbacks,
+            "missing_darija": missing_darija,
+        }
+
+    def log_report(self):
+        for item in self.report["unreachable"]:
+            logger.warning(f"KB : réponses {', '.join(item['keys'])} de l'intention {item['intent']} "
+                           f"inaccessibles (aucun profil déclaré ne les sélectionne)")
+        for item in self.report["global_fallbacks"]:
+            logger.warning(f"KB : intention {item['intent']} sans réponse pour {', '.join(item['combinations'])}, "
+                           f"réponse générique utilisée")
+        logger.info(f"Table de réponses compilée : {self.report['entries']} entrées, "
+                    f"{len(self.report['missing_darija'])} intentions sans darija")
@@ -0,0 +1,437 @@
+import heapq
+import io
+import os
+import time
+from collections import Counter
+from typing import Callable, Dict, Iterator, List, Optional
+import numpy as np
+import pandas as pd
+import pyarrow.types as pa_types
+from scipy.sparse import vstack
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.feature_extraction.text import CountVectorizer, HashingVectorizer
+from modules.evaluation_io import evaluation_columns
+from utils.lexicon import KeywordLexicon, get_default_lexicon
+from utils.text import FRENCH_STOP_WORDS
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class RunningStats:
+    """Moyenne / écart-type / min / max en ligne, fusionnables (algorithme de Chan)."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values: np.ndarray):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return
+        other = RunningStats()
+        other.count = values.size
+        other.mean = float(values.mean())
+        other.m2 = float(((values - other.mean) ** 2).sum())
+        other.min = float(values.min())
+        other.max = float(values.max())
+        self.merge(other)
+
+    def merge(self, other: "RunningStats") -> "RunningStats":
+        if other.count == 0:
+            return self
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta ** 2 * self.count * other.count / total
+        self.mean += delta * other.count / total
+        self.count = total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def std(self) -> float:
+        # ddof=1 comme pandas.
+        return float(np.sqrt(self.m2 / (self.count - 1))) if self.count > 1 else float("nan")
+
+    def to_dict(self) -> Dict:
+        # Bornes infinies (aucune valeur) → None : l'état exporté reste du JSON strict.
+        return {"count": self.count, "mean": self.mean, "m2": self.m2,
+                "min": self.min if self.count else None, "max": self.max if self.count else None}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "RunningStats":
+        stats = cls()
+        stats.count = data["count"]
+        stats.mean = data["mean"]
+        stats.m2 = data["m2"]
+        if stats.count:
+            stats.min = data["min"]
+            stats.max = data["max"]
+        return stats
+
+
+class QuantileSketch:
+    """Esquisse de quantiles de type KLL : mémoire O(k log(n/k)), fusionnable.
+
+    Le niveau i contient des éléments de poids 2**i ; un niveau qui dépasse `k`
+    éléments est trié et une valeur sur deux (décalage aléatoire) monte au
+    niveau suivant.
+    """
+
+    def __init__(self, k: int = 256, seed: int = 42):
+        self.k = k
+        self.levels: List[np.ndarray] = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, values: np.ndarray):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if values.size:
+            self.levels[0] = np.concatenate([self.levels[0], values])
+            self._compress()
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        for level, items in enumerate(other.levels):
+            if level >= len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self._compress()
+        return self
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if items.size > self.k:
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # Un nombre impair d'éléments laisse le dernier au niveau courant.
+                keep = items[-1:] if items.size % 2 else items[:0]
+                pairs = items[: items.size - keep.size]
+                promoted = pairs[int(self._rng.integers(0, 2))::2]
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+                self.levels[level] = keep
+            level += 1
+
+    def count(self) -> float:
+        return float(sum(items.size * 2 ** level for level, items in enumerate(self.levels)))
+
+    def quantile(self, q: float) -> float:
+        values = np.concatenate(self.levels)
+        if values.size == 0:
+            return float("nan")
+        weights = np.concatenate([np.full(items.size, 2.0 ** level) for level, items in enumerate(self.levels)])
+        order = np.argsort(values, kind="stable")
+        values, weights = values[order], weights[order]
+        cumulative = np.cumsum(weights) - weights / 2
+        return float(np.interp(q * weights.sum(), cumulative, values))
+
+    def to_dict(self) -> Dict:
+        return {"k": self.k, "levels": [items.tolist() for items in self.levels]}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "QuantileSketch":
+        sketch = cls(k=data["k"])
+        sketch.levels = [np.asarray(items, dtype=np.float64) for items in data["levels"]] or [np.empty(0)]
+        return sketch
+
+
+def iter_evaluation_chunks(file_path: str, chunksize: int = 50000) -> Iterator[pd.DataFrame]:
+    if file_path.endswith('.csv'):
+        yield from pd.read_csv(file_path, chunksize=chunksize)
+    elif file_path.endswith('.xlsx'):
+        # openpyxl en lecture seule parcourt la feuille ligne à ligne.
+        from openpyxl import load_workbook
+        workbook = load_workbook(file_path, read_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            buffer = []
+            for row in rows:
+                buffer.append(row)
+                if len(buffer) >= chunksize:
+                    yield pd.DataFrame(buffer, columns=header)
+                    buffer = []
+            if buffer:
+                yield pd.DataFrame(buffer, columns=header)
+        finally:
+            workbook.close()
+    elif file_path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(file_path)
+        columns = evaluation_columns(parquet_file.schema_arrow)
+        for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    else:
+        raise ValueError(f"Format non supporté : {file_path}")
+
+
+NUMERIC_MIN_RATIO = 0.95
+
+
+def _spread_sample(file_path: str, sample_rows: int, slices: int) -> List[pd.DataFrame]:
+    # CSV : `slices` tranches de `sample_rows // slices` lignes réparties dans le
+    # fichier (lecture par décalage d'octets, la ligne entamée est sautée). Les
+    # autres formats ne se lisent que depuis le début : premier morceau seul.
+    if not file_path.endswith(".csv"):
+        return [next(iter_evaluation_chunks(file_path, sample_rows), pd.DataFrame())]
+    rows_per_slice = max(sample_rows // slices, 1)
+    head = pd.read_csv(file_path, nrows=rows_per_slice)
+    frames = [head]
+    size = os.path.getsize(file_path)
+    with open(file_path, "rb") as handle:
+        for k in range(1, slices):
+            handle.seek(size * k // slices)
+            handle.readline()
+            data = b"".join(handle.readline() for _ in range(rows_per_slice))
+            if not data.strip():
+                continue
+            try:
+                frames.append(pd.read_csv(io.BytesIO(data), header=None, names=list(head.columns),
+                                          on_bad_lines="skip"))
+            except (ValueError, pd.errors.ParserError):
+                # Tranche tombée au milieu d'un champ multiligne : ignorée.
+                continue
+    return frames
+
+
+def sniff_stream_columns(file_path: str, sample_rows: int = 4000, slices: int = 8):
+    """Colonnes numériques et colonne de commentaires d'un fichier à analyser par morceaux.
+
+    Le Parquet porte ses types. Ailleurs, une colonne est numérique si au moins
+    `NUMERIC_MIN_RATIO` de ses valeurs échantillonnées le sont (une valeur
+    parasite ne la change pas en texte) ; une colonne vide dans l'échantillon
+    reste numérique, comme au chargement complet.
+    """
+    if file_path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        schema = pq.read_schema(file_path)
+        numeric = [f.name for f in schema if pa_types.is_integer(f.type) or pa_types.is_floating(f.type)]
+        text = [f.name for f in schema if pa_types.is_string(f.type) or pa_types.is_large_string(f.type)]
+        return numeric, (text[0] if text else None)
+
+    frames = [frame for frame in _spread_sample(file_path, sample_rows, slices) if len(frame.columns)]
+    if not frames:
+        return [], None
+    numeric_cols, text_cols = [], []
+    for col in frames[0].columns:
+        values = pd.concat([frame[col] for frame in frames if col in frame], ignore_index=True).dropna()
+        parsed = pd.to_numeric(values, errors="coerce").notna()
+        if len(values) == 0 or parsed.mean() >= NUMERIC_MIN_RATIO:
+            numeric_cols.append(col)
+        else:
+            text_cols.append(col)
+    return numeric_cols, (text_cols[0] if text_cols else None)
+
+
+class StreamingEvaluationAnalyzer:
+    """Analyse des évaluations par morceaux, à mémoire bornée.
+
+    Produit un rapport de même forme que `EvaluationAnalyzer.generate_report`
+    en deux passes sur le fichier :
+
+    1. statistiques en ligne (`RunningStats`), médianes approchées
+       (`QuantileSketch`), comptes de sentiment et signaux faibles via le
+       lexique, fréquences documentaires des termes, et apprentissage
+       `MiniBatchKMeans.partial_fit` sur des vecteurs `HashingVectorizer`.
+    2. scores TF-IDF moyens des thèmes retenus, effectifs des clusters et
+       `n_samples` commentaires d'exemple par cluster.
+
+    Seuls les `max_weak_signals` signaux les plus forts sont conservés (tas
+    borné) et le vocabulaire est élagué au-delà de `max_vocabulary` termes.
+    Les types de colonnes viennent de `sniff_stream_columns`.
+    """
+
+    def __init__(self, chunksize: int = 50000, n_themes: int = 5, n_clusters: int = 3,
+                 max_weak_signals: int = 1000, max_vocabulary: int = 200000, n_samples: int = 3,
+                 lexicon: Optional[KeywordLexicon] = None):
+        self.chunksize = chunksize
+        self.n_themes = n_themes
+        self.n_clusters = n_clusters
+        self.max_weak_signals = max_weak_signals
+        self.max_vocabulary = max_vocabulary
+        self.n_samples = n_samples
+        self.lexicon = lexicon or get_default_lexicon()
+        self.analyzer = CountVectorizer(stop_words=list(FRENCH_STOP_WORDS)).build_analyzer()
+        self.hasher = HashingVectorizer(n_features=2 ** 12, alternate_sign=False, norm="l2",
+                                        stop_words=list(FRENCH_STOP_WORDS))
+
+    def _prune_vocabulary(self, term_counts: Counter, doc_freqs: Counter):
+        if len(term_counts) <= self.max_vocabulary:
+            return
+        keep = {term for term, _ in term_counts.most_common(self.max_vocabulary // 2)}
+        for term in list(term_counts):
+            if term not in keep:
+                del term_counts[term]
+                doc_freqs.pop(term, None)
+
+    def generate_report(self, file_path: str,
+                        progress_callback: Optional[Callable[[str, float], None]] = None) -> Dict:
+        numeric_cols, text_column = sniff_stream_columns(file_path)
+        seen_chunk = False
+        total = 0
+        stats = {col: RunningStats() for col in numeric_cols}
+        sketches = {col: QuantileSketch() for col in numeric_cols}
+        ignored = Counter()
+        sentiment_counts = Counter()
+        weak_heap: List = []
+        weak_total = 0
+        term_counts, doc_freqs = Counter(), Counter()
+        kmeans = MiniBatchKMeans(n_clusters=self.n_clusters, random_state=42, n_init=3)
+        pending_vectors = []
+        n_warning = max(self.lexicon.size("warning"), 1)
+        fitted = False
+        timings = {}
+        start = time.perf_counter()
+
+        for chunk in iter_evaluation_chunks(file_path, self.chunksize):
+            seen_chunk = True
+            for col in numeric_cols:
+                # Types revérifiés à chaque morceau : une valeur non numérique
+                # hors de l'échantillon est ignorée et comptée.
+                parsed = pd.to_numeric(chunk[col], errors="coerce")
+                ignored[col] += int(parsed.isna().sum() - chunk[col].isna().sum())
+                values = parsed.to_numpy(dtype=np.float64, na_value=np.nan)
+                stats[col].update(values)
+                sketches[col].update(values)
+
+            if text_column is not None:
+                texts = chunk[text_column].fillna("").astype(str)
+                counts = self.lexicon.count_matrix(texts)
+                pos = self.lexicon.column(counts, "positive")
+                neg = self.lexicon.column(counts, "negative")
+                sentiment_counts["positif"] += int((pos > neg).sum())
+                sentiment_counts["négatif"] += int((neg > pos).sum())
+                sentiment_counts["neutre"] += int((pos == neg).sum())
+
+                warnings = self.lexicon.column(counts, "warning")
+                flagged = np.flatnonzero(warnings)
+                weak_total += len(flagged)
+                for i in flagged:
+                    level = min(float(warnings[i]) / n_warning, 1.0)
+                    item = (level, -(total + int(i)), texts.iloc[i])
+                    if len(weak_heap) < self.max_weak_signals:
+                        heapq.heappush(weak_heap, item)
+                    elif item > weak_heap[0]:
+                        heapq.heapreplace(weak_heap, item)
+
+                for text in texts:
+                    tokens = self.analyzer(text)
+                    term_counts.update(tokens)
+                    doc_freqs.update(set(tokens))
+                self._prune_vocabulary(term_counts, doc_freqs)
+
+                pending_vectors.append(self.hasher.transform(texts))
+                if sum(v.shape[0] for v in pending_vectors) >= self.n_clusters:
+                    kmeans.partial_fit(vstack(pending_vectors))
+                    pending_vectors = []
+                    fitted = True
+
+            total += len(chunk)
+
+        if not seen_chunk:
+            return {}
+        ignored = {col: n for col, n in ignored.items() if n}
+        for col, n in ignored.items():
+            logger.warning("Colonne %s : %d valeur(s) non numérique(s) ignorée(s)", col, n)
+        timings["pass_1"] = round((time.perf_counter() - start) * 1000.0, 3)
+        if progress_callback is not None:
+            progress_callback("pass_1", 0.5)
+
+        report = {
+            "total_evaluations": total,
+            "quantitative": {
+                "moyennes": {col: s.mean if s.count else float("nan") for col, s in stats.items()},
+                "medians": {col: sketch.quantile(0.5) for col, sketch in sketches.items()},
+                "std": {col: s.std() for col, s in stats.items()},
+                "min": {col: s.min if s.count else float("nan") for col, s in stats.items()},
+                "max": {col: s.max if s.count else float("nan") for col, s in stats.items()},
+            },
+            "sentiment": {},
+            "themes": {},
+            "clusters": {},
+            "weak_signals": [],
+            "timings_ms": timings,
+        }
+        if ignored:
+            report["ignored_values"] = ignored
+        if text_column is None or total == 0:
+            return report
+
+        report["sentiment"] = {
+            "distribution": {k: v for k, v in sentiment_counts.most_common() if v},
+            "pourcentage_positif": sentiment_counts["positif"] / total * 100,
+            "pourcentage_negatif": sentiment_counts["négatif"] / total * 100,
+            "pourcentage_neutre": sentiment_counts["neutre"] / total * 100,
+        }
+        report["weak_signals"] = [
+            {"index": -neg_index, "text": text, "warning_level": level}
+            for level, neg_index, text in sorted(weak_heap, reverse=True)
+        ]
+        report["weak_signals_total"] = weak_total
+
+        themes = [term for term, _ in term_counts.most_common(self.n_themes)]
+        theme_index = {term: i for i, term in enumerate(themes)}
+        idf = np.array([np.log((1 + total) / (1 + doc_freqs[term])) + 1 for term in themes])
+        theme_sums = np.zeros(len(themes))
+        # Étiquettes par ligne non conservées : effectifs et exemples par cluster.
+        cluster_sizes = np.zeros(self.n_clusters, dtype=np.int64)
+        samples: List[List[str]] = [[] for _ in range(self.n_clusters)]
+        start = time.perf_counter()
+
+        for chunk in iter_evaluation_chunks(file_path, self.chunksize):
+            texts = chunk[text_column].fillna("").astype(str)
+            for text in texts:
+                vector = np.zeros(len(themes))
+                for token in self.analyzer(text):
+                    i = theme_index.get(token)
+                    if i is not None:
+                        vector[i] += 1
+                vector *= idf
+                norm = np.linalg.norm(vector)
+                if norm > 0:
+                    theme_sums += vector / norm
+            if fitted:
+                chunk_labels = kmeans.predict(self.hasher.transform(texts))
+                cluster_sizes += np.bincount(chunk_labels, minlength=self.n_clusters)
+                for j, comments in enumerate(samples):
+                    for idx in np.flatnonzero(chunk_labels == j):
+                        if len(comments) >= self.n_samples:
+                            break
+                        text = texts.iloc[idx]
+                        if text.strip() and text not in comments:
+                            comments.append(text)
+
+        timings["pass_2"] = round((time.perf_counter() - start) * 1000.0, 3)
+        if progress_callback is not None:
+            progress_callback("pass_2", 1.0)
+
+        if themes:
+            report["themes"] = {"themes": sorted(themes), "scores": [
+                float(theme_sums[theme_index[term]] / total) for term in sorted(themes)
+            ]}
+        if fitted:
+            report["clusters"] = {
+                "n_clusters": self.n_clusters,
+                "cluster_sizes": cluster_sizes.tolist(),
+                "representatives": [
+                    {"cluster": j, "size": int(cluster_sizes[j]), "comments": comments}
+                    for j, comments in enumerate(samples)
+                ],
+            }
+        return report
+
+
+def should_stream(file_path: str) -> bool:
+    threshold_mb = float(os.getenv("EVALUATION_STREAMING_THRESHOLD_MB", "200"))
+    try:
+        return os.path.getsize(file_path) > threshold_mb * 1024 * 1024
+    except OSError:
+        return False
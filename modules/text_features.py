@@ -0,0 +1,76 @@
+from typing import Optional
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from sklearn.feature_extraction.text import CountVectorizer, TfidfTransformer
+from utils.lexicon import KeywordLexicon
+from utils.text import FRENCH_STOP_WORDS
+
+
+class TextFeatures:
+    """Caractéristiques textuelles d'une colonne, calculées une seule fois par rapport.
+
+    - `term_matrix` : matrice creuse des occurrences de termes (textes mis en
+      minuscules et tokenisés une fois), dont dérivent les TF-IDF des thèmes et
+      du clustering via `tfidf(max_features)`.
+    - `lexicon_counts` : comptes par catégorie de lexique (un seul parcours),
+      consommés par le sentiment et les signaux faibles.
+    """
+
+    def __init__(self, texts: pd.Series, lexicon: KeywordLexicon):
+        self.texts = texts.fillna("").astype(str)
+        self.lexicon = lexicon
+        self._lowered = self.texts.str.lower()
+        self._term_matrix: Optional[csr_matrix] = None
+        self._term_error: Optional[Exception] = None
+        self._vocabulary: Optional[np.ndarray] = None
+        self._lexicon_counts: Optional[np.ndarray] = None
+
+    def build(self) -> "TextFeatures":
+        self.lexicon_counts
+        try:
+            self.term_matrix
+        except ValueError:
+            # Vocabulaire vide : signalé par les étapes thèmes / clustering.
+            pass
+        return self
+
+    @property
+    def lexicon_counts(self) -> np.ndarray:
+        if self._lexicon_counts is None:
+            self._lexicon_counts = self.lexicon.count_matrix(self._lowered)
+        return self._lexicon_counts
+
+    @property
+    def term_matrix(self) -> csr_matrix:
+        if self._term_error is not None:
+            raise self._term_error
+        if self._term_matrix is None:
+            vectorizer = CountVectorizer(lowercase=False, stop_words=list(FRENCH_STOP_WORDS))
+            try:
+                self._term_matrix = vectorizer.fit_transform(self._lowered).tocsc()
+            except ValueError as e:
+                self._term_error = e
+                raise
+            self._vocabulary = vectorizer.get_feature_names_out()
+        return self._term_matrix
+
+    @property
+    def vocabulary(self) -> np.ndarray:
+        self.term_matrix
+        return self._vocabulary
+
+    def tfidf(self, max_features: int):
+        """TF-IDF restreint aux `max_features` termes les plus fréquents.
+
+        Équivalent à `TfidfVectorizer(max_features=...)` sur les mêmes textes,
+        sans re-tokeniser : les colonnes sont triées par ordre alphabétique.
+        """
+        counts = self.term_matrix
+        term_freqs = np.asarray(counts.sum(axis=0)).ravel()
+        if max_features < len(term_freqs):
+            selected = np.sort(np.argsort(-term_freqs, kind="stable")[:max_features])
+        else:
+            selected = np.arange(len(term_freqs))
+        tfidf_matrix = TfidfTransformer().fit_transform(counts[:, selected].tocsr())
+        return tfidf_matrix, self.vocabulary[selected]
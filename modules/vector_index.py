@@ -0,0 +1,189 @@
+import os
+from typing import Dict, List, Mapping, Optional, Tuple
+import numpy as np
+import faiss
+import logging
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat-l2", "flat-ip", "ivf", "hnsw")
+
+
+class IndexConfig:
+    """Type d'index FAISS de la KB et paramètres de construction / recherche.
+
+    - `flat-l2` : recherche exacte en distance L2 (comportement historique).
+    - `flat-ip` : recherche exacte en produit scalaire sur vecteurs normalisés.
+    - `ivf` : listes inversées (`nlist` centroïdes, `nprobe` listes visitées).
+    - `hnsw` : graphe HNSW (`hnsw_m` voisins, `ef_construction`, `ef_search`).
+
+    Les trois derniers travaillent en similarité cosinus. Les paramètres sont
+    enregistrés à côté de l'index (`params.json` du cache KB).
+    """
+
+    def __init__(self, index_type: str = "flat-l2", nlist: Optional[int] = None, nprobe: int = 8,
+                 hnsw_m: int = 32, ef_construction: int = 80, ef_search: int = 64):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Type d'index inconnu : {index_type} (attendu : {', '.join(INDEX_TYPES)})")
+        self.index_type = index_type
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.hnsw_m = hnsw_m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+
+    @classmethod
+    def from_env(cls) -> "IndexConfig":
+        nlist = os.getenv("KB_INDEX_NLIST")
+        return cls(
+            index_type=os.getenv("KB_INDEX_TYPE", "flat-l2"),
+            nlist=int(nlist) if nlist else None,
+            nprobe=int(os.getenv("KB_INDEX_NPROBE", "8")),
+            hnsw_m=int(os.getenv("KB_INDEX_HNSW_M", "32")),
+            ef_construction=int(os.getenv("KB_INDEX_EF_CONSTRUCTION", "80")),
+            ef_search=int(os.getenv("KB_INDEX_EF_SEARCH", "64")),
+        )
+
+    def build_params(self) -> Optional[Dict]:
+        """Paramètres qui changent le contenu de l'index (clé du cache KB).
+
+        Les paramètres de recherche (nprobe, efSearch) n'en font pas partie :
+        les modifier ne reconstruit pas l'index. None pour `flat-l2`, ce qui
+        garde les entrées de cache existantes.
+        """
+        if self.index_type == "flat-l2":
+            return None
+        params = {"index_type": self.index_type}
+        if self.index_type == "ivf":
+            params["nlist"] = self.nlist
+        elif self.index_type == "hnsw":
+            params.update(hnsw_m=self.hnsw_m, ef_construction=self.ef_construction)
+        return params
+
+    @property
+    def normalize(self) -> bool:
+        return self.index_type != "flat-l2"
+
+    def to_dict(self) -> Dict:
+        return {
+            "index_type": self.index_type,
+            "nlist": self.nlist,
+            "nprobe": self.nprobe,
+            "hnsw_m": self.hnsw_m,
+            "ef_construction": self.ef_construction,
+            "ef_search": self.ef_search,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "IndexConfig":
+        return cls(**{key: data[key] for key in cls().to_dict() if key in data})
+
+
+def prepare_vectors(embeddings: np.ndarray, config: IndexConfig) -> np.ndarray:
+    vectors = np.ascontiguousarray(embeddings, dtype=np.float32)
+    if config.normalize:
+        vectors = vectors.copy()
+        faiss.normalize_L2(vectors)
+    return vectors
+
+
+def build_index(embeddings: np.ndarray, config: IndexConfig,
+                ids: Optional[np.ndarray] = None) -> Tuple["faiss.Index", Dict]:
+    """Construit l'index ; renvoie aussi les paramètres effectifs à persister.
+
+    Les vecteurs sont identifiés par `ids` (0..n-1 par défaut) : la recherche
+    renvoie ces identifiants, stables lors des mises à jour incrémentales.
+    """
+    vectors = prepare_vectors(embeddings, config)
+    n, dim = vectors.shape
+    ids = np.arange(n, dtype=np.int64) if ids is None else np.asarray(ids, dtype=np.int64)
+    params = config.to_dict()
+    if config.index_type == "flat-l2":
+        index = faiss.IndexIDMap2(faiss.IndexFlatL2(dim))
+    elif config.index_type == "flat-ip":
+        index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+    elif config.index_type == "ivf":
+        # Règle usuelle ~4·√n listes, avec au moins ~39 vecteurs d'entraînement par liste.
+        nlist = max(1, min(config.nlist or min(int(4 * np.sqrt(n)), n // 39), n))
+        quantizer = faiss.IndexFlatIP(dim)
+        index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+        index.train(vectors)
+        params["nlist"] = nlist
+    else:
+        hnsw = faiss.IndexHNSWFlat(dim, config.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        hnsw.hnsw.efConstruction = config.ef_construction
+        index = faiss.IndexIDMap2(hnsw)
+    # Les index IVF gèrent nativement des identifiants arbitraires, les autres via IndexIDMap2.
+    index.add_with_ids(vectors, ids)
+    apply_search_params(index, config)
+    return index, params
+
+
+def has_stable_ids(index: "faiss.Index") -> bool:
+    # Faux pour les entrées de cache antérieures, où l'identifiant est la position.
+    return isinstance(index, (faiss.IndexIDMap, faiss.IndexIVF))
+
+
+def apply_search_params(index: "faiss.Index", config: IndexConfig):
+    # Paramètres de recherche réappliqués après chargement depuis le cache.
+    if config.index_type == "ivf":
+        faiss.extract_index_ivf(index).nprobe = config.nprobe
+    elif config.index_type == "hnsw":
+        inner = index.index if isinstance(index, faiss.IndexIDMap) else index
+        faiss.downcast_index(inner).hnsw.efSearch = config.ef_search
+
+
+def update_index(index: "faiss.Index", config: IndexConfig, remove_ids: np.ndarray,
+                 embeddings: np.ndarray, ids: np.ndarray) -> Optional["faiss.Index"]:
+    """Copie de l'index avec `remove_ids` retirés et `embeddings` ajoutés.
+
+    L'index d'origine, encore interrogé par les requêtes en cours, n'est pas
+    modifié. Renvoie None quand l'index ne sait pas retirer de vecteurs
+    (HNSW, anciennes entrées de cache) ou ne peut pas être copié (IVF lu
+    en mmap depuis le cache) : l'appelant le reconstruit alors.
+    """
+    if not has_stable_ids(index) or (len(remove_ids) and config.index_type == "hnsw"):
+        return None
+    try:
+        updated = faiss.clone_index(index)
+    except RuntimeError as e:
+        # Listes inversées sur disque (OnDiskInvertedLists) : copie non prise en charge par faiss.
+        logger.info(f"Index non copiable, reconstruction complète : {e}")
+        return None
+    if len(remove_ids):
+        updated.remove_ids(np.asarray(remove_ids, dtype=np.int64))
+    if len(embeddings):
+        updated.add_with_ids(prepare_vectors(embeddings, config), np.asarray(ids, dtype=np.int64))
+    apply_search_params(updated, config)
+    return updated
+
+
+def to_confidence(scores: np.ndarray, config: IndexConfig) -> np.ndarray:
+    """Confiance dans [0, 1] sur la même échelle quel que soit l'index.
+
+    Les index cosinus renvoient une similarité s ; sur vecteurs normalisés la
+    distance L2 au carré vaut 2 - 2s, d'où la même formule 1 / (1 + d²).
+    """
+    if config.normalize:
+        scores = np.maximum(2.0 - 2.0 * scores, 0.0)
+    return 1.0 / (1.0 + scores)
+
+
+def aggregate_hits(scores: np.ndarray, indices: np.ndarray, kb_keys: Mapping[int, str], config: IndexConfig,
+                   top_k: int = 1) -> List[Tuple[str, float, int]]:
+    """Regroupe les voisins d'une requête par intention.
+
+    Chaque intention prend la meilleure confiance de ses mots-clés ; renvoie
+    les `top_k` intentions (intention, confiance, nombre de mots-clés trouvés).
+    """
+    confidences = to_confidence(np.asarray(scores, dtype=np.float64), config)
+    best: Dict[str, List] = {}
+    for confidence, idx in zip(confidences, indices):
+        if idx < 0:
+            continue
+        intent = kb_keys[idx]
+        entry = best.setdefault(intent, [0.0, 0])
+        entry[0] = max(entry[0], float(confidence))
+        entry[1] += 1
+    ranked = sorted(best.items(), key=lambda item: item[1][0], reverse=True)
+    return [(intent, confidence, hits) for intent, (confidence, hits) in ranked[:top_k]]
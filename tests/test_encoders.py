@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+from modules.encoders import (SentenceEncoder, check_intent_parity, create_encoder, kb_intent_matches,
+                              parity_probes)
+from modules.vector_index import IndexConfig
+
+DIM = 16
+
+
+class _HashEncoder:
+    """Encodeur déterministe : un vecteur pseudo-aléatoire par texte."""
+
+    def encode(self, texts):
+        return np.vstack([np.random.default_rng(abs(hash(text)) % (2 ** 32)).standard_normal(DIM)
+                          for text in texts]).astype(np.float32)
+
+
+KB = {
+    "default": {"response": "?"},
+    "conges": {"keywords": [f"congé {i}" for i in range(40)]},
+    "salaire": {"keywords": [f"salaire {i}" for i in range(40)]},
+}
+
+
+@pytest.mark.parametrize("index_type", ["flat-l2", "flat-ip", "ivf", "hnsw"])
+def test_kb_intent_matches_uses_configured_index(monkeypatch, index_type):
+    monkeypatch.setenv("KB_INDEX_TYPE", index_type)
+    monkeypatch.setenv("KB_INDEX_NPROBE", "64")
+    probes = ["congé 3", "salaire 17", "salaire 39"]
+    assert kb_intent_matches(_HashEncoder(), KB, probes) == ["conges", "salaire", "salaire"]
+
+
+def test_kb_intent_matches_without_keywords():
+    assert kb_intent_matches(_HashEncoder(), {"default": {}}, ["bonjour"], IndexConfig()) == ["default"]
+
+
+PARITY_KB = {
+    "default": {"response": "?"},
+    "conges": {"keywords": ["congé", "vacances"]},
+    "salaire": {"keywords": ["salaire", "paie"]},
+}
+
+
+class _HashBackend(SentenceEncoder):
+    """Backend déterministe : un vecteur pseudo-aléatoire par texte."""
+
+    backend = "hash"
+
+    def _encode(self, texts, batch_size):
+        return np.vstack([np.random.default_rng(abs(hash(text)) % (2 ** 32)).standard_normal(DIM)
+                          for text in texts])
+
+
+class _ConstantBackend(SentenceEncoder):
+    backend = "constant"
+
+    def _encode(self, texts, batch_size):
+        return np.ones((len(texts), DIM))
+
+
+def test_cache_id_depends_on_backend():
+    assert _HashBackend("modele").cache_id == "modele@hash"
+    torch_like = _HashBackend("modele")
+    torch_like.backend = "torch"
+    assert torch_like.cache_id == "modele"
+
+
+def test_encode_normalizes_rows():
+    embeddings = _ConstantBackend().encode(["a", "b"], normalize=True)
+    assert embeddings.dtype == np.float32
+    np.testing.assert_allclose(np.linalg.norm(embeddings, axis=1), 1.0, rtol=1e-6)
+
+
+def test_intent_parity_counts_mismatches():
+    probes = ["congé", "vacances", "salaire", "paie"]
+    assert check_intent_parity(_HashBackend(), _HashBackend(), PARITY_KB, probes)["agreement"] == 1.0
+    report = check_intent_parity(_HashBackend(), _ConstantBackend(), PARITY_KB, probes)
+    assert report["candidate"] == "constant" and report["probes"] == 4
+    assert report["agreement"] == 1.0 - len(report["mismatches"]) / 4 < 1.0
+    assert len(parity_probes(PARITY_KB)) == 8
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        create_encoder("tensorrt")
+
+
+def test_sentence_encoder_requires_encode():
+    with pytest.raises(TypeError):
+        SentenceEncoder()
+
+    class Ones(SentenceEncoder):
+        backend = "test"
+
+        def _encode(self, texts, batch_size):
+            return np.ones((len(texts), 2))
+
+    encoder = Ones("modele")
+    assert encoder.cache_id == "modele@test"
+    np.testing.assert_allclose(encoder.encode(["a", "b"], normalize=True), np.full((2, 2), 2 ** -0.5))
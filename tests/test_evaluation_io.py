@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+
+from modules.evaluation_io import _compact_numeric, read_evaluations_lean, sniff_schema
+
+
+def _write_evaluations(path):
+    pd.DataFrame({
+        "commentaire": [f"Commentaire libre numéro {i}" for i in range(20)],
+        "formation": ["Sécurité", "Qualité"] * 10,
+        "remarque": [f"remarque {i}" for i in range(20)],
+        "note": [i % 5 + 1 for i in range(20)],
+        "score": [i / 4 for i in range(20)],
+    }).to_csv(path, index=False)
+
+
+def test_sniff_schema_classifies_columns(tmp_path):
+    path = tmp_path / "evaluations.csv"
+    _write_evaluations(path)
+    schema = sniff_schema(str(path))
+    assert schema.numeric_columns == ["note", "score"]
+    assert schema.category_columns == ["formation"]
+    assert schema.text_column == "commentaire"
+    assert "remarque" not in schema.usecols
+
+
+def test_read_evaluations_lean_compacts_dtypes(tmp_path):
+    path = tmp_path / "evaluations.csv"
+    _write_evaluations(path)
+    df, memory = read_evaluations_lean(str(path))
+    assert "remarque" not in df.columns
+    assert df["note"].dtype == np.int8
+    assert df["score"].dtype == np.float32
+    assert isinstance(df["formation"].dtype, pd.CategoricalDtype)
+    assert df["commentaire"].tolist()[:2] == ["Commentaire libre numéro 0", "Commentaire libre numéro 1"]
+    assert memory["bytes"] > 0
+
+
+def test_compact_numeric_integer_ranges():
+    assert _compact_numeric(pd.Series([1, 2, 5])).dtype == np.int8
+    assert _compact_numeric(pd.Series([1, 2000, 5])).dtype == np.int16
+    assert _compact_numeric(pd.Series([1.0, np.nan, 5.0])).dtype == np.float32
+
+
+def test_repetitive_comment_column_stays_text(tmp_path):
+    path = tmp_path / "evaluations.csv"
+    pd.DataFrame({
+        # Commentaires peu variés : première colonne de texte, comme au chargement complet.
+        "commentaire": ["RAS", "Bien"] * 9 + ["Salle trop petite", "Excellent formateur"],
+        "formation": ["Sécurité", "Qualité"] * 10,
+        "remarque": [f"remarque {i}" for i in range(20)],
+        "note": range(20),
+    }).to_csv(path, index=False)
+
+    schema = sniff_schema(str(path))
+    assert schema.text_columns == ["commentaire"]
+    assert schema.category_columns == ["formation"]
+
+    schema = sniff_schema(str(path), text_columns=["formation"])
+    assert schema.text_columns == ["formation"]
+    assert "formation" not in schema.category_columns
+    assert "commentaire" in schema.category_columns
+
+
+def test_non_numeric_value_after_sample_is_coerced(tmp_path):
+    path = tmp_path / "evaluations.csv"
+    notes = [str(i % 5 + 1) for i in range(30)] + ["inconnue"]
+    pd.DataFrame({"note": notes, "commentaire": [f"commentaire {i}" for i in range(31)]}).to_csv(path, index=False)
+
+    df, _ = read_evaluations_lean(str(path), sniff_schema(str(path), sample_rows=10))
+    assert df["note"].dtype == np.float32
+    assert df["note"].isna().sum() == 1
+    assert df["note"].iloc[:30].tolist() == [i % 5 + 1 for i in range(30)]
+
+
+def test_compact_numeric_accepts_nullable_integers():
+    assert _compact_numeric(pd.Series([1, 2, 5], dtype="Int64")).dtype == np.int8
+    assert _compact_numeric(pd.Series([1, None, 5], dtype="Int64")).dtype == np.float32
@@ -0,0 +1,127 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+from modules import evaluation_jobs
+from modules.evaluation_jobs import EvaluationJobManager, run_evaluation_job
+from utils.executors import ExecutorSaturated
+from utils.report_cache import report_key
+
+
+def test_run_evaluation_job_writes_status_and_result(tmp_path):
+    path = tmp_path / "evaluations.csv"
+    pd.DataFrame({"note": [4, 2, 5], "commentaire": ["Très bien", "Salle bruyante", "Excellent"]}).to_csv(path)
+    job_id = "ab" * 16
+    (tmp_path / "jobs" / job_id).mkdir(parents=True)
+    assert run_evaluation_job(str(tmp_path / "jobs"), job_id, str(path)) == "completed"
+    status = json.loads((tmp_path / "jobs" / job_id / "status.json").read_text())
+    assert status["status"] == "completed" and status["progress"] == 1.0
+    assert status["total_evaluations"] == 3
+    result = json.loads((tmp_path / "jobs" / job_id / "result.json").read_text())
+    assert result["total_evaluations"] == 3
+
+
+def test_submit_reports_completion(tmp_path, monkeypatch):
+    monkeypatch.setattr(evaluation_jobs, "run_evaluation_job", lambda *args: "completed")
+    completed = []
+    manager = EvaluationJobManager(str(tmp_path), max_parallel=1, on_complete=completed.append)
+    manager._executor = ThreadPoolExecutor(max_workers=1)
+    status = manager.submit("a.csv")
+    assert status["status"] == "queued"
+    manager._executor.shutdown(wait=True)
+    assert [job["id"] for job in completed] == [status["id"]]
+    assert manager.get_status(status["id"])["file_path"] == "a.csv"
+
+
+def test_unknown_or_invalid_job_ids(tmp_path):
+    manager = EvaluationJobManager(str(tmp_path))
+    assert manager.get_status("0" * 32) is None
+    assert manager.get_status("../etc") is None
+    assert manager.get_result("../etc") is None
+
+
+def test_cleanup_drops_jobs_past_retention(tmp_path):
+    manager = EvaluationJobManager(str(tmp_path), retention_hours=1)
+    old, recent = tmp_path / ("0" * 32), tmp_path / ("1" * 32)
+    old.mkdir()
+    recent.mkdir()
+    past = time.time() - 2 * 3600
+    os.utime(old, (past, past))
+    manager.cleanup()
+    assert os.listdir(tmp_path) == ["1" * 32]
+
+
+def test_submit_rejects_beyond_queue(tmp_path, monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(evaluation_jobs, "run_evaluation_job", lambda *args: release.wait(5) and "completed")
+    manager = EvaluationJobManager(str(tmp_path), max_parallel=1, max_queue=1)
+    manager._executor = ThreadPoolExecutor(max_workers=1)
+    manager.submit("a.csv")
+    manager.submit("b.csv")
+    with pytest.raises(ExecutorSaturated) as excinfo:
+        manager.submit("c.csv")
+    assert excinfo.value.status_code == 429 and excinfo.value.retry_after >= 1
+
+    release.set()
+    deadline = time.time() + 5
+    while manager.get_stats()["in_flight"] and time.time() < deadline:
+        time.sleep(0.01)
+    assert manager.get_stats()["in_flight"] == 0
+    manager.submit("c.csv")
+    manager.shutdown()
+
+
+def test_cleanup_keeps_most_recent_finished_jobs(tmp_path):
+    manager = EvaluationJobManager(str(tmp_path), max_retained=2)
+    now = time.time()
+    for i, status in enumerate(["completed", "failed", "completed", "running", "completed"]):
+        job_dir = tmp_path / f"{i:032x}"
+        job_dir.mkdir()
+        (job_dir / "status.json").write_text(json.dumps({"status": status}))
+        os.utime(job_dir, (now - 100 + i, now - 100 + i))
+    manager.cleanup()
+    assert sorted(os.listdir(tmp_path)) == [f"{i:032x}" for i in (2, 3, 4)]
+
+
+def test_job_report_id_matches_evaluate_key(tmp_path):
+    path = tmp_path / "evaluations.csv"
+    pd.DataFrame({"note": [4, 2, 5], "commentaire": ["Très bien", "Salle bruyante", "Excellent"]}).to_csv(path)
+    params = {"n_clusters": 2}
+    job_id = "ab" * 16
+    (tmp_path / "jobs" / job_id).mkdir(parents=True)
+    assert run_evaluation_job(str(tmp_path / "jobs"), job_id, str(path), params,
+                              str(tmp_path / "cache"), 1 << 20, dataset_id="d" * 64) == "completed"
+    status = json.loads((tmp_path / "jobs" / job_id / "status.json").read_text())
+    assert status["report_id"] == report_key(str(path), params, "d" * 64)
+    assert status["report_id"] != report_key(str(path), params)
+
+
+def test_submit_cleans_up_on_interval_or_past_limit(tmp_path, monkeypatch):
+    def finish(jobs_dir, job_id, *args):
+        evaluation_jobs._write_json_atomic(os.path.join(jobs_dir, job_id, "status.json"), {"status": "completed"})
+        return "completed"
+
+    monkeypatch.setattr(evaluation_jobs, "run_evaluation_job", finish)
+    manager = EvaluationJobManager(str(tmp_path), max_parallel=1, max_queue=1, max_retained=3)
+    manager._executor = ThreadPoolExecutor(max_workers=1)
+    calls = []
+    cleanup = manager.cleanup
+    monkeypatch.setattr(manager, "cleanup", lambda: calls.append(1) or cleanup())
+
+    def submit():
+        manager.submit("a.csv")
+        while manager.get_stats()["in_flight"]:
+            time.sleep(0.001)
+
+    for _ in range(5):
+        submit()
+    # Premier envoi (intervalle écoulé), puis seulement au-delà de max_retained + jobs en cours.
+    assert len(calls) == 1 and len(os.listdir(tmp_path)) == 5
+    submit()
+    assert len(calls) == 2 and len(os.listdir(tmp_path)) == 4
+    manager.shutdown()
@@ -0,0 +1,71 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+from modules import grouped_reports
+from modules.evaluations import analyze_file, prepare_grouped_file
+from modules.grouped_reports import analyze_text_partition, generate_grouped_report, merge_grouped_report
+from utils.executors import BoundedPool, ExecutorSaturated
+
+COMMENTS = ["Formation excellente, très claire", "Salle bruyante, problème de chauffage",
+            "Bien mais rythme rapide", "Danger : machine mal protégée", "Très satisfait, exercices utiles"]
+
+
+def _evaluations(n=60):
+    return pd.DataFrame({
+        "site": [["Toulouse", "Bordeaux", "Paris"][i % 3] for i in range(n)],
+        "note": [i % 5 + 1 for i in range(n)],
+        "commentaire": [COMMENTS[i % len(COMMENTS)] for i in range(n)],
+        "remarque": [COMMENTS[(i * 2) % len(COMMENTS)] for i in range(n)],
+    })
+
+
+def _without_timings(report):
+    return {key: value for key, value in report.items() if key != "timings_ms"}
+
+
+def test_partitions_fanned_out_match_sequential_report(tmp_path):
+    path = tmp_path / "evaluations.csv"
+    _evaluations().to_csv(path, index=False)
+    params = {"text_columns": ["commentaire", "remarque"], "group_by": ["site"], "n_clusters": 2}
+
+    prepared = prepare_grouped_file(str(path), params["text_columns"], params["group_by"])
+    assert len(prepared["partitions"]) == 6
+    results = [analyze_text_partition(texts, n_clusters=2) for _, _, texts in prepared["partitions"]]
+    merged = merge_grouped_report(prepared, results, 1.0)
+
+    sequential = analyze_file(str(path), **params)
+    assert _without_timings(merged) == _without_timings(sequential)
+    assert list(merged["text"]["commentaire"]) == list(merged["quantitative"]["groups"])
+
+
+def test_embedding_clusterer_built_once_per_report(monkeypatch):
+    built = []
+
+    class FakeClusterer:
+        def cluster(self, texts):
+            return {"n_clusters": 1, "size": len(texts)}
+
+    monkeypatch.setattr(grouped_reports, "partition_clusterer", lambda: built.append(1) or FakeClusterer())
+    report = generate_grouped_report(_evaluations(), ["commentaire"], ["site"], clustering="embeddings")
+    assert len(built) == 1
+    assert [section["clusters"]["size"] for section in report["text"]["commentaire"].values()] == [20, 20, 20]
+
+
+def test_run_many_is_admitted_as_one_request():
+    pool = BoundedPool("test", ThreadPoolExecutor(max_workers=2), max_workers=2, max_queue=0)
+
+    async def scenario():
+        results = await pool.run_many(pow, [(2, i) for i in range(6)])
+        assert results == [1, 2, 4, 8, 16, 32]
+        assert pool.get_stats()["completed"] == 1
+        # Deux demandes en cours sur deux workers, file vide : la série suivante est refusée.
+        pool._in_flight = 2
+        with pytest.raises(ExecutorSaturated):
+            await pool.run_many(pow, [(2, 1)])
+        pool._in_flight = 0
+
+    asyncio.run(scenario())
+    pool.shutdown()
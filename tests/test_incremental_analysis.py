@@ -0,0 +1,78 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from modules.incremental_analysis import EvaluationState
+
+COMMENTS = [
+    "Formation excellente, formateur très clair",
+    "Contenu trop long et salle bruyante, problème de chauffage",
+    "Bien mais rythme rapide",
+    "Mauvaise organisation, documents absents",
+    "Très satisfait, exercices utiles",
+    "Danger : machine mal protégée pendant l'atelier",
+]
+
+
+def _evaluations(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "note": rng.integers(1, 6, n).astype(float),
+        "duree": rng.normal(7.0, 1.5, n),
+        "commentaire": [COMMENTS[i] for i in rng.integers(0, len(COMMENTS), n)],
+    })
+
+
+def _state(df, chunks):
+    state = EvaluationState(n_clusters=3)
+    for chunk in np.array_split(np.arange(len(df)), chunks):
+        state.update(df.iloc[chunk])
+    return state
+
+
+def test_merge_matches_single_pass():
+    df = _evaluations(400)
+    single = _state(df, 1)
+    left = _state(df.iloc[:150], 2)
+    right = _state(df.iloc[150:].reset_index(drop=True), 3)
+    merged = left.merge(right)
+
+    assert merged.total == single.total
+    for col in single.numeric_columns:
+        a, b = merged.stats[col], single.stats[col]
+        assert a.count == b.count
+        assert a.min == b.min and a.max == b.max
+        assert a.mean == pytest.approx(b.mean)
+        assert a.std() == pytest.approx(b.std())
+    assert merged.sentiment == single.sentiment
+    assert merged.term_counts == single.term_counts
+    assert merged.doc_freqs == single.doc_freqs
+    assert sorted(merged.weak_signals) == sorted(single.weak_signals)
+    assert merged.cluster_sizes.sum() == single.cluster_sizes.sum() == len(df)
+
+    merged_report, single_report = merged.report(), single.report()
+    assert merged_report["sentiment"] == single_report["sentiment"]
+    assert merged_report["themes"]["themes"] == single_report["themes"]["themes"]
+    assert merged_report["weak_signals"] == single_report["weak_signals"]
+
+
+def test_single_row_report_is_strict_json():
+    state = EvaluationState(n_clusters=3)
+    state.update(_evaluations(1))
+    report = state.report()
+    assert report["quantitative"]["std"] == {"note": None, "duree": None}
+    json.dumps(report, allow_nan=False)
+
+
+def test_empty_column_state_round_trips_as_strict_json():
+    state = EvaluationState(n_clusters=3)
+    state.update(pd.DataFrame({"note": [np.nan, np.nan], "commentaire": ["Bien", "Mal"]}))
+    report = state.report()
+    assert report["quantitative"]["min"] == {"note": None}
+    assert report["quantitative"]["medians"] == {"note": None}
+    data = json.loads(json.dumps(state.to_dict(), allow_nan=False))
+    restored = EvaluationState.from_dict(data)
+    restored.update(pd.DataFrame({"note": [3.0], "commentaire": ["Bien"]}))
+    assert restored.stats["note"].min == restored.stats["note"].max == 3.0
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from data.lexicons import LEXICONS
+from utils.lexicon import KeywordLexicon
+
+
+def _baseline(texts, lexicons):
+    # Boucles `kw in text.lower()` d'origine.
+    return np.array([[sum(1 for kw in keywords if kw in text.lower()) for keywords in lexicons.values()]
+                     for text in texts], dtype=np.int32).reshape(len(texts), len(lexicons))
+
+
+TEXTS = [
+    "Très bon contenu, formateur excellent",
+    "Formation dense, manque de pratique",
+    "Problème d'organisation, difficile à suivre",
+    "NON SATISFAIT : problème de salle, besoin d'améliorer le support",
+    "Problèmexcellent bonul",  # occurrences chevauchantes
+    "bonbonbon super super",  # répétitions : mots-clés distincts
+    "ligne 1 mauvais\nligne 2 nul",
+    "",
+    "İstanbul : très bien, rien à améliorer",  # minuscule sur deux caractères
+    "aucun mot-clé ici",
+]
+
+
+def test_count_matrix_matches_baseline():
+    lexicon = KeywordLexicon(LEXICONS)
+    assert np.array_equal(lexicon.count_matrix(TEXTS), _baseline(TEXTS, LEXICONS))
+
+
+def test_count_matrix_matches_baseline_on_random_texts():
+    lexicon = KeywordLexicon(LEXICONS)
+    vocabulary = [kw for keywords in LEXICONS.values() for kw in keywords] + ["la", "formation", "é", "n", "\n"]
+    rng = np.random.default_rng(0)
+    texts = ["".join(rng.choice(vocabulary, rng.integers(0, 12))) for _ in range(2000)]
+    assert np.array_equal(lexicon.count_matrix(texts), _baseline(texts, LEXICONS))
+
+
+def test_keyword_listed_twice_counts_twice():
+    lexicons = {"a": ["bon", "bon", "super"], "b": ["bon"], "vide": []}
+    lexicon = KeywordLexicon(lexicons)
+    texts = ["Bon et super", "rien"]
+    assert np.array_equal(lexicon.count_matrix(texts), _baseline(texts, lexicons))
+    assert lexicon.scan("BON") == {"a": 2, "b": 1, "vide": 0}
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Question sur mon SALAIRE", True),
+    ("Dossier médical", True),
+    ("Congés payés", False),
+])
+def test_contains_any(text, expected):
+    lexicon = KeywordLexicon(LEXICONS)
+    assert lexicon.contains_any(text, "blocked") is expected
+    assert lexicon.contains_any(text, "inconnue") is False
+
+
+def test_nested_and_overlapping_keywords():
+    # Préfixes ("bon" / "bonne"), mots-clés inclus ("onne") et chevauchements ("nnette").
+    lexicons = {"a": ["bon", "bonne", "onne", "nne"], "b": ["nnette", "e"]}
+    lexicon = KeywordLexicon(lexicons)
+    texts = ["Bonne", "bonbonnette", "bo nne", "onnette et bon"]
+    assert np.array_equal(lexicon.count_matrix(texts), _baseline(texts, lexicons))
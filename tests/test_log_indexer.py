@@ -0,0 +1,72 @@
+import json
+import os
+import time
+from datetime import datetime
+
+import pytest
+
+from utils.kpi_store import KPIStore
+from utils.log_indexer import LogIndexer
+
+
+def _line(records):
+    return json.dumps({"ts": datetime.now().isoformat(), "event": "evaluation", "records": records}) + "\n"
+
+
+def _append(path, text):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(text)
+
+
+def _rotate(log_file, backups):
+    # Décalage .1 -> .2… comme RotatingFileHandler ; dates espacées pour un ordre sans ambiguïté.
+    for i in range(backups, 0, -1):
+        if os.path.exists(f"{log_file}.{i}"):
+            os.rename(f"{log_file}.{i}", f"{log_file}.{i + 1}")
+    os.rename(log_file, f"{log_file}.1")
+    now = time.time()
+    for i in range(1, backups + 2):
+        if os.path.exists(f"{log_file}.{i}"):
+            os.utime(f"{log_file}.{i}", (now - i, now - i))
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    return KPIStore(str(tmp_path / "kpis.sqlite") if request.param == "sqlite" else None, flush_interval=0)
+
+
+def test_resumes_across_rotations_without_double_counting(tmp_path, store):
+    # Puissances de deux : tout oubli ou double comptage change le total.
+    log_file = str(tmp_path / "app_logs.log")
+    indexer = LogIndexer(log_file, store, interval=0)
+
+    def total():
+        return store.query("1h")["totals"]["evaluations_processed"]
+
+    _append(log_file, _line(1) + _line(2))
+    indexer.run_once()
+    assert total() == 3
+
+    # Ligne en cours d'écriture : lue une fois complète seulement.
+    _append(log_file, _line(4) + _line(8)[:-10])
+    indexer.run_once()
+    assert total() == 7
+
+    _append(log_file, _line(8)[-10:] + _line(16))
+    _rotate(log_file, 5)
+    _append(log_file, _line(32))
+    assert indexer.run_once()["rotated"]
+    assert total() == 63
+
+    assert indexer.run_once()["records"] == 0
+    assert total() == 63
+
+    # Deux rotations entre deux passages : l'archive intermédiaire est lue en entier.
+    _append(log_file, _line(64))
+    _rotate(log_file, 5)
+    _append(log_file, _line(128))
+    _rotate(log_file, 5)
+    _append(log_file, _line(256))
+    indexer.run_once()
+    assert total() == 511
+    assert indexer.get_stats()["rotations"] == 2
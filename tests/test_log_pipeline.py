@@ -0,0 +1,31 @@
+import glob
+import logging
+
+from utils.log_pipeline import BatchRotatingFileHandler
+
+
+def _write_batch(handler, lines):
+    handler.begin_batch()
+    for line in lines:
+        handler.handle(logging.makeLogRecord({"msg": line, "levelno": logging.INFO, "levelname": "INFO"}))
+    handler.flush_batch()
+
+
+def test_workers_share_one_rotation(tmp_path):
+    # Deux handlers sur le même fichier, comme deux workers : chacun suit la rotation faite par l'autre.
+    log_file = str(tmp_path / "app_logs.log")
+    handlers = [BatchRotatingFileHandler(log_file, maxBytes=1000, backupCount=20) for _ in range(2)]
+    written = []
+    for batch in range(40):
+        lines = [f"lot {batch:02d} ligne {i:02d} " + "x" * 40 for i in range(5)]
+        _write_batch(handlers[batch % 2], lines)
+        written.extend(lines)
+    for handler in handlers:
+        handler.close()
+
+    # Archives de la plus ancienne à la plus récente, puis le fichier courant : aucun lot écrit dans une archive.
+    files = sorted(glob.glob(log_file + ".*"), key=lambda path: -int(path.rsplit(".", 1)[1])) + [log_file]
+    found = [line for path in files for line in open(path, encoding="utf-8").read().splitlines()]
+    assert found == written
+    # ~16 Ko écrits par blocs de 1 Ko : une rotation par dépassement, pas une par worker.
+    assert len(files) <= 17
@@ -0,0 +1,70 @@
+import asyncio
+import gzip
+import io
+import json
+
+import pyarrow.parquet as pq
+from starlette.requests import Request
+
+from utils import report_payload
+from utils.report_cache import ReportCache
+from utils.report_payload import cluster_labels_parquet, compact_report, dumps, json_response, paginate
+
+
+def _request(accept_encoding: str) -> Request:
+    return Request({"type": "http", "method": "GET", "path": "/", "query_string": b"",
+                    "headers": [(b"accept-encoding", accept_encoding.encode())]})
+
+
+def test_compact_report_drops_labels_and_extra_weak_signals():
+    signals = [{"index": i, "text": "danger", "warning_level": 1.0} for i in range(5)]
+    report = {"weak_signals": signals, "clusters": {"clusters": [0, 1, 1], "n_clusters": 2}}
+    compact = compact_report(report, "abc", preview=2)
+    assert compact["report_id"] == "abc"
+    assert compact["weak_signals"] == signals[:2] and compact["weak_signals_total"] == 5
+    assert compact["clusters"] == {"n_clusters": 2, "labels_total": 3}
+    assert len(report["weak_signals"]) == 5 and "clusters" in report["clusters"]
+
+
+def test_paginate_bounds_offset_and_limit():
+    page = paginate(list(range(10)), offset=-3, limit=4)
+    assert (page["total"], page["offset"], page["limit"], page["items"]) == (10, 0, 4, [0, 1, 2, 3])
+    assert paginate(list(range(10)), offset=8, limit=0)["items"] == [8]
+
+
+def test_cluster_labels_parquet_round_trip():
+    table = pq.read_table(io.BytesIO(cluster_labels_parquet([2, 0, 1])))
+    assert table.column("index").to_pylist() == [0, 1, 2]
+    assert table.column("cluster").to_pylist() == [2, 0, 1]
+
+
+def test_fallback_serializer_writes_null_for_non_finite(monkeypatch):
+    monkeypatch.setattr(report_payload, "orjson", None)
+    payload = {"std": {"note": float("nan")}, "max": [float("inf"), 2.5], "id": 3}
+    assert json.loads(dumps(payload)) == {"std": {"note": None}, "max": [None, 2.5], "id": 3}
+
+
+def test_large_response_is_compressed_off_the_loop(monkeypatch):
+    monkeypatch.setattr(report_payload, "COMPRESSION_OFFLOAD_BYTES", 0)
+    payload = {"items": list(range(2000))}
+    response = asyncio.run(json_response(_request("gzip"), payload))
+    assert response.headers["content-encoding"] == "gzip"
+    assert json.loads(gzip.decompress(response.body)) == payload
+
+
+def test_truncated_weak_signals_are_reported():
+    signals = [{"index": i, "text": "danger", "warning_level": 1.0} for i in range(5)]
+    compact = compact_report({"weak_signals": signals, "weak_signals_total": 12}, "abc", preview=2)
+    assert compact["weak_signals_total"] == 12 and compact["weak_signals_truncated"]
+    page = paginate(signals, offset=4, limit=10, detected=12)
+    assert (page["total"], page["detected"], page["truncated"], len(page["items"])) == (5, 12, True, 1)
+
+
+def test_report_cache_serves_parsed_report_from_memory(tmp_path):
+    cache = ReportCache(str(tmp_path), memory_entries=2)
+    cache.put("ab", {"total_evaluations": 1})
+    first = cache.get("ab")
+    (tmp_path / "ab.json").unlink()
+    assert cache.get("ab") is first
+    cache.put("ab", {"total_evaluations": 2})
+    assert cache.get("ab") == {"total_evaluations": 2}
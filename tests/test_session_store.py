@@ -0,0 +1,91 @@
+import pytest
+
+from utils.session_store import PURGE_INTERVAL, SessionStore
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_store(request, tmp_path):
+    def make(**kwargs):
+        db_path = str(tmp_path / "sessions.sqlite") if request.param == "sqlite" else None
+        # Cache désactivé : chaque vérification relit la base.
+        return SessionStore(db_path, cache_size=0, **kwargs)
+    return make
+
+
+def test_session_expires_after_ttl(make_store):
+    clock = Clock()
+    store = make_store(ttl=60, clock=clock)
+    token = store.create({"user": "a"})
+    assert store.get(token) == {"user": "a"}
+
+    clock.now += 59
+    assert store.get(token) == {"user": "a"}
+    clock.now += 1
+    assert store.get(token) is None
+    assert len(store) == 0
+
+
+def test_expired_sessions_are_purged_on_create(make_store):
+    clock = Clock()
+    store = make_store(ttl=60, clock=clock)
+    for user in "abc":
+        store.create({"user": user})
+    clock.now += PURGE_INTERVAL + 60
+    token = store.create({"user": "d"})
+    assert store.expired == 3
+    assert store.get(token) == {"user": "d"}
+
+
+def test_eviction_drops_sessions_closest_to_expiry(make_store):
+    clock = Clock()
+    store = make_store(ttl=60, max_sessions=2, clock=clock)
+    tokens = []
+    for user in "abc":
+        tokens.append(store.create({"user": user}))
+        clock.now += 1
+    assert store.evicted == 1
+    assert store.get(tokens[0]) is None
+    assert [store.get(token)["user"] for token in tokens[1:]] == ["b", "c"]
+    assert len(store) == 2
+
+
+def test_deleted_session_is_not_evicted_again(make_store):
+    clock = Clock()
+    store = make_store(ttl=60, max_sessions=2, clock=clock)
+    first = store.create({"user": "a"})
+    clock.now += 1
+    second = store.create({"user": "b"})
+    assert store.delete(first)
+    assert not store.delete(first)
+    clock.now += 1
+    third = store.create({"user": "c"})
+    assert store.evicted == 0
+    assert store.get(second) == {"user": "b"} and store.get(third) == {"user": "c"}
+
+
+def test_sqlite_create_counts_sessions_only_on_sweep(tmp_path):
+    clock = Clock()
+    store = SessionStore(str(tmp_path / "sessions.sqlite"), ttl=3600, max_sessions=3, cache_size=0,
+                         clock=clock)
+    statements = []
+    conn = store._connect()
+    conn.set_trace_callback(statements.append)
+    tokens = [store.create({"user": user}) for user in "abcde"]
+    assert sum("COUNT(*)" in sql for sql in statements) == 1
+    assert store.evicted == 2 and len(store) == 3
+    assert store.get(tokens[-1]) == {"user": "e"}
+
+    # Sessions créées par un autre worker : recomptées à la purge suivante.
+    other = SessionStore(str(tmp_path / "sessions.sqlite"), ttl=3600, max_sessions=100, clock=clock)
+    other.create({"user": "f"})
+    clock.now += PURGE_INTERVAL
+    store.create({"user": "g"})
+    assert len(store) == 3
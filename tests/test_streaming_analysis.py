@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from modules.evaluations import EvaluationAnalyzer
+from modules.streaming_analysis import QuantileSketch, RunningStats, StreamingEvaluationAnalyzer
+
+
+def test_running_stats_merge_matches_full_pass():
+    values = np.random.default_rng(0).normal(3.0, 1.5, 10000)
+    stats = RunningStats()
+    for part in np.array_split(values, 7):
+        stats.update(part)
+    assert stats.count == len(values)
+    assert np.isclose(stats.mean, values.mean())
+    assert np.isclose(stats.std(), values.std(ddof=1))
+    assert (stats.min, stats.max) == (values.min(), values.max())
+
+
+def test_quantile_sketch_median_is_close():
+    values = np.random.default_rng(1).uniform(0, 10, 50000)
+    sketch = QuantileSketch(k=256)
+    for part in np.array_split(values, 20):
+        sketch.update(part)
+    assert sketch.count() == len(values)
+    assert abs(sketch.quantile(0.5) - np.median(values)) < 0.2
+
+
+# pandas 3 : colonnes `str` retrouvées par select_dtypes("object") avec un avertissement, puis plus du tout.
+@pytest.mark.filterwarnings("error:For backward compatibility, 'str' dtypes")
+def test_streaming_report_finds_text_column(tmp_path):
+    path = tmp_path / "evaluations.csv"
+    pd.DataFrame({
+        "note": [4, 2, 5, 1, 3, 4],
+        "commentaire": ["Très bien, excellent", "Problème de salle", "Super formation",
+                        "Mauvais rythme, difficile", "Rien à signaler", "Bon contenu"],
+    }).to_csv(path, index=False)
+
+    report = StreamingEvaluationAnalyzer(chunksize=4, n_clusters=2).generate_report(str(path))
+    analyzer = EvaluationAnalyzer()
+    analyzer.load_evaluations(str(path), lean=False)
+    assert report["sentiment"] == analyzer.analyze_sentiment("commentaire")
+    assert len(report["weak_signals"]) == 2
+    assert report["clusters"]["n_clusters"] == 2
+
+
+def test_streaming_types_sniffed_across_file(tmp_path):
+    # Commentaires vides dans le premier morceau, valeur parasite dans une note plus loin.
+    rows = 400
+    path = tmp_path / "evaluations.csv"
+    pd.DataFrame({
+        "note": [str(i % 5 + 1) for i in range(rows - 1)] + ["inconnue"],
+        "commentaire": [None] * 100 + ["Très bien, excellent" if i % 2 else "Problème de salle"
+                                       for i in range(rows - 100)],
+    }).to_csv(path, index=False)
+
+    report = StreamingEvaluationAnalyzer(chunksize=50, n_clusters=2).generate_report(str(path))
+    assert list(report["quantitative"]["moyennes"]) == ["note"]
+    assert report["ignored_values"] == {"note": 1}
+    assert report["sentiment"]["distribution"]["neutre"] == 100
+    clusters = report["clusters"]
+    assert "clusters" not in clusters
+    assert sum(clusters["cluster_sizes"]) == rows
+    assert all(len(item["comments"]) <= 3 for item in clusters["representatives"])
@@ -0,0 +1,140 @@
+import numpy as np
+import pytest
+
+from modules.kb_index_cache import KBIndexCache
+from modules.knowledge_base import KBSnapshot, build_vectors, update_vectors
+from modules.vector_index import (IndexConfig, aggregate_hits, build_index, prepare_vectors, to_confidence,
+                                  update_index)
+
+DIM = 16
+
+
+def _vectors(n, seed=0):
+    return np.random.default_rng(seed).standard_normal((n, DIM)).astype(np.float32)
+
+
+def _search_ids(index, queries, k=5):
+    return index.search(np.ascontiguousarray(queries), k)[1]
+
+
+def _config(index_type):
+    # nprobe = nlist : recherche IVF exhaustive, comparable à un index neuf.
+    return IndexConfig(index_type, nlist=4, nprobe=4)
+
+
+@pytest.mark.parametrize("index_type", ["flat-l2", "flat-ip", "ivf", "hnsw"])
+def test_index_finds_stored_vectors(index_type):
+    config = _config(index_type)
+    vectors = _vectors(200)
+    index, params = build_index(vectors, config)
+    assert index.ntotal == 200 and params["index_type"] == index_type
+    _, ids = index.search(prepare_vectors(vectors[:20], config), 1)
+    assert ids[:, 0].tolist() == list(range(20))
+
+
+def test_confidence_has_the_same_scale_for_l2_and_cosine():
+    vectors = prepare_vectors(_vectors(50), IndexConfig("flat-ip"))
+    query = prepare_vectors(_vectors(1, seed=1), IndexConfig("flat-ip"))
+    l2, _ = build_index(vectors, IndexConfig("flat-l2"))[0].search(query, 5)
+    ip, _ = build_index(vectors, IndexConfig("flat-ip"))[0].search(query, 5)
+    np.testing.assert_allclose(to_confidence(l2[0], IndexConfig("flat-l2")),
+                               to_confidence(ip[0], IndexConfig("flat-ip")), rtol=1e-4)
+
+
+def test_build_params_only_cover_index_content():
+    assert IndexConfig().build_params() is None
+    assert IndexConfig("ivf", nlist=8, nprobe=2).build_params() == {"index_type": "ivf", "nlist": 8}
+    with pytest.raises(ValueError):
+        IndexConfig("annoy")
+
+
+def test_aggregate_hits_keeps_best_confidence_per_intent():
+    hits = aggregate_hits(np.array([0.0, 1.0, 3.0, 0.5]), np.array([0, 1, 2, -1]), ["a", "b", "a"],
+                          IndexConfig(), top_k=2)
+    assert hits == [("a", 1.0, 2), ("b", 0.5, 1)]
+
+
+@pytest.mark.parametrize("index_type", ["flat-l2", "flat-ip", "ivf"])
+def test_update_index_matches_fresh_build(index_type):
+    config = _config(index_type)
+    vectors = _vectors(300)
+    ids = np.arange(300, dtype=np.int64)
+    index, _ = build_index(vectors, config, ids)
+
+    removed = np.arange(0, 300, 7, dtype=np.int64)
+    added = _vectors(20, seed=1)
+    added_ids = np.arange(1000, 1020, dtype=np.int64)
+    updated = update_index(index, config, removed, added, added_ids)
+    assert updated is not None
+    assert index.ntotal == 300  # l'index servi n'est pas modifié
+
+    keep = np.setdiff1d(ids, removed)
+    fresh, _ = build_index(np.vstack([vectors[keep], added]), config, np.concatenate([keep, added_ids]))
+    queries = _vectors(10, seed=2)
+    assert updated.ntotal == fresh.ntotal
+    assert (_search_ids(updated, queries) == _search_ids(fresh, queries)).all()
+
+
+def test_update_index_hnsw_adds_but_refuses_removal():
+    config = _config("hnsw")
+    index, _ = build_index(_vectors(100), config)
+    assert update_index(index, config, np.array([3], dtype=np.int64), _vectors(1), np.array([500])) is None
+    updated = update_index(index, config, np.empty(0, dtype=np.int64), _vectors(2, seed=3),
+                           np.array([500, 501], dtype=np.int64))
+    assert updated.ntotal == 102
+
+
+def test_update_index_on_mmap_cache_entry_falls_back(tmp_path):
+    config = _config("ivf")
+    vectors = _vectors(300)
+    index, params = build_index(vectors, config)
+    cache = KBIndexCache(str(tmp_path))
+    cache.save("fp", vectors, ["k"] * 300, index, params, np.arange(300))
+    loaded = cache.load("fp")[2]
+    # Listes inversées sur disque : pas de copie possible, l'appelant reconstruit.
+    assert update_index(loaded, config, np.array([1], dtype=np.int64), _vectors(1), np.array([900])) is None
+
+
+class _HashEncoder:
+    """Encodeur déterministe : un vecteur pseudo-aléatoire par texte."""
+
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts):
+        self.encoded.extend(texts)
+        return np.vstack([_vectors(1, seed=abs(hash(text)) % (2 ** 32))[0] for text in texts])
+
+
+def _kb(extra=None):
+    kb = {
+        "default": {"response": "?"},
+        "conges": {"keywords": [f"congé {i}" for i in range(40)], "responses": {"default": "C"}},
+        "salaire": {"keywords": [f"salaire {i}" for i in range(40)], "responses": {"default": "S"}},
+    }
+    kb.update(extra or {})
+    return kb
+
+
+@pytest.mark.parametrize("index_type", ["flat-l2", "ivf", "hnsw"])
+def test_update_vectors_after_cache_reload(tmp_path, index_type):
+    config = _config(index_type)
+    encoder = _HashEncoder()
+    kb = _kb()
+    embeddings, ids, index, params = build_vectors(kb, encoder, config)
+    cache = KBIndexCache(str(tmp_path))
+    cache.save("fp", embeddings, KBSnapshot(kb, "fp", None, ids, None, {}).keys, index, params, ids)
+    embeddings, _, loaded, params, ids = cache.load("fp")
+    previous = KBSnapshot(kb, "fp", embeddings, ids, loaded, params)
+
+    new_kb = _kb({"mutuelle": {"keywords": ["mutuelle santé"], "responses": {"default": "M"}}})
+    new_kb["salaire"]["keywords"] = new_kb["salaire"]["keywords"][1:]
+    encoder.encoded.clear()
+    (new_embeddings, new_ids, new_index, _), stats = update_vectors(previous, new_kb, encoder, config)
+
+    assert encoder.encoded == ["mutuelle santé"]
+    assert stats["added"] == 1 and stats["removed"] == 1
+    assert new_index.ntotal == len(new_ids) == 80
+    snapshot = KBSnapshot(new_kb, "fp2", new_embeddings, new_ids, new_index, {})
+    _, hits = new_index.search(np.ascontiguousarray(encoder.encode(["mutuelle santé"])), 1)
+    assert snapshot.intent_by_id[int(hits[0][0])] == "mutuelle"
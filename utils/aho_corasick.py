@@ -0,0 +1,68 @@
+from collections import deque
+from typing import Any, Dict, Iterator, List, Tuple
+
+
+class AhoCorasick:
+    """Automate d'Aho-Corasick : recherche simultanée de tous les motifs en une passe.
+
+    Chaque motif est associé à une valeur ; `finditer` renvoie toutes les
+    occurrences (y compris chevauchantes) sous forme (début, fin, motif, valeur).
+    """
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._patterns: List[List[Tuple[str, Any]]] = [[]]
+        self._outputs: List[List[Tuple[str, Any]]] = [[]]
+        self._size = 0
+        self._built = False
+
+    def add(self, pattern: str, value: Any = None):
+        if not pattern:
+            return
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._patterns.append([])
+            state = next_state
+        self._patterns[state].append((pattern, value))
+        self._size += 1
+        self._built = False
+
+    def build(self) -> "AhoCorasick":
+        self._outputs = [list(patterns) for patterns in self._patterns]
+        queue = deque()
+        for state in self._goto[0].values():
+            self._fail[state] = 0
+            queue.append(state)
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._outputs[next_state] = self._outputs[next_state] + self._outputs[self._fail[next_state]]
+        self._built = True
+        return self
+
+    def finditer(self, text: str) -> Iterator[Tuple[int, int, str, Any]]:
+        if not self._built:
+            self.build()
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for pattern, value in outputs[state]:
+                yield position - len(pattern) + 1, position + 1, pattern, value
+
+    def __len__(self) -> int:
+        return self._size
@@ -1,14 +1,15 @@
 import hashlib
-import secrets
 from typing import Dict, Optional
+from utils.session_store import SessionStore
 import logging
 
 logger = logging.getLogger(__name__)
 
 class AuthManager:
-    def __init__(self):
+    def __init__(self, sessions: Optional[SessionStore] = None):
         self.users = {}
-        self.sessions = {}
+        # Sessions partagées entre workers, avec expiration (SESSION_TTL) et taille bornée.
+        self.sessions = sessions or SessionStore.from_env()
         self._init_default_users()
     
     def _init_default_users(self):
@@ -36,12 +37,11 @@ class AuthManager:
         if user["password_hash"] != self._hash_password(password):
             return None
         
-        session_token = secrets.token_urlsafe(32)
-        self.sessions[session_token] = {
+        session_token = self.sessions.create({
             "username": username,
             "profile": user["profile"],
             "role": user["role"]
-        }
+        })
         
         return {
             "token": session_token,
@@ -54,10 +54,7 @@ class AuthManager:
         return self.sessions.get(token)
     
     def logout(self, token: str) -> bool:
-        if token in self.sessions:
-            del self.sessions[token]
-            return True
-        return False
+        return self.sessions.delete(token)
     
     def get_user_profile(self, token: str) -> Optional[str]:
         session = self.verify_token(token)
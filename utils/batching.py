@@ -0,0 +1,138 @@
+import asyncio
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class BatchStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.max_batch_size = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    def record(self, batch_size: int, waits_ms: List[float]):
+        with self._lock:
+            self.batches += 1
+            self.items += batch_size
+            self.max_batch_size = max(self.max_batch_size, batch_size)
+            self.total_wait_ms += sum(waits_ms)
+            if waits_ms:
+                self.max_wait_ms = max(self.max_wait_ms, max(waits_ms))
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+                "max_batch_size": self.max_batch_size,
+                "avg_queue_wait_ms": self.total_wait_ms / self.items if self.items else 0.0,
+                "max_queue_wait_ms": self.max_wait_ms,
+            }
+
+
+class MicroBatcher:
+    """Regroupe les requêtes concurrentes pour les traiter en un seul appel.
+
+    `process_batch` reçoit la liste des éléments collectés pendant la fenêtre
+    (au plus `max_batch_size`, au plus `max_wait_ms` après le premier) et doit
+    renvoyer une liste de résultats dans le même ordre. `runner` exécute ce
+    traitement hors de la boucle asyncio (par défaut l'exécuteur de la boucle) ;
+    plusieurs batches peuvent être en cours simultanément.
+    """
+
+    def __init__(self, process_batch: Callable[[List[Any]], List[Any]],
+                 max_batch_size: int = 32, max_wait_ms: float = 5.0,
+                 runner: Optional[Callable[..., Awaitable]] = None):
+        self.process_batch = process_batch
+        self.runner = runner
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_ms = max(0.0, max_wait_ms)
+        self.stats = BatchStats()
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._dispatches: Set[asyncio.Task] = set()
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, item: Any) -> Any:
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future, time.perf_counter()))
+        return await future
+
+    async def submit_many(self, items: List[Any]) -> List[Any]:
+        self._ensure_worker()
+        loop = asyncio.get_running_loop()
+        futures = []
+        for item in items:
+            future = loop.create_future()
+            futures.append(future)
+            await self._queue.put((item, future, time.perf_counter()))
+        return list(await asyncio.gather(*futures))
+
+    async def _collect(self) -> List:
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000.0
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _dispatch(self, batch: List):
+        started = time.perf_counter()
+        items = [item for item, _, _ in batch]
+        waits_ms = [(started - enqueued) * 1000.0 for _, _, enqueued in batch]
+        try:
+            if self.runner is not None:
+                results = await self.runner(self.process_batch, items)
+            else:
+                results = await asyncio.get_running_loop().run_in_executor(None, self.process_batch, items)
+        except Exception as e:
+            logger.error(f"Erreur traitement batch : {e}")
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.stats.record(len(batch), waits_ms)
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            task = loop.create_task(self._dispatch(batch))
+            self._dispatches.add(task)
+            task.add_done_callback(self._dispatches.discard)
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    def get_stats(self) -> Dict:
+        stats = self.stats.to_dict()
+        stats["max_batch_size_config"] = self.max_batch_size
+        stats["max_wait_ms_config"] = self.max_wait_ms
+        stats["queue_depth"] = self._queue.qsize() if self._queue is not None else 0
+        return stats
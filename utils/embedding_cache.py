@@ -0,0 +1,128 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Limite de paramètres par requête SQLite (999 sur les anciennes versions).
+SQLITE_MAX_VARIABLES = 900
+
+
+def text_key(model_name: str, text: str) -> str:
+    digest = hashlib.sha256(model_name.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(text.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class EmbeddingCache:
+    """Cache disque (SQLite) des embeddings de commentaires, adressé par empreinte du texte.
+
+    La clé combine le nom du modèle et le texte : changer de modèle n'entraîne
+    jamais la réutilisation d'anciens vecteurs. Plusieurs processus peuvent
+    lire et écrire la même base (mode WAL). Chaque lecture met à jour la date
+    d'utilisation des vecteurs trouvés ; au-delà de `max_entries` vecteurs,
+    les moins récemment utilisés sont supprimés.
+    """
+
+    def __init__(self, db_path: str = "data/cache/embeddings.sqlite", max_entries: int = 500000):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, dim INTEGER, vector BLOB, "
+                "last_used REAL DEFAULT 0)"
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(embeddings)")}
+            if "last_used" not in columns:
+                # Base créée avant l'éviction : les vecteurs existants sont les premiers évincés.
+                conn.execute("ALTER TABLE embeddings ADD COLUMN last_used REAL DEFAULT 0")
+            conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+
+    @classmethod
+    def from_env(cls) -> "EmbeddingCache":
+        return cls(
+            os.getenv("EMBEDDING_CACHE_PATH", "data/cache/embeddings.sqlite"),
+            max_entries=int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "500000")),
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        # Une connexion par thread, réutilisée d'une partition et d'un rapport à l'autre.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.db_path, timeout=30)
+        return conn
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        with self._connect() as conn:
+            for start in range(0, len(keys), SQLITE_MAX_VARIABLES):
+                chunk = keys[start:start + SQLITE_MAX_VARIABLES]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                )
+                for key, vector in rows:
+                    found[key] = np.frombuffer(vector, dtype=np.float32)
+            if found:
+                try:
+                    conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?",
+                                     [(time.time(), key) for key in found])
+                except sqlite3.Error as e:
+                    logger.error(f"Erreur mise à jour du cache d'embeddings : {e}")
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items: Dict[str, np.ndarray]):
+        now = time.time()
+        rows = [
+            (key, int(vector.shape[0]), np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for key, vector in items.items()
+        ]
+        try:
+            with self._connect() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, dim, vector, last_used) VALUES (?, ?, ?, ?)", rows
+                )
+                self._prune(conn)
+        except sqlite3.Error as e:
+            logger.error(f"Erreur écriture du cache d'embeddings : {e}")
+
+    def _prune(self, conn: sqlite3.Connection):
+        excess = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] - self.max_entries
+        if excess <= 0:
+            return
+        evicted = conn.execute(
+            "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+            (excess,),
+        ).rowcount
+        with self._lock:
+            self.evictions += evicted
+
+    def get_stats(self) -> Dict:
+        with self._connect() as conn:
+            entries = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
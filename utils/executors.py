@@ -0,0 +1,166 @@
+import asyncio
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutorSaturated(Exception):
+    def __init__(self, pool_name: str, retry_after: int, status_code: int = 503):
+        super().__init__(f"Pool '{pool_name}' saturé, réessayer dans {retry_after}s")
+        self.pool_name = pool_name
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+
+def _timed_call(fn: Callable, args: tuple, kwargs: dict):
+    # Exécuté dans le worker (thread ou processus) : mesure le temps de calcul réel.
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+class BoundedPool:
+    """Pool d'exécution à concurrence bornée avec limite de file d'attente.
+
+    Au plus `max_workers` tâches s'exécutent en même temps et au plus
+    `max_queue` attendent ; au-delà, `run` lève `ExecutorSaturated`.
+    """
+
+    def __init__(self, name: str, executor: Executor, max_workers: int, max_queue: int,
+                 saturated_status: int = 503):
+        self.name = name
+        self.executor = executor
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.saturated_status = saturated_status
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._busy_seconds = 0.0
+        self._started_at = time.perf_counter()
+
+    def _retry_after(self) -> int:
+        avg = self._busy_seconds / self._completed if self._completed else 1.0
+        waiting = max(1, self._in_flight - self.max_workers + 1)
+        return max(1, math.ceil(avg * waiting / self.max_workers))
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_queue:
+                self._rejected += 1
+                raise ExecutorSaturated(self.name, self._retry_after(), self.saturated_status)
+            self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            result, elapsed = await loop.run_in_executor(self.executor, _timed_call, fn, args, kwargs)
+        except Exception:
+            with self._lock:
+                self._failed += 1
+            raise
+        else:
+            with self._lock:
+                self._completed += 1
+                self._busy_seconds += elapsed
+            return result
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    async def run_many(self, fn: Callable, args_list: List[tuple], **kwargs) -> List:
+        """Exécute `fn` sur chaque tuple d'arguments, en parallèle sur les workers.
+
+        La série est admise (ou refusée) comme une seule demande : ses tâches
+        passent toutes par la file de l'exécuteur, sans compter dans `max_queue`.
+        """
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_queue:
+                self._rejected += 1
+                raise ExecutorSaturated(self.name, self._retry_after(), self.saturated_status)
+            self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            outcomes = await asyncio.gather(*(
+                loop.run_in_executor(self.executor, _timed_call, fn, args, kwargs) for args in args_list
+            ))
+        except Exception:
+            with self._lock:
+                self._failed += 1
+            raise
+        else:
+            with self._lock:
+                self._completed += 1
+                self._busy_seconds += sum(elapsed for _, elapsed in outcomes)
+            return [result for result, _ in outcomes]
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            uptime = time.perf_counter() - self._started_at
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "active": min(self._in_flight, self.max_workers),
+                "queued": max(0, self._in_flight - self.max_workers),
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "busy_seconds": self._busy_seconds,
+                "utilisation": self._busy_seconds / (uptime * self.max_workers) if uptime > 0 else 0.0,
+            }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class InferenceExecutor:
+    """Sépare les calculs lourds de la boucle asyncio.
+
+    - `encode` : pool de threads pour l'encodage SentenceTransformer / FAISS
+      (libère le GIL pendant les calculs numériques).
+    - `analysis` : pool de processus pour l'analyse des évaluations
+      (TF-IDF + KMeans), isolée du processus qui sert les requêtes.
+    """
+
+    def __init__(self, encode_workers: int = 2, encode_queue: int = 64,
+                 analysis_workers: int = 2, analysis_queue: int = 4):
+        self.encode = BoundedPool(
+            "encode",
+            ThreadPoolExecutor(max_workers=encode_workers, thread_name_prefix="encode"),
+            encode_workers, encode_queue,
+        )
+        self.analysis = BoundedPool(
+            "analysis",
+            ProcessPoolExecutor(max_workers=analysis_workers, mp_context=multiprocessing.get_context("spawn")),
+            analysis_workers, analysis_queue, saturated_status=429,
+        )
+
+    @classmethod
+    def from_env(cls) -> "InferenceExecutor":
+        cpu_count = os.cpu_count() or 2
+        return cls(
+            encode_workers=int(os.getenv("ENCODE_WORKERS", "2")),
+            encode_queue=int(os.getenv("ENCODE_QUEUE_SIZE", "64")),
+            analysis_workers=int(os.getenv("ANALYSIS_WORKERS", str(max(1, cpu_count // 2)))),
+            analysis_queue=int(os.getenv("ANALYSIS_QUEUE_SIZE", "4")),
+        )
+
+    def get_stats(self) -> Dict:
+        return {
+            "encode": self.encode.get_stats(),
+            "analysis": self.analysis.get_stats(),
+        }
+
+    def shutdown(self):
+        self.encode.shutdown()
+        self.analysis.shutdown()
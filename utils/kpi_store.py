@@ -0,0 +1,437 @@
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from utils.metrics import DEFAULT_BUCKETS, QUANTILES, bucket_quantile
+import logging
+
+logger = logging.getLogger(__name__)
+
+# (nom, pas en secondes, nombre de buckets conservés) : 24 h par minute, 31 jours par heure, ~13 mois par jour.
+RESOLUTIONS = (("minute", 60, 1440), ("hour", 3600, 744), ("day", 86400, 400))
+# Nombre maximal de buckets parcourus par requête : fixe la résolution retenue pour une fenêtre.
+MAX_POINTS = 1440
+CONFIDENCE_BINS = 10
+# Recouvrement de la synchronisation : une ligne validée par un autre worker juste après
+# notre lecture est relue au tour suivant (l'application d'une ligne est idempotente).
+SYNC_OVERLAP = 5.0
+_WINDOW = re.compile(r"^\s*(\d+)\s*([mhd])\s*$")
+_WINDOW_UNITS = {"m": 60, "h": 3600, "d": 86400}
+
+
+class KPIBucket:
+    """Agrégats d'un intervalle de temps ; deux buckets se fusionnent par addition."""
+
+    __slots__ = ("questions", "latency", "latency_sum", "confidence", "confidence_sum", "intents",
+                 "evaluations", "evaluation_files", "logins", "users", "security")
+
+    def __init__(self):
+        self.questions = 0
+        # Latences en secondes, mêmes bornes que les histogrammes de /metrics (+Inf en dernier).
+        self.latency = [0] * (len(DEFAULT_BUCKETS) + 1)
+        self.latency_sum = 0.0
+        self.confidence = [0] * CONFIDENCE_BINS
+        self.confidence_sum = 0.0
+        self.intents: Dict[str, int] = {}
+        self.evaluations = 0
+        self.evaluation_files = 0
+        self.logins = 0
+        self.users = set()
+        self.security: Dict[str, int] = {}
+
+    def add_question(self, intent: Optional[str], confidence: float, latency: Optional[float], user: Optional[str]):
+        self.questions += 1
+        if latency is not None:
+            self.latency[bisect_left(DEFAULT_BUCKETS, latency)] += 1
+            self.latency_sum += latency
+        confidence = min(max(float(confidence), 0.0), 1.0)
+        self.confidence[min(int(confidence * CONFIDENCE_BINS), CONFIDENCE_BINS - 1)] += 1
+        self.confidence_sum += confidence
+        if intent:
+            self.intents[intent] = self.intents.get(intent, 0) + 1
+        if user:
+            self.users.add(user)
+
+    def add_evaluation(self, records: int):
+        self.evaluations += records
+        self.evaluation_files += 1
+
+    def add_login(self, user: str):
+        self.logins += 1
+        self.users.add(user)
+
+    def add_security(self, event_type: str):
+        self.security[event_type] = self.security.get(event_type, 0) + 1
+
+    def merge(self, other: "KPIBucket") -> "KPIBucket":
+        self.questions += other.questions
+        self.latency = [a + b for a, b in zip(self.latency, other.latency)]
+        self.latency_sum += other.latency_sum
+        self.confidence = [a + b for a, b in zip(self.confidence, other.confidence)]
+        self.confidence_sum += other.confidence_sum
+        for intent, count in other.intents.items():
+            self.intents[intent] = self.intents.get(intent, 0) + count
+        self.evaluations += other.evaluations
+        self.evaluation_files += other.evaluation_files
+        self.logins += other.logins
+        self.users |= other.users
+        for event_type, count in other.security.items():
+            self.security[event_type] = self.security.get(event_type, 0) + count
+        return self
+
+    def to_dict(self) -> Dict:
+        return {
+            "questions": self.questions, "latency": self.latency, "latency_sum": self.latency_sum,
+            "confidence": self.confidence, "confidence_sum": self.confidence_sum, "intents": self.intents,
+            "evaluations": self.evaluations, "evaluation_files": self.evaluation_files,
+            "logins": self.logins, "users": sorted(self.users), "security": self.security,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "KPIBucket":
+        bucket = cls()
+        bucket.questions = data.get("questions", 0)
+        if len(data.get("latency", ())) == len(bucket.latency):
+            bucket.latency = list(data["latency"])
+            bucket.latency_sum = data.get("latency_sum", 0.0)
+        if len(data.get("confidence", ())) == CONFIDENCE_BINS:
+            bucket.confidence = list(data["confidence"])
+            bucket.confidence_sum = data.get("confidence_sum", 0.0)
+        bucket.intents = dict(data.get("intents", {}))
+        bucket.evaluations = data.get("evaluations", 0)
+        bucket.evaluation_files = data.get("evaluation_files", 0)
+        bucket.logins = data.get("logins", 0)
+        bucket.users = set(data.get("users", ()))
+        bucket.security = dict(data.get("security", {}))
+        return bucket
+
+    def latency_stats(self) -> Dict:
+        count = sum(self.latency)
+        stats = {"count": count, "avg_ms": self.latency_sum / count * 1000.0 if count else 0.0}
+        for q in QUANTILES:
+            stats[f"p{int(q * 100)}_ms"] = bucket_quantile(DEFAULT_BUCKETS, self.latency, q) * 1000.0
+        return stats
+
+
+class RingBuffer:
+    """Buckets d'une résolution sur un tableau de taille fixe, indexé par début d'intervalle."""
+
+    def __init__(self, name: str, step: int, size: int):
+        self.name = name
+        self.step = step
+        self.size = size
+        self._starts: List[Optional[int]] = [None] * size
+        self._buckets: List[Optional[KPIBucket]] = [None] * size
+
+    @property
+    def span(self) -> int:
+        return self.step * self.size
+
+    def start_of(self, ts: float) -> int:
+        return int(ts // self.step) * self.step
+
+    def bucket(self, start: int) -> KPIBucket:
+        slot = (start // self.step) % self.size
+        if self._starts[slot] != start:
+            # Emplacement occupé par un intervalle plus ancien d'un tour : recyclé.
+            self._starts[slot] = start
+            self._buckets[slot] = KPIBucket()
+        return self._buckets[slot]
+
+    def get(self, start: int) -> Optional[KPIBucket]:
+        slot = (start // self.step) % self.size
+        return self._buckets[slot] if self._starts[slot] == start else None
+
+    def set(self, start: int, bucket: KPIBucket):
+        slot = (start // self.step) % self.size
+        current = self._starts[slot]
+        if current is None or current <= start:
+            self._starts[slot] = start
+            self._buckets[slot] = bucket
+
+    def range(self, first: int, last: int) -> Iterator[Tuple[int, KPIBucket]]:
+        for start in range(first, last + 1, self.step):
+            bucket = self.get(start)
+            if bucket is not None:
+                yield start, bucket
+
+
+def parse_window(window: str) -> int:
+    match = _WINDOW.match(window or "")
+    if not match:
+        raise ValueError(f"Fenêtre invalide : {window} (attendu : nombre suivi de m, h ou d, ex. 24h)")
+    seconds = int(match.group(1)) * _WINDOW_UNITS[match.group(2)]
+    if seconds <= 0:
+        raise ValueError(f"Fenêtre invalide : {window}")
+    return seconds
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+
+class _KPIRecorder:
+    # Enregistrement des événements ; `_apply` décide où vont les incréments.
+
+    def _apply(self, ts: Optional[float], update: Callable[[KPIBucket], None]):
+        raise NotImplementedError
+
+    def record_question(self, intent: Optional[str], confidence: float, latency: Optional[float] = None,
+                        user: Optional[str] = None, ts: Optional[float] = None):
+        """Question du chatbot ; `latency` en secondes."""
+        self._apply(ts, lambda bucket: bucket.add_question(intent, confidence, latency, user))
+
+    def record_evaluation(self, records: int, ts: Optional[float] = None):
+        self._apply(ts, lambda bucket: bucket.add_evaluation(records))
+
+    def record_login(self, user: str, ts: Optional[float] = None):
+        self._apply(ts, lambda bucket: bucket.add_login(user))
+
+    def record_security(self, event_type: str, ts: Optional[float] = None):
+        self._apply(ts, lambda bucket: bucket.add_security(event_type))
+
+
+class KPIBatch(_KPIRecorder):
+    """Incréments accumulés à part, validés d'un bloc par `KPIStore.commit`."""
+
+    def __init__(self, store: "KPIStore"):
+        self.store = store
+        self.deltas: Dict[Tuple[str, int], KPIBucket] = {}
+        self.events = 0
+
+    def _apply(self, ts: Optional[float], update: Callable[[KPIBucket], None]):
+        self.events += 1
+        for key in self.store._keys(ts):
+            bucket = self.deltas.get(key)
+            if bucket is None:
+                bucket = self.deltas[key] = KPIBucket()
+            update(bucket)
+
+
+class KPIStore(_KPIRecorder):
+    """Séries temporelles des KPI en buffers circulaires (minute, heure, jour).
+
+    Chaque événement incrémente le bucket courant des trois résolutions ;
+    une requête `/kpis?window=` additionne les buckets de la fenêtre, sans
+    relire les journaux. Les incréments sont ajoutés périodiquement à une
+    base SQLite partagée (mode WAL), puis les buckets modifiés par les autres
+    workers sont relus : la vue converge entre workers et survit aux
+    redémarrages.
+    """
+
+    def __init__(self, db_path: Optional[str] = "data/kpis.sqlite", flush_interval: float = 10.0,
+                 clock: Callable[[], float] = time.time):
+        self.db_path = db_path or None
+        self.flush_interval = flush_interval
+        self.clock = clock
+        self.rings = {name: RingBuffer(name, step, size) for name, step, size in RESOLUTIONS}
+        # Incréments pas encore écrits en base, par (résolution, début).
+        self._pending: Dict[Tuple[str, int], KPIBucket] = {}
+        self._lock = threading.Lock()
+        self._last_sync = 0.0
+        # Points de reprise des indexeurs de journaux quand la base est désactivée.
+        self._checkpoints: Dict[str, Dict] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        if self.db_path:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            with self._connect() as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS kpi_buckets (resolution TEXT, start INTEGER, data TEXT, "
+                    "updated REAL, PRIMARY KEY (resolution, start))"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS kpi_buckets_updated ON kpi_buckets (updated)")
+                conn.execute("CREATE TABLE IF NOT EXISTS log_checkpoints (path TEXT PRIMARY KEY, state TEXT)")
+            self._sync()
+
+    @classmethod
+    def from_env(cls) -> "KPIStore":
+        return cls(os.getenv("KPI_STORE_PATH", "data/kpis.sqlite"),
+                   float(os.getenv("KPI_FLUSH_INTERVAL", "10")))
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _keys(self, ts: Optional[float]) -> List[Tuple[str, int]]:
+        now = self.clock()
+        ts = now if ts is None else ts
+        keys = []
+        for ring in self.rings.values():
+            start = ring.start_of(ts)
+            # Événement daté hors de la période conservée par cette résolution : ignoré.
+            if start > now - ring.span:
+                keys.append((ring.name, start))
+        return keys
+
+    def _apply(self, ts: Optional[float], update: Callable[[KPIBucket], None]):
+        keys = self._keys(ts)
+        with self._lock:
+            for name, start in keys:
+                update(self.rings[name].bucket(start))
+                if self.db_path:
+                    pending = self._pending.get((name, start))
+                    if pending is None:
+                        pending = self._pending[(name, start)] = KPIBucket()
+                    update(pending)
+
+    def batch(self) -> KPIBatch:
+        return KPIBatch(self)
+
+    def commit(self, batch: KPIBatch, checkpoint: Optional[Tuple[str, Dict]] = None) -> bool:
+        """Valide un lot et, dans la même transaction, le point de reprise `(chemin, état)`
+        de l'indexeur qui l'a produit : un lot n'est jamais compté deux fois."""
+        if not self.db_path:
+            with self._lock:
+                for (name, start), delta in batch.deltas.items():
+                    self.rings[name].bucket(start).merge(delta)
+                if checkpoint is not None:
+                    self._checkpoints[checkpoint[0]] = checkpoint[1]
+            return True
+        try:
+            with self._connect() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                self._write_deltas(conn, batch.deltas)
+                if checkpoint is not None:
+                    conn.execute("INSERT OR REPLACE INTO log_checkpoints (path, state) VALUES (?, ?)",
+                                 (checkpoint[0], json.dumps(checkpoint[1])))
+        except sqlite3.Error as e:
+            logger.error(f"Erreur écriture des KPI : {e}")
+            return False
+        self._sync()
+        return True
+
+    def get_checkpoint(self, path: str) -> Optional[Dict]:
+        if not self.db_path:
+            with self._lock:
+                return self._checkpoints.get(path)
+        with self._connect() as conn:
+            row = conn.execute("SELECT state FROM log_checkpoints WHERE path = ?", (path,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def query(self, window: str = "24h") -> Dict:
+        seconds = parse_window(window)
+        ring = None
+        for name, step, size in RESOLUTIONS:
+            if seconds <= step * size and seconds / step <= MAX_POINTS:
+                ring = self.rings[name]
+                break
+        if ring is None:
+            raise ValueError(f"Fenêtre trop longue : {window} (maximum {RESOLUTIONS[-1][2]}d)")
+        now = self.clock()
+        last = ring.start_of(now)
+        first = last - (math.ceil(seconds / ring.step) - 1) * ring.step
+        totals, series = KPIBucket(), []
+        with self._lock:
+            for start, bucket in ring.range(first, last):
+                totals.merge(bucket)
+                series.append({
+                    "ts": _iso(start),
+                    "questions": bucket.questions,
+                    "p95_ms": bucket.latency_stats()["p95_ms"],
+                    "avg_confidence": bucket.confidence_sum / bucket.questions if bucket.questions else 0.0,
+                    "evaluations": bucket.evaluations,
+                    "logins": bucket.logins,
+                    "active_users": len(bucket.users),
+                })
+        return {
+            "window": window,
+            "resolution": ring.name,
+            "from": _iso(first),
+            "to": _iso(now),
+            "totals": {
+                "questions": totals.questions,
+                "latency": totals.latency_stats(),
+                "confidence": {
+                    "avg": totals.confidence_sum / totals.questions if totals.questions else 0.0,
+                    "histogram": totals.confidence,
+                },
+                "intents": dict(sorted(totals.intents.items(), key=lambda item: -item[1])),
+                "evaluations_processed": totals.evaluations,
+                "evaluation_files": totals.evaluation_files,
+                "logins": totals.logins,
+                "active_users": len(totals.users),
+                "security_events": totals.security,
+            },
+            "series": series,
+        }
+
+    def flush(self):
+        """Ajoute les incréments en attente à la base, puis relit les buckets modifiés ailleurs."""
+        if not self.db_path:
+            return
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if pending:
+            try:
+                with self._connect() as conn:
+                    conn.execute("BEGIN IMMEDIATE")
+                    self._write_deltas(conn, pending)
+            except sqlite3.Error as e:
+                logger.error(f"Erreur écriture des KPI : {e}")
+                # Incréments conservés pour le prochain essai.
+                with self._lock:
+                    for key, delta in pending.items():
+                        current = self._pending.get(key)
+                        self._pending[key] = delta.merge(current) if current is not None else delta
+                return
+        self._sync()
+
+    def _write_deltas(self, conn: sqlite3.Connection, deltas: Dict[Tuple[str, int], KPIBucket]):
+        # Dans une transaction BEGIN IMMEDIATE : lecture, addition et réécriture sans concurrence.
+        now = self.clock()
+        for (resolution, start), delta in deltas.items():
+            row = conn.execute("SELECT data FROM kpi_buckets WHERE resolution = ? AND start = ?",
+                               (resolution, start)).fetchone()
+            merged = KPIBucket.from_dict(json.loads(row[0])).merge(delta) if row else delta
+            conn.execute("INSERT OR REPLACE INTO kpi_buckets (resolution, start, data, updated) VALUES (?, ?, ?, ?)",
+                         (resolution, start, json.dumps(merged.to_dict()), now))
+        for name, step, size in RESOLUTIONS:
+            conn.execute("DELETE FROM kpi_buckets WHERE resolution = ? AND start < ?", (name, int(now) - step * size))
+
+    def _sync(self):
+        since = self._last_sync - SYNC_OVERLAP if self._last_sync else 0.0
+        try:
+            with self._connect() as conn:
+                rows = conn.execute("SELECT resolution, start, data, updated FROM kpi_buckets WHERE updated >= ?",
+                                    (since,)).fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Erreur lecture des KPI : {e}")
+            return
+        now = self.clock()
+        with self._lock:
+            for resolution, start, data, updated in rows:
+                ring = self.rings.get(resolution)
+                if ring is None or start <= now - ring.span:
+                    continue
+                bucket = KPIBucket.from_dict(json.loads(data))
+                pending = self._pending.get((resolution, start))
+                if pending is not None:
+                    # Événements enregistrés depuis le dernier flush : pas encore en base.
+                    bucket.merge(pending)
+                ring.set(start, bucket)
+                self._last_sync = max(self._last_sync, updated)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Erreur synchronisation des KPI : {e}")
+
+    def start(self):
+        if self.db_path and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="kpi-store", daemon=True)
+            self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.flush_interval + 5)
+        self.flush()
@@ -0,0 +1,145 @@
+import json
+import os
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _trie_pattern(keywords: Iterable[str]) -> str:
+    # Alternance factorisée par préfixes communs ("b(?:esoin|on)") : à chaque
+    # position, `re` n'essaie qu'une branche par caractère, quel que soit le
+    # nombre de mots-clés, et le quantificateur glouton retient le plus long.
+    trie: Dict[str, dict] = {}
+    for kw in keywords:
+        node = trie
+        for char in kw:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: Dict[str, dict]) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 and "" not in node else "(?:" + "|".join(branches) + ")"
+        return body + "?" if "" in node else body
+
+    return build(trie)
+
+
+class KeywordLexicon:
+    """Lexiques de mots-clés compilés pour un comptage par lot.
+
+    Le nombre de mots-clés distincts présents est compté pour chaque
+    catégorie (recherche de sous-chaînes sur le texte en minuscules, comme les
+    boucles `kw in text.lower()` d'origine). `count_matrix` met les textes
+    d'un lot bout à bout et les parcourt une seule fois avec une alternance
+    `re` de tous les mots-clés factorisée en arbre de préfixes : à chaque
+    position, le plus long mot-clé est retenu et ceux qui en sont des
+    préfixes s'en déduisent ; la recherche reprend au caractère suivant pour
+    les occurrences chevauchantes. Le coût Python est proportionnel au
+    nombre d'occurrences, et le parcours ne dépend presque pas de la taille
+    du lexique. Chaque catégorie est aussi compilée en une alternance `re` pour
+    `contains_any`.
+    """
+
+    def __init__(self, lexicons: Dict[str, List[str]]):
+        self.lexicons = {category: list(keywords) for category, keywords in lexicons.items()}
+        self.categories = list(self.lexicons)
+        self._category_index = {category: i for i, category in enumerate(self.categories)}
+        keyword_categories: Dict[str, List[int]] = {}
+        for category, keywords in self.lexicons.items():
+            for kw in keywords:
+                if kw:
+                    keyword_categories.setdefault(kw.lower(), []).append(self._category_index[category])
+        self._keyword_categories = keyword_categories
+        # Mots-clés commençant au même endroit qu'un mot-clé donné : ses préfixes, lui compris.
+        self._prefixes = {
+            kw: [other for other in keyword_categories if kw.startswith(other)] for kw in keyword_categories
+        }
+        self._keyword_ids = {kw: i for i, kw in enumerate(keyword_categories)}
+        self._any_keyword = re.compile(_trie_pattern(keyword_categories))
+        self._patterns = {
+            category: re.compile("|".join(re.escape(kw.lower()) for kw in sorted(keywords, key=len, reverse=True)))
+            for category, keywords in self.lexicons.items() if any(keywords)
+        }
+
+    @classmethod
+    def from_file(cls, path: str) -> "KeywordLexicon":
+        with open(path, encoding="utf-8") as f:
+            if path.endswith((".yaml", ".yml")):
+                import yaml
+                lexicons = yaml.safe_load(f)
+            else:
+                lexicons = json.load(f)
+        return cls(lexicons)
+
+    def size(self, category: str) -> int:
+        return len(self.lexicons.get(category, []))
+
+    def scan(self, text: str) -> Dict[str, int]:
+        return dict(zip(self.categories, self.count_matrix([text])[0].tolist()))
+
+    def count_matrix(self, texts: Iterable[str]) -> np.ndarray:
+        """Matrice (n_textes, n_catégories) des comptes, en une passe sur le lot."""
+        texts = list(texts)
+        counts = np.zeros((len(texts), len(self.categories)), dtype=np.int32)
+        if not texts or not self._keyword_categories:
+            return counts
+        joined = "\n".join(texts)
+        lowered = joined.lower()
+        if len(lowered) != len(joined):
+            # Minuscule sur plusieurs caractères ("İ") : textes mis en minuscules un par un.
+            texts = [text.lower() for text in texts]
+            lowered = "\n".join(texts)
+        # Plus long mot-clé à chaque position où un mot-clé commence.
+        starts, ids = [], []
+        keyword_ids = self._keyword_ids
+        search = self._any_keyword.search
+        match = search(lowered)
+        while match is not None:
+            starts.append(match.start())
+            ids.append(keyword_ids[match.group()])
+            match = search(lowered, starts[-1] + 1)
+        if not starts:
+            return counts
+        # Fin de chaque texte dans la chaîne jointe, séparateur compris.
+        ends = np.cumsum([len(text) + 1 for text in texts])
+        rows = np.searchsorted(ends, starts, side="right")
+        ids = np.asarray(ids)
+        keywords = list(self._keyword_categories)
+        hits: Dict[str, List[np.ndarray]] = {}
+        for keyword_id in np.unique(ids):
+            keyword_rows = rows[ids == keyword_id]
+            for prefix in self._prefixes[keywords[keyword_id]]:
+                hits.setdefault(prefix, []).append(keyword_rows)
+        for keyword, parts in hits.items():
+            # Un mot-clé répété dans un texte compte une fois.
+            keyword_rows = np.unique(np.concatenate(parts))
+            for category_id in self._keyword_categories[keyword]:
+                counts[keyword_rows, category_id] += 1
+        return counts
+
+    def column(self, counts: np.ndarray, category: str) -> np.ndarray:
+        return counts[:, self._category_index[category]]
+
+    def contains_any(self, text: str, category: str) -> bool:
+        pattern = self._patterns.get(category)
+        return pattern is not None and pattern.search(text.lower()) is not None
+
+
+@lru_cache(maxsize=1)
+def get_default_lexicon(path: Optional[str] = None) -> KeywordLexicon:
+    from data.lexicons import LEXICONS
+    lexicons = dict(LEXICONS)
+    path = path or os.getenv("LEXICON_FILE")
+    if path:
+        try:
+            # Les catégories du fichier remplacent celles par défaut, les autres sont conservées.
+            lexicons.update(KeywordLexicon.from_file(path).lexicons)
+        except Exception as e:
+            logger.error(f"Erreur chargement lexiques {path}, lexiques par défaut utilisés : {e}")
+    return KeywordLexicon(lexicons)
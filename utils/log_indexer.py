@@ -0,0 +1,297 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from utils.kpi_store import KPIBatch, KPIStore
+import logging
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou inter-processus
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+READ_CHUNK = 1024 * 1024
+# Octets de début de fichier mémorisés pour reconnaître un fichier recréé sur le même inode.
+HEAD_BYTES = 64
+# Marqueur des lignes JSON déjà comptées en direct par MonitoringManager.
+RECORDED_FLAG = "kpi_recorded"
+
+# Format texte historique : "%(asctime)s - %(name)s - %(levelname)s - %(message)s".
+PLAIN_LINE = re.compile(r"^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}),\d+ - \S+ - [A-Z]+ - (.*)$")
+CHATBOT_MESSAGE = re.compile(r"^Chatbot: User=(.*?), Question=(.*), Confidence=([-+0-9.eE]+)$")
+EVALUATION_MESSAGE = re.compile(r"^Evaluation: File=(.*), Records=(\d+)$")
+LOGIN_MESSAGE = re.compile(r"^Login: User=(.*)$")
+SECURITY_MESSAGE = re.compile(r"^Security: Type=(.*?), Details=(.*)$")
+# Lignes JSON sans intérêt écartées avant json.loads.
+_JSON_HINTS = (b'"event"', b'"Chatbot: ', b'"Evaluation: ', b'"Login: ', b'"Security: ')
+
+
+class LogIndexer:
+    """Alimente le KPIStore à partir des journaux de MonitoringManager.
+
+    Seuls les octets écrits depuis le dernier point de reprise (inode,
+    position, début du fichier) sont lus, par blocs ; ce point est validé
+    dans la même transaction que les agrégats. Après une rotation, la fin du
+    fichier archivé (retrouvé par son inode) puis les archives plus récentes
+    sont lues avant le nouveau fichier. Le premier passage remonte tout
+    l'historique disponible. Les deux formats sont reconnus : texte
+    (journaux antérieurs) et JSON lines ; les lignes JSON déjà comptées en
+    direct (`kpi_recorded`) sont ignorées.
+    """
+
+    def __init__(self, log_file: str, store: KPIStore, interval: float = 60.0):
+        self.log_file = log_file
+        self.store = store
+        self.interval = interval
+        self._key = os.path.abspath(log_file)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._timestamps: Dict[str, float] = {}
+        self.stats = {"runs": 0, "bytes": 0, "lines": 0, "records": 0, "rotations": 0, "last_run": None}
+
+    @classmethod
+    def from_env(cls, log_file: str, store: KPIStore) -> "LogIndexer":
+        return cls(log_file, store, float(os.getenv("LOG_INDEX_INTERVAL", "60")))
+
+    # --- Plan de lecture -------------------------------------------------------
+
+    @staticmethod
+    def _head(path: str, length: int) -> str:
+        with open(path, "rb") as f:
+            return hashlib.sha1(f.read(length)).hexdigest()
+
+    def _matches(self, path: str, st: os.stat_result, state: Dict) -> bool:
+        return (st.st_ino == state["inode"] and st.st_size >= state["offset"]
+                and self._head(path, state["head_len"]) == state["head"])
+
+    def _archives(self) -> List[Tuple[str, os.stat_result]]:
+        # Archives de RotatingFileHandler (.1, .2…) et TimedRotatingFileHandler (.2024-01-31…).
+        archives = []
+        for path in glob.glob(glob.escape(self.log_file) + ".*"):
+            try:
+                archives.append((path, os.stat(path)))
+            except OSError:
+                continue
+        return sorted(archives, key=lambda item: item[1].st_mtime)
+
+    def _plan(self, state: Optional[Dict]) -> Tuple[List[Tuple[str, int, bool]], bool]:
+        """Fichiers à lire, (chemin, position de départ, fichier courant), et détection de rotation."""
+        try:
+            current = os.stat(self.log_file)
+        except OSError:
+            return [], False
+        if state and self._matches(self.log_file, current, state):
+            return [(self.log_file, state["offset"], True)], False
+        archives = [(path, st) for path, st in self._archives() if st.st_ino != current.st_ino]
+        if state is None:
+            return [(path, 0, False) for path, _ in archives] + [(self.log_file, 0, True)], False
+        plan = []
+        for i, (path, st) in enumerate(archives):
+            if self._matches(path, st, state):
+                plan = [(path, state["offset"], False)] + [(newer, 0, False) for newer, _ in archives[i + 1:]]
+                break
+        else:
+            logger.warning(f"Indexation des journaux : fichier précédent de {self.log_file} introuvable, "
+                           f"reprise au début du fichier courant")
+        return plan + [(self.log_file, 0, True)], True
+
+    # --- Lecture et analyse ------------------------------------------------------
+
+    def _read(self, path: str, offset: int, live: bool, batch: KPIBatch) -> Optional[Dict]:
+        """Lit `path` à partir de `offset` ; pour le fichier courant, renvoie le point de
+        reprise (position après la dernière ligne complète)."""
+        with open(path, "rb") as f:
+            f.seek(offset)
+            remainder = b""
+            while True:
+                chunk = f.read(READ_CHUNK)
+                if not chunk:
+                    break
+                lines = (remainder + chunk).split(b"\n")
+                remainder = lines.pop()
+                for line in lines:
+                    self._parse(line, batch)
+                offset += len(chunk)
+                self.stats["bytes"] += len(chunk)
+                self.stats["lines"] += len(lines)
+            if not live:
+                if remainder:
+                    # Dernière ligne d'une archive, close sans saut de ligne.
+                    self._parse(remainder, batch)
+                return None
+            # Identité du fichier effectivement lu, même s'il a été renommé entre-temps.
+            offset -= len(remainder)
+            head_len = min(offset, HEAD_BYTES)
+            f.seek(0)
+            return {"inode": os.fstat(f.fileno()).st_ino, "offset": offset, "head_len": head_len,
+                    "head": hashlib.sha1(f.read(head_len)).hexdigest()}
+
+    def _parse(self, line: bytes, batch: KPIBatch):
+        if line.startswith(b"{"):
+            if not any(hint in line for hint in _JSON_HINTS):
+                return
+            try:
+                record = json.loads(line)
+            except ValueError:
+                return
+            if record.get(RECORDED_FLAG):
+                return
+            ts = self._iso_timestamp(record.get("ts"))
+            if ts is not None and not self._record_event(record, ts, batch):
+                self._record_message(record.get("message", ""), ts, batch)
+            return
+        match = PLAIN_LINE.match(line.decode("utf-8", errors="replace").rstrip("\r"))
+        if match:
+            self._record_message(match.group(2), self._plain_timestamp(match.group(1)), batch)
+
+    def _plain_timestamp(self, text: str) -> float:
+        # Heure locale du serveur ; une seule conversion par seconde de journal.
+        ts = self._timestamps.get(text)
+        if ts is None:
+            if len(self._timestamps) > 4096:
+                self._timestamps.clear()
+            ts = self._timestamps[text] = time.mktime(time.strptime(text, "%Y-%m-%d %H:%M:%S"))
+        return ts
+
+    @staticmethod
+    def _iso_timestamp(text: Optional[str]) -> Optional[float]:
+        try:
+            return datetime.fromisoformat(text).timestamp()
+        except (TypeError, ValueError):
+            return None
+
+    def _record_event(self, record: Dict, ts: float, batch: KPIBatch) -> bool:
+        # Champs structurés des lignes JSON (voir MonitoringManager).
+        event = record.get("event")
+        if event == "chatbot":
+            batch.record_question(record.get("intent"), float(record.get("confidence") or 0.0),
+                                  record.get("latency"), record.get("user"), ts)
+        elif event == "evaluation":
+            batch.record_evaluation(int(record.get("records") or 0), ts)
+        elif event == "login":
+            batch.record_login(record.get("user", ""), ts)
+        elif event == "security":
+            batch.record_security(record.get("type", ""), ts)
+        else:
+            return False
+        return True
+
+    @staticmethod
+    def _record_message(message: str, ts: float, batch: KPIBatch):
+        prefix = message[:message.find(":") + 1]
+        if prefix == "Chatbot:":
+            match = CHATBOT_MESSAGE.match(message)
+            if match:
+                batch.record_question(None, float(match.group(3)), None, match.group(1), ts)
+        elif prefix == "Evaluation:":
+            match = EVALUATION_MESSAGE.match(message)
+            if match:
+                batch.record_evaluation(int(match.group(2)), ts)
+        elif prefix == "Login:":
+            match = LOGIN_MESSAGE.match(message)
+            if match:
+                batch.record_login(match.group(1), ts)
+        elif prefix == "Security:":
+            match = SECURITY_MESSAGE.match(message)
+            if match:
+                batch.record_security(match.group(1), ts)
+
+    # --- Exécution -----------------------------------------------------------------
+
+    def _acquire_file_lock(self):
+        # Un seul worker indexe à la fois ; les autres passent leur tour.
+        if fcntl is None or not self.store.db_path:
+            return None
+        handle = open(self.store.db_path + ".index.lock", "w")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        return handle
+
+    def run_once(self) -> Dict:
+        """Indexe les octets nouveaux ; renvoie le bilan du passage."""
+        with self._lock:
+            handle = self._acquire_file_lock()
+            if handle is False:
+                return {"skipped": True}
+            try:
+                return self._index()
+            finally:
+                if handle is not None:
+                    handle.close()
+
+    def _index(self) -> Dict:
+        start = time.perf_counter()
+        bytes_before = self.stats["bytes"]
+        plan, rotated = self._plan(self.store.get_checkpoint(self._key))
+        if not plan:
+            return {"files": 0, "bytes": 0, "records": 0}
+        batch = self.store.batch()
+        state = None
+        for path, start_offset, live in plan:
+            state = self._read(path, start_offset, live, batch)
+        if not self.store.commit(batch, (self._key, state)):
+            return {"files": len(plan), "bytes": 0, "records": 0, "error": True}
+        result = {
+            "files": len(plan),
+            "bytes": self.stats["bytes"] - bytes_before,
+            "records": batch.events,
+            "rotated": rotated,
+            "duration_ms": round((time.perf_counter() - start) * 1000.0, 3),
+        }
+        self.stats["runs"] += 1
+        self.stats["records"] += batch.events
+        self.stats["rotations"] += int(rotated)
+        self.stats["last_run"] = datetime.now().isoformat()
+        return result
+
+    def _run(self):
+        while True:
+            try:
+                result = self.run_once()
+                if result.get("records"):
+                    logger.info(f"Indexation des journaux : {result['records']} événements, "
+                                f"{result['bytes']} octets lus en {result['duration_ms']} ms")
+            except Exception as e:
+                logger.error(f"Erreur indexation des journaux {self.log_file} : {e}")
+            if self._stop.wait(self.interval):
+                return
+
+    def start(self):
+        if self.interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="log-indexer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(5)
+
+    def get_stats(self) -> Dict:
+        return dict(self.stats, interval=self.interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Indexe les journaux de l'application dans la base des KPI")
+    parser.add_argument("--log-file", default="data/app_logs.log")
+    parser.add_argument("--kpi-store", default=os.getenv("KPI_STORE_PATH", "data/kpis.sqlite"))
+    args = parser.parse_args()
+    if not args.kpi_store:
+        parser.error("--kpi-store requis (base SQLite des KPI)")
+    indexer = LogIndexer(args.log_file, KPIStore(args.kpi_store), interval=0)
+    print(json.dumps(indexer.run_once(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
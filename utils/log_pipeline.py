@@ -0,0 +1,283 @@
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou inter-processus
+    fcntl = None
+
+LOG_POLICIES = ("drop", "block")
+# Attributs standard d'un LogRecord, exclus des champs JSON supplémentaires.
+_RECORD_ATTRS = set(logging.LogRecord("", 0, "", 0, "", (), None).__dict__) | {"message", "asctime"}
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Un objet JSON par ligne : horodatage, niveau, logger, message et champs `extra`."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_text:
+            payload["exception"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class _BatchFlushMixin:
+    """Écriture par lots d'un fichier partagé par plusieurs processus (workers uvicorn).
+
+    Chaque lot est écrit sous un verrou `fcntl` sur `.<fichier>.lock`, après
+    avoir rouvert le fichier si un autre processus l'a archivé entre-temps :
+    un seul processus à la fois décide de la rotation, sur le fichier
+    courant. Le tampon n'est vidé qu'une fois par lot.
+    """
+
+    _lock_handle = None
+
+    def flush(self):
+        pass
+
+    def begin_batch(self):
+        if fcntl is not None:
+            if self._lock_handle is None:
+                directory, name = os.path.split(self.baseFilename)
+                self._lock_handle = open(os.path.join(directory, f".{name}.lock"), "a")
+            fcntl.flock(self._lock_handle, fcntl.LOCK_EX)
+        self._reopen_if_rotated()
+
+    def flush_batch(self):
+        try:
+            super().flush()
+        finally:
+            if self._lock_handle is not None:
+                fcntl.flock(self._lock_handle, fcntl.LOCK_UN)
+
+    def _reopen_if_rotated(self):
+        if self.stream is None:
+            return
+        try:
+            current = os.stat(self.baseFilename)
+        except FileNotFoundError:
+            current = None
+        opened = os.fstat(self.stream.fileno())
+        if current is None or (current.st_dev, current.st_ino) != (opened.st_dev, opened.st_ino):
+            self.stream.close()
+            self.stream = self._open()
+            if hasattr(self, "rolloverAt"):
+                # Rotation périodique déjà faite par un autre processus : pas de seconde rotation.
+                self.rolloverAt = self.computeRollover(int(time.time()))
+
+    def close(self):
+        super().close()
+        if self._lock_handle is not None:
+            self._lock_handle.close()
+            self._lock_handle = None
+
+
+class BatchRotatingFileHandler(_BatchFlushMixin, logging.handlers.RotatingFileHandler):
+    pass
+
+
+class BatchTimedRotatingFileHandler(_BatchFlushMixin, logging.handlers.TimedRotatingFileHandler):
+    pass
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler sur file bornée : si elle est pleine, l'enregistrement est
+    abandonné (`drop`) ou l'appelant attend au plus `block_timeout` secondes
+    (`block`). Les avertissements et erreurs attendent dans les deux cas."""
+
+    def __init__(self, log_queue: queue.Queue, policy: str = "drop", block_timeout: float = 0.05):
+        if policy not in LOG_POLICIES:
+            raise ValueError(f"Politique de journalisation inconnue : {policy} (attendu : {', '.join(LOG_POLICIES)})")
+        super().__init__(log_queue)
+        self.setFormatter(logging.Formatter())
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self._lock_counts = threading.Lock()
+        self.dropped = 0
+        self.blocked = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Message figé dans l'appelant ; la trace d'exception est gardée à part (champ `exception`).
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatter.formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            pass
+        if self.policy == "block" or record.levelno >= logging.WARNING:
+            with self._lock_counts:
+                self.blocked += 1
+            try:
+                self.queue.put(record, timeout=self.block_timeout)
+                return
+            except queue.Full:
+                pass
+        with self._lock_counts:
+            self.dropped += 1
+
+
+class LogWriter:
+    """Thread d'écriture : vide la file par lots et écrit chaque lot d'un bloc."""
+
+    _STOP = object()
+
+    def __init__(self, log_queue: queue.Queue, handlers: List[logging.Handler], batch_size: int = 512,
+                 flush_interval: float = 0.5):
+        self.queue = log_queue
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.batches = 0
+        self.errors = 0
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _next_batch(self) -> List:
+        try:
+            batch = [self.queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, records: List[logging.LogRecord]):
+        for handler in self.handlers:
+            begin_batch = getattr(handler, "begin_batch", None)
+            if begin_batch is not None:
+                try:
+                    begin_batch()
+                except Exception:
+                    self.errors += 1
+        for record in records:
+            for handler in self.handlers:
+                if record.levelno >= handler.level:
+                    try:
+                        handler.handle(record)
+                    except Exception:
+                        self.errors += 1
+        for handler in self.handlers:
+            (getattr(handler, "flush_batch", None) or handler.flush)()
+        self.written += len(records)
+        self.batches += 1
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = self._next_batch()
+            if self._STOP in batch:
+                stopping = True
+                batch = [record for record in batch if record is not self._STOP]
+            if batch:
+                self._write(batch)
+
+    def stop(self, timeout: float = 5.0):
+        if not self._thread.is_alive():
+            return
+        # Les enregistrements déjà en file sont écrits avant l'arrêt.
+        try:
+            self.queue.put(self._STOP, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+        for handler in self.handlers:
+            handler.close()
+
+
+class LogPipeline:
+    """Journalisation non bloquante : file bornée, écriture par lots en tâche de fond.
+
+    Les appels `logger.info(...)` des requêtes ne font qu'empiler
+    l'enregistrement ; un thread dédié écrit les lots dans le fichier
+    (JSON lines, rotation par taille ou par période) et sur la console.
+    """
+
+    def __init__(self, log_file: str, max_bytes: int = 10 * 1024 * 1024, backup_count: int = 5,
+                 rotate_when: Optional[str] = None, queue_size: int = 10000, policy: str = "drop",
+                 block_timeout: float = 0.05, batch_size: int = 512, flush_interval: float = 0.5,
+                 console: bool = True, level: int = logging.INFO):
+        os.makedirs(os.path.dirname(log_file) or ".", exist_ok=True)
+        if rotate_when:
+            file_handler = BatchTimedRotatingFileHandler(log_file, when=rotate_when, backupCount=backup_count,
+                                                         encoding="utf-8")
+        else:
+            file_handler = BatchRotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count,
+                                                    encoding="utf-8")
+        file_handler.setFormatter(JsonLinesFormatter())
+        handlers: List[logging.Handler] = [file_handler]
+        if console:
+            console_handler = logging.StreamHandler()
+            console_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+            handlers.append(console_handler)
+        self.log_file = log_file
+        self.level = level
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.handler = BoundedQueueHandler(self.queue, policy, block_timeout)
+        self.writer = LogWriter(self.queue, handlers, batch_size, flush_interval)
+
+    @classmethod
+    def from_env(cls, log_file: str) -> "LogPipeline":
+        return cls(
+            log_file,
+            max_bytes=int(float(os.getenv("LOG_MAX_MB", "10")) * 1024 * 1024),
+            backup_count=int(os.getenv("LOG_BACKUP_COUNT", "5")),
+            rotate_when=os.getenv("LOG_ROTATE_WHEN") or None,
+            queue_size=int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+            policy=os.getenv("LOG_QUEUE_POLICY", "drop"),
+            block_timeout=float(os.getenv("LOG_QUEUE_BLOCK_MS", "50")) / 1000.0,
+            batch_size=int(os.getenv("LOG_BATCH_SIZE", "512")),
+            level=getattr(logging, os.getenv("LOG_LEVEL", "INFO").upper(), logging.INFO),
+        )
+
+    def install(self, logger: Optional[logging.Logger] = None):
+        logger = logger or logging.getLogger()
+        logger.setLevel(self.level)
+        logger.addHandler(self.handler)
+        self.writer.start()
+
+    def close(self):
+        logging.getLogger().removeHandler(self.handler)
+        self.writer.stop()
+
+    def get_stats(self) -> Dict:
+        return {
+            "log_file": self.log_file,
+            "policy": self.handler.policy,
+            "queued": self.queue.qsize(),
+            "capacity": self.queue.maxsize,
+            "written": self.writer.written,
+            "batches": self.writer.batches,
+            "dropped": self.handler.dropped,
+            "blocked": self.handler.blocked,
+            "write_errors": self.writer.errors,
+        }
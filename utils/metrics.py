@@ -0,0 +1,249 @@
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Bornes des buckets en secondes, de 50 µs à 60 s.
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def bucket_quantile(bounds: Sequence[float], counts: Sequence[int], q: float) -> float:
+    """Quantile estimé par interpolation linéaire dans le bucket (comme histogram_quantile).
+
+    `counts` a un compteur par borne plus un dernier pour +Inf.
+    """
+    n = sum(counts)
+    if n == 0:
+        return 0.0
+    rank = q * n
+    cumulative = 0
+    for i, count in enumerate(counts):
+        if cumulative + count >= rank and count:
+            if i == len(bounds):
+                return bounds[-1]
+            lower = bounds[i - 1] if i > 0 else 0.0
+            return lower + (bounds[i] - lower) * (rank - cumulative) / count
+        cumulative += count
+    return bounds[-1]
+
+
+class Histogram:
+    """Histogramme de latences à buckets fixes, sans verrou à l'écriture.
+
+    Chaque thread incrémente sa propre copie des compteurs (les threads des
+    pools sont durables) ; la lecture additionne les copies. Le verrou n'est
+    pris qu'à la première observation d'un thread.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.bounds = tuple(buckets)
+        self._local = threading.local()
+        self._shards: List[List[float]] = []
+        self._lock = threading.Lock()
+
+    def _shard(self) -> List[float]:
+        # Compteurs par bucket (dernier : +Inf), puis somme des valeurs.
+        shard = [0] * (len(self.bounds) + 1) + [0.0]
+        with self._lock:
+            self._shards.append(shard)
+        self._local.shard = shard
+        return shard
+
+    def observe(self, seconds: float):
+        shard = getattr(self._local, "shard", None) or self._shard()
+        shard[bisect_left(self.bounds, seconds)] += 1
+        shard[-1] += seconds
+
+    def time(self) -> "Timer":
+        return Timer(self)
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        with self._lock:
+            shards = list(self._shards)
+        counts = [0] * (len(self.bounds) + 1)
+        total = 0.0
+        for shard in shards:
+            for i in range(len(counts)):
+                counts[i] += shard[i]
+            total += shard[-1]
+        return counts, total
+
+    def quantile(self, q: float, counts: Optional[List[int]] = None) -> float:
+        counts = counts if counts is not None else self.snapshot()[0]
+        return bucket_quantile(self.bounds, counts, q)
+
+
+class Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class HistogramFamily:
+    """Histogrammes d'une même métrique, un par combinaison de labels."""
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str],
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._children: Dict[Tuple[str, ...], Histogram] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str) -> Histogram:
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, Histogram(self.buckets))
+        return child
+
+    def observe(self, seconds: float, *values: str):
+        self.labels(*values).observe(seconds)
+
+    def children(self) -> List[Tuple[Tuple[str, ...], Histogram]]:
+        with self._lock:
+            return sorted(self._children.items())
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class MetricsRegistry:
+    """Métriques du processus exposées au format texte Prometheus (/metrics).
+
+    Chaque histogramme est accompagné d'une jauge `<nom sans _seconds>_quantile_seconds`
+    donnant p50 / p95 / p99, lisible sans requête PromQL.
+    """
+
+    def __init__(self):
+        self._families: Dict[str, HistogramFamily] = {}
+        self._callbacks: List[Tuple[str, str, str, Callable[[], float]]] = []
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, help_text: str, label_names: Sequence[str] = ()) -> HistogramFamily:
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = self._families[name] = HistogramFamily(name, help_text, label_names)
+            return family
+
+    def register_callback(self, name: str, metric_type: str, help_text: str, fn: Callable[[], float]):
+        # Valeur lue au moment du rendu (compteurs tenus ailleurs : journaux, pools…).
+        with self._lock:
+            self._callbacks = [entry for entry in self._callbacks if entry[0] != name]
+            self._callbacks.append((name, metric_type, help_text, fn))
+
+    def summary(self, name: str) -> Dict[str, Dict]:
+        """count / moyenne / p50 / p95 / p99 (ms) par combinaison de labels, pour les réponses JSON."""
+        family = self._families.get(name)
+        if family is None:
+            return {}
+        result = {}
+        for values, histogram in family.children():
+            counts, total = histogram.snapshot()
+            n = sum(counts)
+            entry = {"count": n, "avg_ms": total / n * 1000.0 if n else 0.0}
+            for q in QUANTILES:
+                entry[f"p{int(q * 100)}_ms"] = histogram.quantile(q, counts) * 1000.0
+            result["/".join(values)] = entry
+        return result
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            families = list(self._families.values())
+            callbacks = list(self._callbacks)
+        for family in families:
+            quantile_lines = []
+            quantile_name = family.name[:-len("_seconds")] if family.name.endswith("_seconds") else family.name
+            quantile_name += "_quantile_seconds"
+            lines.append(f"# HELP {family.name} {family.help}")
+            lines.append(f"# TYPE {family.name} histogram")
+            for values, histogram in family.children():
+                counts, total = histogram.snapshot()
+                cumulative = 0
+                for bound, count in zip(family.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else _number(bound)
+                    bucket_labels = _labels(family.label_names, values, 'le="' + le + '"')
+                    lines.append(f"{family.name}_bucket{bucket_labels} {cumulative}")
+                label_text = _labels(family.label_names, values)
+                lines.append(f"{family.name}_sum{label_text} {_number(total)}")
+                lines.append(f"{family.name}_count{label_text} {cumulative}")
+                for q in QUANTILES:
+                    quantile_labels = _labels(family.label_names, values, f'quantile="{q}"')
+                    quantile_lines.append(f"{quantile_name}{quantile_labels} {_number(histogram.quantile(q, counts))}")
+            if quantile_lines:
+                lines.append(f"# HELP {quantile_name} p50 / p95 / p99 estimés depuis {family.name}")
+                lines.append(f"# TYPE {quantile_name} gauge")
+                lines.extend(quantile_lines)
+        for name, metric_type, help_text, fn in callbacks:
+            try:
+                value = fn()
+            except Exception:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.append(f"{name} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+REQUEST_LATENCY = REGISTRY.histogram("safran_request_latency_seconds",
+                                     "Latence des requêtes HTTP par endpoint", ("endpoint", "method"))
+CHATBOT_STAGE_LATENCY = REGISTRY.histogram("safran_chatbot_stage_latency_seconds",
+                                           "Latence des étapes du chatbot (par appel, lot compris)", ("stage",))
+REPORT_STAGE_LATENCY = REGISTRY.histogram("safran_report_stage_latency_seconds",
+                                          "Durée des étapes des rapports d'évaluation", ("stage",))
+
+
+def observe_report_timings(timings_ms: Optional[Dict[str, float]]):
+    # Les rapports sont calculés dans les processus d'analyse : leurs durées par étape
+    # (`timings_ms`) sont reportées ici, dans le processus qui sert /metrics.
+    for stage, elapsed_ms in (timings_ms or {}).items():
+        REPORT_STAGE_LATENCY.observe(elapsed_ms / 1000.0, stage)
+
+
+class RequestMetricsMiddleware:
+    """Middleware ASGI : latence de chaque requête HTTP, étiquetée par route (gabarit de chemin)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            # Gabarit (/evaluate/jobs/{job_id}) plutôt que chemin réel : nombre de séries borné.
+            route = scope.get("route")
+            endpoint = getattr(route, "path", None) or "unmatched"
+            REQUEST_LATENCY.observe(time.perf_counter() - start, endpoint, scope.get("method", ""))
@@ -1,12 +1,32 @@
 import logging
 import json
+import threading
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import os
+from utils.log_pipeline import LogPipeline
+from utils.metrics import REGISTRY
+from utils.kpi_store import KPIStore
+from utils.log_indexer import RECORDED_FLAG, LogIndexer
+
+_pipeline: Optional[LogPipeline] = None
+_pipeline_lock = threading.Lock()
+
+
+def get_log_pipeline(log_file: str = "data/app_logs.log") -> LogPipeline:
+    # Une seule chaîne de journalisation par processus, installée sur le logger racine.
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = LogPipeline.from_env(log_file)
+            _pipeline.install()
+        return _pipeline
+
 
 class MonitoringManager:
     def __init__(self, log_file: str = "data/app_logs.log"):
         self.log_file = log_file
+        self.logger = logging.getLogger(__name__)
         self.setup_logging()
         self.kpis = {
             "chatbot_questions": 0,
@@ -15,37 +35,63 @@ class MonitoringManager:
             "evaluations_processed": 0,
             "active_users": 0
         }
+        # Séries par minute / heure / jour, partagées entre workers et persistées (/kpis?window=).
+        self.kpi_store = KPIStore.from_env()
+        self.kpi_store.start()
+        # Rattrapage des lignes non comptées en direct (historique, autres processus).
+        self.log_indexer = LogIndexer.from_env(self.log_file, self.kpi_store)
+        if self.kpi_store.db_path:
+            self.log_indexer.start()
     
     def setup_logging(self):
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler(self.log_file),
-                logging.StreamHandler()
-            ]
-        )
-    
-    def log_chatbot_interaction(self, question: str, response: str, confidence: float, user_id: str):
-        logger = logging.getLogger(__name__)
-        logger.info(f"Chatbot: User={user_id}, Question={question}, Confidence={confidence}")
+        # Écriture en tâche de fond (JSON lines) : les requêtes n'attendent jamais le disque.
+        self.pipeline = get_log_pipeline(self.log_file)
+    
+    def log_chatbot_interaction(self, question: str, response: str, confidence: float, user_id: str,
+                                intent: Optional[str] = None, latency: Optional[float] = None):
+        self.logger.info(f"Chatbot: User={user_id}, Question={question}, Confidence={confidence}",
+                         extra={"event": "chatbot", "user": user_id, "question": question,
+                                "confidence": confidence, "intent": intent, "latency": latency,
+                                RECORDED_FLAG: True})
         self.kpis["chatbot_questions"] += 1
+        self.kpi_store.record_question(intent, confidence, latency, user_id)
     
     def log_evaluation_processing(self, file_name: str, total_records: int):
-        logger = logging.getLogger(__name__)
-        logger.info(f"Evaluation: File={file_name}, Records={total_records}")
+        self.logger.info(f"Evaluation: File={file_name}, Records={total_records}",
+                         extra={"event": "evaluation", "file": file_name, "records": total_records,
+                                RECORDED_FLAG: True})
         self.kpis["evaluations_processed"] += total_records
+        self.kpi_store.record_evaluation(total_records)
     
     def log_user_login(self, username: str):
-        logger = logging.getLogger(__name__)
-        logger.info(f"Login: User={username}")
+        self.logger.info(f"Login: User={username}", extra={"event": "login", "user": username, RECORDED_FLAG: True})
         self.kpis["active_users"] += 1
+        self.kpi_store.record_login(username)
     
     def log_security_event(self, event_type: str, details: str):
-        logger = logging.getLogger(__name__)
-        logger.warning(f"Security: Type={event_type}, Details={details}")
+        self.logger.warning(f"Security: Type={event_type}, Details={details}",
+                            extra={"event": "security", "type": event_type, "details": details,
+                                   RECORDED_FLAG: True})
+        self.kpi_store.record_security(event_type)
+    
+    def get_logging_stats(self) -> Dict[str, Any]:
+        stats = self.pipeline.get_stats()
+        stats["indexer"] = self.log_indexer.get_stats()
+        return stats
+    
+    def get_kpi_window(self, window: str = "24h") -> Dict[str, Any]:
+        return self.kpi_store.query(window)
+    
+    def close(self):
+        self.log_indexer.stop()
+        self.kpi_store.close()
+        self.pipeline.close()
     
     def get_kpis(self) -> Dict[str, Any]:
+        # Temps de réponse moyen (ms) de /ask, tiré de l'histogramme de latence des requêtes.
+        ask = REGISTRY.summary("safran_request_latency_seconds").get("/ask/POST")
+        if ask:
+            self.kpis["chatbot_avg_response_time"] = round(ask["avg_ms"], 3)
         return {
             "timestamp": datetime.now().isoformat(),
             "kpis": self.kpis
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Optional
+from utils.cache import LRUTTLCache
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def hash_file(file_path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def fingerprint_key(content_hash: str, params: Optional[Dict] = None) -> str:
+    """Clé de cache : empreinte du contenu combinée aux paramètres d'analyse."""
+    digest = hashlib.sha256(content_hash.encode("ascii"))
+    digest.update(b"\0")
+    digest.update(json.dumps(params or {}, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def fingerprint_file(file_path: str, params: Optional[Dict] = None) -> str:
+    return fingerprint_key(hash_file(file_path), params)
+
+
+def report_key(file_path: str, params: Optional[Dict] = None, dataset_id: Optional[str] = None) -> str:
+    """Clé d'un rapport, commune à /evaluate et aux jobs.
+
+    Un jeu importé est identifié par son `dataset_id` (empreinte du fichier
+    envoyé), sinon le fichier est haché.
+    """
+    if dataset_id:
+        return fingerprint_key(dataset_id, params)
+    return fingerprint_file(file_path, params)
+
+
+class ReportCache:
+    """Cache disque des rapports d'analyse, adressé par empreinte de contenu.
+
+    Un rapport par fichier `<cache_dir>/<empreinte>.json` ; la date de
+    modification sert d'horodatage LRU et les entrées les plus anciennes sont
+    supprimées dès que la taille totale dépasse `max_bytes`. Les
+    `memory_entries` derniers rapports lus restent décodés en mémoire : les
+    pages d'un même rapport ne relisent pas le fichier. Ces rapports sont
+    partagés et ne doivent pas être modifiés.
+    """
+
+    def __init__(self, cache_dir: str = "data/cache/reports", max_bytes: int = 512 * 1024 * 1024,
+                 memory_entries: int = 16):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.memory = LRUTTLCache(memory_entries, ttl=None)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> "ReportCache":
+        return cls(
+            cache_dir=os.getenv("REPORT_CACHE_DIR", "data/cache/reports"),
+            max_bytes=int(float(os.getenv("REPORT_CACHE_MAX_MB", "512")) * 1024 * 1024),
+            memory_entries=int(os.getenv("REPORT_CACHE_MEMORY_ENTRIES", "16")),
+        )
+
+    def _path(self, key: str) -> str:
+        # Les identifiants de rapport arrivent aussi par l'URL : empreinte hexadécimale uniquement.
+        if not key or not all(c in "0123456789abcdef" for c in key):
+            raise KeyError(key)
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def record(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key: str, record: bool = True) -> Optional[Dict]:
+        # record=False pour les lectures de pages d'un rapport déjà servi (hors statistiques).
+        path = self._path(key)
+        report = self.memory.get(key)
+        try:
+            if report is None:
+                with open(path, encoding="utf-8") as f:
+                    report = json.load(f)
+                self.memory.set(key, report)
+            os.utime(path)
+        except (OSError, ValueError):
+            # Fichier supprimé (éviction par un autre worker) : le rapport en mémoire reste valable.
+            if report is None:
+                if record:
+                    self.record(False)
+                return None
+        if record:
+            self.record(True)
+        return report
+
+    def put(self, key: str, report: Dict):
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, default=str)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"Erreur écriture du cache de rapports : {e}")
+            return
+        # Rapport recalculé (force) : l'ancienne version décodée n'est plus servie.
+        self.memory.delete(key)
+        self._evict()
+
+    def invalidate(self, key: str):
+        self.memory.delete(key)
+        try:
+            os.remove(self._path(key))
+        except (OSError, KeyError):
+            pass
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        return entries
+
+    def _evict(self):
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            total -= size
+            with self._lock:
+                self.evictions += 1
+
+    def get_stats(self) -> Dict:
+        entries = self._entries()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(entries),
+                "size_bytes": sum(size for _, size, _ in entries),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "memory": self.memory.get_stats(),
+            }
@@ -0,0 +1,148 @@
+import asyncio
+import gzip
+import io
+import json
+import math
+import os
+from typing import Dict, List, Optional
+import numpy as np
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+WEAK_SIGNALS_PREVIEW = int(os.getenv("WEAK_SIGNALS_PREVIEW", "20"))
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+# Au-delà, la compression est faite hors de la boucle asyncio.
+COMPRESSION_OFFLOAD_BYTES = int(os.getenv("COMPRESSION_OFFLOAD_BYTES", str(256 * 1024)))
+MAX_PAGE_SIZE = 1000
+
+
+def _compact_section(section: Dict, preview: int) -> Dict:
+    # Copie superficielle : le rapport complet (cache, job) n'est pas modifié.
+    section = dict(section)
+    weak_signals = section.get("weak_signals")
+    if isinstance(weak_signals, list):
+        # Total détecté, au-delà des signaux conservés dans le rapport (MAX_WEAK_SIGNALS).
+        total = section.get("weak_signals_total", len(weak_signals))
+        section["weak_signals_total"] = total
+        section["weak_signals_truncated"] = total > len(weak_signals)
+        section["weak_signals"] = weak_signals[:preview]
+    clusters = section.get("clusters")
+    if isinstance(clusters, dict) and isinstance(clusters.get("clusters"), list):
+        section["clusters"] = {key: value for key, value in clusters.items() if key != "clusters"}
+        section["clusters"]["labels_total"] = len(clusters["clusters"])
+    return section
+
+
+def compact_report(report: Dict, report_id: Optional[str], preview: int = WEAK_SIGNALS_PREVIEW) -> Dict:
+    """Version allégée d'un rapport pour les réponses HTTP.
+
+    Les étiquettes de cluster par ligne sont retirées et seuls les `preview`
+    signaux faibles les plus forts sont gardés ; le détail est servi page par
+    page à partir de `report_id` (voir /evaluate/reports/{report_id}/…).
+    """
+    compact = _compact_section(report or {}, preview)
+    if isinstance(compact.get("text"), dict):
+        # Rapports groupés : une section par (colonne de texte, groupe).
+        compact["text"] = {
+            column: {group: _compact_section(section, preview) for group, section in groups.items()}
+            for column, groups in compact["text"].items()
+        }
+    compact["report_id"] = report_id
+    return compact
+
+
+def select_section(report: Dict, column: Optional[str] = None, group: Optional[str] = None) -> Dict:
+    if column is None:
+        return report
+    section = report.get("text", {}).get(column, {}).get(group)
+    if section is None:
+        raise KeyError(f"{column} / {group}")
+    return section
+
+
+def paginate(items: List, offset: int = 0, limit: int = 100, detected: Optional[int] = None) -> Dict:
+    """Page de `items` ; `detected` est le nombre d'éléments trouvés quand le
+    rapport n'en a conservé qu'une partie (`total` reste le nombre paginable)."""
+    offset = max(offset, 0)
+    limit = min(max(limit, 1), MAX_PAGE_SIZE)
+    page = {"total": len(items), "offset": offset, "limit": limit, "items": items[offset:offset + limit]}
+    if detected is not None:
+        page["detected"] = detected
+        page["truncated"] = detected > len(items)
+    return page
+
+
+def cluster_labels_parquet(labels: List[int]) -> bytes:
+    # Pièce jointe binaire colonnaire : une ligne par évaluation (index, cluster).
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.table({"index": pa.array(range(len(labels)), pa.int64()), "cluster": pa.array(labels, pa.int16())})
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer)
+    return buffer.getvalue()
+
+
+def _finite(value):
+    # Même sortie qu'orjson : NaN / inf → null, scalaires numpy → types Python.
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    if isinstance(value, (float, np.floating)):
+        return float(value) if math.isfinite(value) else None
+    if isinstance(value, np.integer):
+        return int(value)
+    return value
+
+
+def dumps(payload) -> bytes:
+    if orjson is not None:
+        # NaN / inf sont sérialisés en null (JSON valide), types numpy acceptés.
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS, default=str)
+    return json.dumps(_finite(payload), ensure_ascii=False, default=str, allow_nan=False).encode("utf-8")
+
+
+def _accepted_encodings(request: Request) -> List[str]:
+    header = request.headers.get("accept-encoding", "")
+    return [part.split(";")[0].strip().lower() for part in header.split(",")]
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(body)
+    return gzip.compress(body, compresslevel=5)
+
+
+async def encoded_response(request: Request, body: bytes, media_type: str = "application/json",
+                           status_code: int = 200) -> Response:
+    """Réponse compressée en zstd (si disponible) ou gzip selon Accept-Encoding."""
+    headers = {"Vary": "Accept-Encoding"}
+    encoding = None
+    if len(body) >= COMPRESSION_MIN_BYTES:
+        accepted = _accepted_encodings(request)
+        if zstandard is not None and "zstd" in accepted:
+            encoding = "zstd"
+        elif "gzip" in accepted:
+            encoding = "gzip"
+    if encoding is not None:
+        if len(body) >= COMPRESSION_OFFLOAD_BYTES:
+            body = await asyncio.get_running_loop().run_in_executor(None, _compress, body, encoding)
+        else:
+            body = _compress(body, encoding)
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, status_code=status_code, media_type=media_type, headers=headers)
+
+
+async def json_response(request: Request, payload, status_code: int = 200) -> Response:
+    return await encoded_response(request, dumps(payload), status_code=status_code)
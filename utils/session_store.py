@@ -0,0 +1,192 @@
+import hashlib
+import heapq
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from utils.cache import LRUTTLCache
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Intervalle minimal entre deux purges des sessions expirées en base.
+PURGE_INTERVAL = 60.0
+
+
+def token_key(token: str) -> str:
+    # Seule l'empreinte du jeton est conservée : la base ne permet pas d'usurper une session.
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class SessionStore:
+    """Sessions à durée de vie limitée, bornées en nombre.
+
+    Avec `db_path`, les sessions sont dans une base SQLite (mode WAL)
+    partagée par les workers uvicorn : un jeton émis par un worker est
+    reconnu par les autres. Un cache LRU en mémoire (`cache_ttl` secondes)
+    évite la base pour les vérifications répétées ; une déconnexion faite
+    sur un autre worker y est donc visible après au plus `cache_ttl`
+    secondes. Le nombre de sessions en base est tenu à jour par chaque
+    worker à l'insertion et recompté à chaque purge (au plus toutes les
+    `PURGE_INTERVAL` secondes) : avec plusieurs workers, la borne peut être
+    dépassée entre deux purges. Sans base, les sessions restent dans le processus (un seul
+    worker), avec un tas d'expirations pour purger et évincer sans
+    parcours. Au-delà de `max_sessions`, les sessions les plus proches de
+    l'expiration sont supprimées.
+    """
+
+    def __init__(self, db_path: Optional[str] = "data/sessions.sqlite", ttl: float = 8 * 3600,
+                 max_sessions: int = 100000, cache_size: int = 10000, cache_ttl: float = 5.0,
+                 clock: Callable[[], float] = time.time):
+        self.db_path = db_path or None
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.clock = clock
+        self.cache = LRUTTLCache(cache_size, cache_ttl)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._last_purge = 0.0
+        # Mode SQLite : compte courant des sessions, recalé à chaque purge.
+        self._db_count = 0
+        self.expired = 0
+        self.evicted = 0
+        # Mode mémoire : sessions par empreinte et tas (expiration, empreinte), nettoyé paresseusement.
+        self._sessions: Dict[str, Tuple[float, Dict]] = {}
+        self._heap: List[Tuple[float, str]] = []
+        if self.db_path:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            conn = self._connect()
+            with conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("CREATE TABLE IF NOT EXISTS sessions (token TEXT PRIMARY KEY, data TEXT, "
+                             "expires REAL, created REAL)")
+                conn.execute("CREATE INDEX IF NOT EXISTS sessions_expires ON sessions (expires)")
+
+    @classmethod
+    def from_env(cls) -> "SessionStore":
+        return cls(
+            os.getenv("SESSION_STORE_PATH", "data/sessions.sqlite"),
+            ttl=float(os.getenv("SESSION_TTL", str(8 * 3600))),
+            max_sessions=int(os.getenv("SESSION_MAX", "100000")),
+            cache_size=int(os.getenv("SESSION_CACHE_SIZE", "10000")),
+            cache_ttl=float(os.getenv("SESSION_CACHE_TTL", "5")),
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        # Une connexion par thread, réutilisée : pas d'ouverture de fichier par vérification.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.db_path, timeout=30)
+        return conn
+
+    def create(self, data: Dict) -> str:
+        token = secrets.token_urlsafe(32)
+        key = token_key(token)
+        now = self.clock()
+        expires = now + self.ttl
+        if self.db_path:
+            self._create_db(key, data, now, expires)
+            self.cache.set(key, (expires, data))
+        else:
+            with self._lock:
+                self._purge_memory(now)
+                self._sessions[key] = (expires, data)
+                heapq.heappush(self._heap, (expires, key))
+                while len(self._sessions) > self.max_sessions:
+                    self._evict_memory()
+        return token
+
+    def _create_db(self, key: str, data: Dict, now: float, expires: float):
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if now - self._last_purge >= PURGE_INTERVAL:
+                # Suppression par plage d'index : proportionnelle au nombre de sessions expirées.
+                self.expired += conn.execute("DELETE FROM sessions WHERE expires <= ?", (now,)).rowcount
+                self._db_count = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+                self._last_purge = now
+            conn.execute("INSERT INTO sessions (token, data, expires, created) VALUES (?, ?, ?, ?)",
+                         (key, json.dumps(data), expires, now))
+            self._db_count += 1
+            excess = self._db_count - self.max_sessions
+            if excess > 0:
+                evicted = [row[0] for row in conn.execute(
+                    "SELECT token FROM sessions ORDER BY expires LIMIT ?", (excess,))]
+                conn.executemany("DELETE FROM sessions WHERE token = ?", [(token,) for token in evicted])
+                self.evicted += len(evicted)
+                self._db_count -= len(evicted)
+                for token in evicted:
+                    self.cache.delete(token)
+
+    def get(self, token: str) -> Optional[Dict]:
+        key = token_key(token)
+        now = self.clock()
+        if not self.db_path:
+            with self._lock:
+                entry = self._sessions.get(key)
+            return entry[1] if entry is not None and entry[0] > now else None
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached[1] if cached[0] > now else None
+        row = self._connect().execute("SELECT data, expires FROM sessions WHERE token = ? AND expires > ?",
+                                      (key, now)).fetchone()
+        if row is None:
+            return None
+        data = json.loads(row[0])
+        self.cache.set(key, (row[1], data))
+        return data
+
+    def delete(self, token: str) -> bool:
+        key = token_key(token)
+        if not self.db_path:
+            with self._lock:
+                return self._sessions.pop(key, None) is not None
+        self.cache.delete(key)
+        conn = self._connect()
+        with conn:
+            # Le verrou d'écriture de la transaction protège aussi le compte courant.
+            deleted = conn.execute("DELETE FROM sessions WHERE token = ?", (key,)).rowcount > 0
+            if deleted:
+                self._db_count -= 1
+        return deleted
+
+    def _purge_memory(self, now: float):
+        # Les entrées du tas des sessions déjà déconnectées sont simplement écartées.
+        while self._heap and self._heap[0][0] <= now:
+            expires, key = heapq.heappop(self._heap)
+            entry = self._sessions.get(key)
+            if entry is not None and entry[0] == expires:
+                del self._sessions[key]
+                self.expired += 1
+
+    def _evict_memory(self):
+        while self._heap:
+            expires, key = heapq.heappop(self._heap)
+            entry = self._sessions.get(key)
+            if entry is not None and entry[0] == expires:
+                del self._sessions[key]
+                self.evicted += 1
+                return
+
+    def __len__(self) -> int:
+        if not self.db_path:
+            # Comme en base, seules les sessions non expirées sont comptées.
+            with self._lock:
+                self._purge_memory(self.clock())
+                return len(self._sessions)
+        return self._connect().execute("SELECT COUNT(*) FROM sessions WHERE expires > ?",
+                                       (self.clock(),)).fetchone()[0]
+
+    def get_stats(self) -> Dict:
+        return {
+            "backend": "sqlite" if self.db_path else "memory",
+            "sessions": len(self),
+            "max_sessions": self.max_sessions,
+            "ttl": self.ttl,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "cache": self.cache.get_stats(),
+        }
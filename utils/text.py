@@ -0,0 +1,28 @@
+import re
+import unicodedata
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]", re.UNICODE)
+_WHITESPACE_RE = re.compile(r"\s+", re.UNICODE)
+
+
+def strip_accents(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def normalize_text(text: str) -> str:
+    """Forme canonique d'une question : minuscules, sans accents ni ponctuation, espaces réduits."""
+    text = strip_accents(text.lower())
+    text = _PUNCTUATION_RE.sub(" ", text).replace("_", " ")
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+# Liste de mots vides français (scikit-learn ne fournit que l'anglais).
+FRENCH_STOP_WORDS = frozenset("""
+au aux avec ce ces dans de des du elle en et eux il ils je la le les leur lui ma mais me même mes moi mon ne nos
+notre nous on ou par pas pour qu que qui sa se ses son sur ta te tes toi ton tu un une vos votre vous
+c d j l à m n s t y été étée étées étés étant étais était étions étiez étaient suis es est sommes êtes sont
+serai seras sera serons serez seront serais serait serions seriez seraient ai as avons avez ont aurai auras
+aura aurons aurez auront aurais aurait aurions auriez auraient avais avait avions aviez avaient eu eue eues
+eus ayant ceci cela celà cet cette ici ils les leurs quel quels quelle quelles sans soi très trop plus peu
+tout tous toute toutes autre autres aussi alors donc car comme si
+""".split())